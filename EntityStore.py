@@ -0,0 +1,254 @@
+import math
+from array import array
+from itertools import compress
+from operator import le, sub
+
+FOLLOWS_PATH = 1  # Steered toward its path's next waypoint every step
+COLLIDES = 2  # Stopped by impassable tiles and the world edge
+ARRIVAL_DISTANCE = 2  # Pixels from a waypoint's centre at which it counts as reached
+
+
+class EntityStore:
+    """
+    Name: __init__
+    Parameters: world (World | None), tile_size (int)
+    Returns: None
+    Purpose: Keeps every entity's state in parallel arrays, one slot per entity, so a frame's movement is a few
+             whole-array passes instead of a method call per object. Player and Follower are views onto it.
+    """
+    def __init__(self, world=None, tile_size=32):
+        self.tile_size = tile_size
+        self.count = 0
+        self.x = array('d')
+        self.y = array('d')
+        self.prev_x = array('d')  # Position before the last step, for drawing between steps
+        self.prev_y = array('d')
+        self.vx = array('d')  # Pixels per step on top of any path steering, e.g. the player's input
+        self.vy = array('d')
+        self.speed = array('d')
+        self.width = array('i')
+        self.height = array('i')
+        self.flags = array('B')
+        self.walking = array('d')  # 1.0 while walking toward a waypoint, else 0.0, so steering can multiply by it
+        self.path_cursor = array('i')  # Index of the waypoint being walked to
+        self.path_length = array('i')
+        self.target_x = array('d')  # Pixel centre of that waypoint, cached when the cursor moves
+        self.target_y = array('d')
+        self.paths = []  # Waypoint list per entity; lengths vary, so they stay Python lists
+        self.colliders = []  # Slots with the COLLIDES flag, moved one at a time after the batched pass
+        self.blocked = bytearray()  # World.blocked_tiles
+        self.tiles_wide = 0
+        self.tiles_high = 0
+        if world is not None:
+            self.set_world(world)
+
+    """
+    Name: set_world
+    Parameters: world (World)
+    Returns: None
+    Purpose: Points collision checks at a world's tiles.
+    """
+    def set_world(self, world):
+        self.blocked = world.blocked_tiles
+        self.tiles_wide = world.width
+        self.tiles_high = world.height
+
+    """
+    Name: add
+    Parameters: x (float), y (float), width (int), height (int), speed (float), flags (int)
+    Returns: int
+    Purpose: Adds an entity and returns its slot.
+    """
+    def add(self, x, y, width, height, speed, flags=0):
+        self.x.append(x)
+        self.y.append(y)
+        self.prev_x.append(x)
+        self.prev_y.append(y)
+        self.vx.append(0.0)
+        self.vy.append(0.0)
+        self.speed.append(speed)
+        self.width.append(width)
+        self.height.append(height)
+        self.flags.append(flags)
+        self.walking.append(0.0)
+        self.path_cursor.append(0)
+        self.path_length.append(0)
+        self.target_x.append(0.0)
+        self.target_y.append(0.0)
+        self.paths.append([])
+        if flags & COLLIDES:
+            self.colliders.append(self.count)
+        self.count += 1
+        return self.count - 1
+
+    """
+    Name: set_path
+    Parameters: index (int), path (list[tuple[int, int]]), cursor (int)
+    Returns: None
+    Purpose: Gives an entity a path of tiles to walk, starting from the given waypoint.
+    """
+    def set_path(self, index, path, cursor=0):
+        self.paths[index] = path
+        self.path_length[index] = len(path)
+        self.set_cursor(index, cursor)
+
+    """
+    Name: set_cursor
+    Parameters: index (int), cursor (int)
+    Returns: None
+    Purpose: Moves an entity's path cursor and caches the pixel centre of that waypoint.
+    """
+    def set_cursor(self, index, cursor):
+        self.path_cursor[index] = cursor
+        walking = self.flags[index] & FOLLOWS_PATH and cursor < self.path_length[index]
+        self.walking[index] = 1.0 if walking else 0.0
+        if walking:
+            tx, ty = self.paths[index][cursor]
+            self.target_x[index] = tx * self.tile_size + self.tile_size // 2
+            self.target_y[index] = ty * self.tile_size + self.tile_size // 2
+
+    """
+    Name: is_clear
+    Parameters: x (float), y (float), width (int), height (int)
+    Returns: bool
+    Purpose: Checks that a box lies inside the world with none of its corners on an impassable tile.
+    """
+    def is_clear(self, x, y, width, height):
+        tile_size = self.tile_size
+        if x < 0 or x + width > self.tiles_wide * tile_size:
+            return False
+        if y < 0 or y + height > self.tiles_high * tile_size:
+            return False
+        left = int(x) // tile_size
+        right = int(x + width - 1) // tile_size
+        top = int(y) // tile_size * self.tiles_wide
+        bottom = int(y + height - 1) // tile_size * self.tiles_wide
+        blocked = self.blocked
+        return not (blocked[top + left] or blocked[top + right] or blocked[bottom + left] or blocked[bottom + right])
+
+    """
+    Name: move
+    Parameters: index (int), move_x (float), move_y (float)
+    Returns: None
+    Purpose: Moves one entity, one axis at a time if it collides so it can slide along walls.
+    """
+    def move(self, index, move_x, move_y):
+        x, y = self.x, self.y
+        if self.flags[index] & COLLIDES:
+            width, height = self.width[index], self.height[index]
+            if self.is_clear(x[index] + move_x, y[index], width, height):
+                x[index] += move_x
+            if self.is_clear(x[index], y[index] + move_y, width, height):
+                y[index] += move_y
+        else:
+            x[index] += move_x
+            y[index] += move_y
+
+    """
+    Name: step
+    Parameters: None
+    Returns: None
+    Purpose: Advances every entity by one frame. Steering and movement run as whole-array passes; only colliding
+             entities and those reaching a waypoint are handled one at a time.
+    """
+    def step(self):
+        x, y, vx, vy = self.x, self.y, self.vx, self.vy
+        self.prev_x[:] = x
+        self.prev_y[:] = y
+        dxs = list(map(sub, self.target_x, x))
+        dys = list(map(sub, self.target_y, y))
+        distances = list(map(math.hypot, dxs, dys))
+        # Entities not walking a path have a walking factor of 0, so they get no steering. A waypoint closer than
+        # one step away is landed on rather than overshot, which could leave an entity circling it forever
+        scale = [speed * walking / distance if distance > speed else walking
+                 for speed, walking, distance in zip(self.speed, self.walking, distances)]
+
+        colliding = [(i, dxs[i] * scale[i] + vx[i], dys[i] * scale[i] + vy[i]) for i in self.colliders]
+        new_x = array('d', [px + dx * k + v for px, dx, k, v in zip(x, dxs, scale, vx)])
+        new_y = array('d', [py + dy * k + v for py, dy, k, v in zip(y, dys, scale, vy)])
+        for i, _, _ in colliding:
+            new_x[i], new_y[i] = x[i], y[i]
+        x[:] = new_x
+        y[:] = new_y
+        for i, move_x, move_y in colliding:
+            self.move(i, move_x, move_y)
+
+        # A waypoint counts as reached when the entity landed on it or started the step close to it, as in
+        # step_entity
+        walking, cursor = self.walking, self.path_cursor
+        limit = ARRIVAL_DISTANCE
+        reach = [speed if speed > limit * math.sqrt(2) else limit * math.sqrt(2) for speed in self.speed]
+        for i in compress(range(self.count), map(le, distances, reach)):
+            if walking[i] and (distances[i] <= self.speed[i] or -limit < dxs[i] < limit and -limit < dys[i] < limit):
+                self.set_cursor(i, cursor[i] + 1)
+
+    """
+    Name: step_entity
+    Parameters: index (int)
+    Returns: None
+    Purpose: Advances a single entity by one frame, exactly as step() would.
+    """
+    def step_entity(self, index):
+        self.prev_x[index] = self.x[index]
+        self.prev_y[index] = self.y[index]
+        dx = self.target_x[index] - self.x[index]
+        dy = self.target_y[index] - self.y[index]
+        distance = math.hypot(dx, dy)
+        speed = self.speed[index]
+        scale = speed * self.walking[index] / distance if distance > speed else self.walking[index]
+        self.move(index, dx * scale + self.vx[index], dy * scale + self.vy[index])
+        limit = ARRIVAL_DISTANCE
+        if self.walking[index] and (distance <= speed or -limit < dx < limit and -limit < dy < limit):
+            self.set_cursor(index, self.path_cursor[index] + 1)
+
+    """
+    Name: snap
+    Parameters: None
+    Returns: None
+    Purpose: Makes every entity's previous position its current one, so an entity that was teleported (e.g. by
+             loading a save) is not drawn sliding there.
+    """
+    def snap(self):
+        self.prev_x[:] = self.x
+        self.prev_y[:] = self.y
+
+    """
+    Name: render_position
+    Parameters: index (int), alpha (float): How far between the last two steps to draw, from 0 to 1
+    Returns: tuple[float, float]
+    Purpose: Interpolates an entity's position between its last two steps.
+    """
+    def render_position(self, index, alpha):
+        prev_x, prev_y = self.prev_x[index], self.prev_y[index]
+        return prev_x + (self.x[index] - prev_x) * alpha, prev_y + (self.y[index] - prev_y) * alpha
+
+
+class EntityField:
+    """
+    Name: __init__
+    Parameters: name (str): Name of an EntityStore array
+    Returns: None
+    Purpose: Attribute of an entity view that reads and writes the view's slot in one of the store's arrays.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    """
+    Name: __get__
+    Parameters: view (object | None), owner (type | None)
+    Returns: float | int | EntityField
+    Purpose: Reads the view's value, or returns the field itself when looked up on the class.
+    """
+    def __get__(self, view, owner=None):
+        if view is None:
+            return self
+        return getattr(view.store, self.name)[view.index]
+
+    """
+    Name: __set__
+    Parameters: view (object), value (float | int)
+    Returns: None
+    Purpose: Writes the view's value.
+    """
+    def __set__(self, view, value):
+        getattr(view.store, self.name)[view.index] = value
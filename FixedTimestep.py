@@ -0,0 +1,80 @@
+import time
+
+SIM_TICK_RATE = 60  # Simulation ticks per second; entity speeds are in pixels per tick
+MAX_TICKS_PER_FRAME = 5  # Ticks run to catch up after a slow frame before the rest of the backlog is dropped
+
+
+class FixedTimestep:
+    """
+    Name: __init__
+    Parameters: tick_rate (float), max_ticks (int)
+    Returns: None
+    Purpose: Turns elapsed wall-clock time into whole fixed-length simulation ticks, so the simulation runs at the
+             same speed however fast frames are rendered.
+    """
+    def __init__(self, tick_rate=SIM_TICK_RATE, max_ticks=MAX_TICKS_PER_FRAME):
+        self.tick_interval = 1 / tick_rate
+        self.max_ticks = max_ticks
+        self.accumulator = 0.0  # Elapsed time not yet simulated
+        self.last_time = None
+
+    """
+    Name: advance
+    Parameters: now (float | None): perf_counter time, the current time if None
+    Returns: int
+    Purpose: Returns how many ticks to run this frame. After a long stall only max_ticks are run, so a slow frame
+             slows the game down briefly instead of starting a spiral of ever longer catch-up frames.
+    """
+    def advance(self, now=None):
+        if now is None:
+            now = time.perf_counter()
+        if self.last_time is not None:
+            self.accumulator += now - self.last_time
+        self.last_time = now
+        ticks = int(self.accumulator / self.tick_interval)
+        if ticks > self.max_ticks:
+            ticks = self.max_ticks
+            self.accumulator %= self.tick_interval
+        else:
+            self.accumulator -= ticks * self.tick_interval
+        return ticks
+
+    """
+    Name: alpha
+    Parameters: None
+    Returns: float
+    Purpose: Returns how far the current frame is between the last tick and the next, from 0 to 1, for
+             interpolating what is drawn.
+    """
+    def alpha(self):
+        return min(1.0, self.accumulator / self.tick_interval)
+
+
+class LockstepTimestep:
+    """
+    Name: __init__
+    Parameters: None
+    Returns: None
+    Purpose: Runs exactly one tick per frame whatever the time between frames, so a scripted run does the same
+             simulation work on every machine. Used in place of FixedTimestep by benchmarks.
+    """
+    def __init__(self):
+        self.tick_interval = 1 / SIM_TICK_RATE
+
+    """
+    Name: advance
+    Parameters: now (float | None): Ignored
+    Returns: int
+    Purpose: Returns one tick for every frame.
+    """
+    def advance(self, now=None):
+        return 1
+
+    """
+    Name: alpha
+    Parameters: None
+    Returns: float
+    Purpose: Frames always land on a tick, so entities are drawn where they are.
+    """
+    def alpha(self):
+        return 1.0
@@ -1,5 +1,6 @@
 import pygame
 import math
+from Profiler import profiled
 
 
 class Light:
@@ -75,6 +76,7 @@ Parameters: screen (pygame.Surface), lights (list[Light]), walls (list[Wall]), s
 Returns: None
 Purpose: Renders a pixelated lightmap with dynamic lighting and shadow casting.
 """
+@profiled("lighting")
 def render_lightmap(screen, lights, walls, step=12):
     width, height = screen.get_size()
 
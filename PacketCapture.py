@@ -0,0 +1,83 @@
+import struct
+import time
+
+CAPTURE_MAGIC = b"NEAC"
+CAPTURE_VERSION = 1
+CAPTURE_HEADER = struct.Struct("!4sBId")  # magic, version, world seed, wall-clock start time
+RECORD_HEADER = struct.Struct("!dIBI")  # seconds since start, connection id, event, length
+CAPTURE_BUFFER_SIZE = 256 * 1024  # Records are written through a buffer rather than one syscall each
+
+# Capture events
+EVENT_CONNECT = 1
+EVENT_DATA = 2  # Inbound bytes exactly as read from the socket
+EVENT_DISCONNECT = 3
+EVENT_SENT = 4  # Outbound write; only its length is stored
+EVENT_NAMES = {EVENT_CONNECT: "connect", EVENT_DATA: "data", EVENT_DISCONNECT: "disconnect", EVENT_SENT: "sent"}
+
+
+class CaptureWriter:
+    """
+    Name: __init__
+    Parameters: path (str), world_seed (int)
+    Returns: None
+    Purpose: Appends timestamped connection events to a compact binary capture file.
+    """
+    def __init__(self, path, world_seed):
+        self.file = open(path, "wb", buffering=CAPTURE_BUFFER_SIZE)
+        self.start = time.monotonic()
+        self.file.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, world_seed, time.time()))
+
+    """
+    Name: record
+    Parameters: connection_id (int), event (int), data (bytes), length (int | None)
+    Returns: None
+    Purpose: Writes one event. Outbound writes pass only a length, so captures stay small.
+    """
+    def record(self, connection_id, event, data=b"", length=None):
+        if self.file is None:
+            return
+        self.file.write(RECORD_HEADER.pack(time.monotonic() - self.start, connection_id, event,
+                                           len(data) if length is None else length))
+        if data:
+            self.file.write(data)
+
+    """
+    Name: close
+    Parameters: None
+    Returns: None
+    Purpose: Flushes and closes the capture file.
+    """
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+"""
+Name: read_capture
+Parameters: path (str)
+Returns: tuple[dict, list[tuple[float, int, int, bytes, int]]]
+Purpose: Reads a capture file into its header and a list of (time, connection id, event, data, length) records.
+         A record cut short by the server stopping abruptly ends the list.
+"""
+def read_capture(path):
+    with open(path, "rb") as f:
+        content = f.read()
+    magic, version, world_seed, started = CAPTURE_HEADER.unpack_from(content, 0)
+    if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION:
+        raise ValueError(f"Not a version {CAPTURE_VERSION} capture file: {path}")
+
+    records = []
+    offset = CAPTURE_HEADER.size
+    view = memoryview(content)
+    while offset + RECORD_HEADER.size <= len(content):
+        timestamp, connection_id, event, length = RECORD_HEADER.unpack_from(content, offset)
+        offset += RECORD_HEADER.size
+        data = b""
+        if event != EVENT_SENT:
+            if offset + length > len(content):
+                break
+            data = bytes(view[offset:offset + length])
+            offset += length
+        records.append((timestamp, connection_id, event, data, length))
+    return {"world_seed": world_seed, "started": started}, records
@@ -0,0 +1,235 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from Pathfinding import run_search
+
+PATH_FRAME_BUDGET_MS = 2  # Time the main thread may spend on time-sliced searches per frame
+
+
+class PathRequest:
+    """
+    Name: __init__
+    Parameters: key (hashable), start (tuple[int, int]), end (tuple[int, int]), priority (int),
+                callback (callable | None), search (callable | None)
+    Returns: None
+    Purpose: Tracks one agent's outstanding path request.
+    """
+    def __init__(self, key, start, end, priority, callback, search=None):
+        self.key = key  # Usually the requesting agent, so newer requests replace older ones
+        self.start = start
+        self.end = end
+        self.priority = priority  # Higher values are searched first
+        self.callback = callback
+        self.future = Future()
+        self.version = 0  # Bumped whenever the request is superseded
+        self.search_function = search  # (pathfinder, start, end) -> resumable search, Jump Point Search if None
+        self.search = None  # Resumable search while being time-sliced
+
+
+class PathRequestScheduler:
+    """
+    Name: __init__
+    Parameters: pathfinder (Pathfinder), workers (int)
+    Returns: None
+    Purpose: Queues path requests and runs them either on worker threads or time-sliced on the main thread.
+    """
+    def __init__(self, pathfinder, workers=0):
+        self.pathfinder = pathfinder
+        self.requests = {}  # key -> PathRequest waiting or being searched
+        self.queue = []  # (-priority, order, key, version)
+        self.order = itertools.count()
+        self.completed = deque()  # (PathRequest, path) waiting for callbacks on the main thread
+        self.lock = threading.Lock()
+        self.active = None  # Request currently being time-sliced
+        self.key_locks = {}  # key -> lock stopping workers running two searches for one agent at once
+        self.executor = ThreadPoolExecutor(max_workers=workers) if workers > 0 else None
+
+    """
+    Name: request
+    Parameters: key (hashable), start (tuple[int, int]), end (tuple[int, int]), priority (int),
+                callback (callable | None), search (callable | None): Search strategy called with the current
+                pathfinder, start and end that returns a resumable search; Jump Point Search if None
+    Returns: Future
+    Purpose: Enqueues a path search, merging it with any request already pending for the same key.
+    """
+    def request(self, key, start, end, priority=0, callback=None, search=None):
+        start = tuple(start)
+        end = tuple(end)
+        with self.lock:
+            path_request = self.requests.get(key)
+            if path_request is not None:
+                path_request.callback = callback or path_request.callback
+                if (path_request.start, path_request.end) == (start, end) and path_request.priority >= priority \
+                        and path_request.search_function == search:
+                    return path_request.future  # Identical search already queued
+                path_request.start, path_request.end = start, end
+                path_request.search_function = search
+                path_request.priority = max(path_request.priority, priority)
+                path_request.version += 1
+                path_request.search = None
+            else:
+                path_request = PathRequest(key, start, end, priority, callback, search)
+                self.requests[key] = path_request
+
+            heapq.heappush(self.queue, (-path_request.priority, next(self.order), key, path_request.version))
+
+        if self.executor is not None:
+            self.executor.submit(self.run_next)
+        return path_request.future
+
+    """
+    Name: pop_next
+    Parameters: None
+    Returns: tuple[PathRequest, int] | None
+    Purpose: Takes the highest-priority live request off the queue, skipping superseded entries.
+    """
+    def pop_next(self):
+        with self.lock:
+            while self.queue:
+                _, _, key, version = heapq.heappop(self.queue)
+                path_request = self.requests.get(key)
+                if path_request is not None and path_request.version == version:
+                    return path_request, version
+        return None
+
+    """
+    Name: finish
+    Parameters: path_request (PathRequest), version (int), path (list[tuple[int, int]] | None)
+    Returns: None
+    Purpose: Resolves a request unless it was superseded while its search was running.
+    """
+    def finish(self, path_request, version, path):
+        with self.lock:
+            if path_request.version != version:
+                return
+            del self.requests[path_request.key]
+            self.completed.append((path_request, path))
+        path_request.future.set_result(path)
+
+    """
+    Name: fail
+    Parameters: path_request (PathRequest), version (int), error (Exception)
+    Returns: None
+    Purpose: Fails a request whose search raised, unless it was superseded; the newer search still owns the future.
+    """
+    def fail(self, path_request, version, error):
+        with self.lock:
+            if path_request.version != version:
+                return
+            del self.requests[path_request.key]
+        path_request.future.set_exception(error)
+
+    """
+    Name: start_search
+    Parameters: path_request (PathRequest)
+    Returns: Generator[None, None, list[tuple[int, int]] | None]
+    Purpose: Starts the request's search strategy on the current pathfinder.
+    """
+    def start_search(self, path_request):
+        if path_request.search_function is None:
+            return self.pathfinder.iter_find_path_jps(path_request.start, path_request.end)
+        return path_request.search_function(self.pathfinder, path_request.start, path_request.end)
+
+    """
+    Name: run_next
+    Parameters: None
+    Returns: None
+    Purpose: Worker thread task that runs the next queued search to completion.
+    """
+    def run_next(self):
+        next_request = self.pop_next()
+        if next_request is None:
+            return
+        path_request, version = next_request
+        with self.lock:
+            key_lock = self.key_locks.setdefault(path_request.key, threading.Lock())
+        try:
+            with key_lock:  # Strategies such as D* Lite reuse per-agent state between searches
+                path = run_search(self.start_search(path_request))
+        except Exception as e:
+            self.fail(path_request, version, e)
+            return
+        self.finish(path_request, version, path)
+
+    """
+    Name: run_slices
+    Parameters: deadline (float)
+    Returns: None
+    Purpose: Advances queued searches on the calling thread until the deadline passes.
+    """
+    def run_slices(self, deadline):
+        while time.perf_counter() < deadline:
+            if self.active is None or self.active[0].version != self.active[1]:
+                self.active = self.pop_next()
+                if self.active is None:
+                    return
+
+            path_request, version = self.active
+            try:
+                if path_request.search is None:
+                    path_request.search = self.start_search(path_request)
+                while time.perf_counter() < deadline:
+                    next(path_request.search)
+            except StopIteration as finished:
+                self.active = None
+                self.finish(path_request, version, finished.value)
+            except Exception as e:
+                self.active = None
+                self.fail(path_request, version, e)
+
+    """
+    Name: update
+    Parameters: budget_ms (float)
+    Returns: None
+    Purpose: Called once per frame. Spends up to budget_ms on time-sliced searches and runs finished callbacks.
+    """
+    def update(self, budget_ms=PATH_FRAME_BUDGET_MS):
+        if self.executor is None:
+            self.run_slices(time.perf_counter() + budget_ms / 1000)
+
+        while self.completed:
+            path_request, path = self.completed.popleft()
+            if path_request.callback:
+                path_request.callback(path)
+
+    """
+    Name: pending_count
+    Parameters: None
+    Returns: int
+    Purpose: Returns the number of requests still waiting for a result.
+    """
+    def pending_count(self):
+        with self.lock:
+            return len(self.requests)
+
+    """
+    Name: set_pathfinder
+    Parameters: pathfinder (Pathfinder)
+    Returns: None
+    Purpose: Swaps in a new grid (e.g. after loading a world) and restarts any in-progress searches on it.
+    """
+    def set_pathfinder(self, pathfinder):
+        with self.lock:
+            self.pathfinder = pathfinder
+            for path_request in self.requests.values():
+                path_request.version += 1
+                path_request.search = None
+                heapq.heappush(self.queue, (-path_request.priority, next(self.order), path_request.key,
+                                            path_request.version))
+        if self.executor is not None:
+            for _ in range(len(self.requests)):
+                self.executor.submit(self.run_next)
+
+    """
+    Name: shutdown
+    Parameters: None
+    Returns: None
+    Purpose: Stops the worker threads.
+    """
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
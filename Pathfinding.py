@@ -1,4 +1,22 @@
 import math
+import heapq
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from Profiler import profiled
+
+ALGORITHM_ASTAR = "astar"
+ALGORITHM_JPS = "jps"
+ALGORITHM_INCREMENTAL = "incremental"
+
+SQRT_2 = math.sqrt(2)
+
+CLUSTER_SIZE = 16  # Width and height of a hierarchical pathfinding cluster in tiles
+ENTRANCE_SPLIT_LENGTH = 6  # Border openings at least this long get a transition at each end
+SMOOTHING_MARGIN = 4  # Tiles around a border crossing's stretch of path that smoothing may reroute through
+KEY_TOLERANCE = 1e-6  # Float slack when comparing incremental search keys
+FLOW_FIELD_RADIUS = 40  # Maximum path cost from the target covered by a flow field
 
 
 class Node:
@@ -18,14 +36,30 @@ class Node:
         self.parent = None  # Parent node for path reconstruction
 
 
+class PathResult:
+    """
+    Name: __init__
+    Parameters: path (list[tuple[int, int]] | None), nodes_expanded (int), time_ms (float), group_size (int)
+    Returns: None
+    Purpose: Holds the answer to one batched path query plus the cost of the search that produced it.
+    """
+    def __init__(self, path, nodes_expanded, time_ms, group_size=1):
+        self.path = path
+        self.nodes_expanded = nodes_expanded  # Shared by every query in the same goal group
+        self.time_ms = time_ms
+        self.group_size = group_size  # Number of queries answered by the same search
+
+
 class Pathfinder:
     """
     Name: __init__
-    Parameters: grid (list[list[int]])
+    Parameters: grid (list[list[int]]), algorithm (str)
     Returns: None
     Purpose: Initializes the grid and converts it into Node objects.
     """
-    def __init__(self, grid):
+    def __init__(self, grid, algorithm=ALGORITHM_ASTAR):
+        self.algorithm = algorithm  # Default search used by find_path
+        self.nodes_expanded = 0  # Nodes expanded by the most recent search
         self.grid_height = len(grid)
         self.grid_width = len(grid[0]) if grid else 0
         self.grid_nodes = []
@@ -105,11 +139,27 @@ class Pathfinder:
 
     """
     Name: find_path
+    Parameters: start_position (tuple[int, int]), end_position (tuple[int, int]), algorithm (str | None),
+                expand_jumps (bool)
+    Returns: list[tuple[int, int]] | None
+    Purpose: Finds a path using the selected algorithm (A* by default, or Jump Point Search).
+    """
+    def find_path(self, start_position, end_position, algorithm=None, expand_jumps=True):
+        algorithm = algorithm or self.algorithm
+        if algorithm == ALGORITHM_JPS:
+            return self.find_path_jps(start_position, end_position, expand_jumps)
+        if algorithm != ALGORITHM_ASTAR:
+            raise ValueError(f"Unknown pathfinding algorithm: {algorithm}")
+        return self.find_path_astar(start_position, end_position)
+
+    """
+    Name: find_path_astar
     Parameters: start_position (tuple[int, int]), end_position (tuple[int, int])
     Returns: list[tuple[int, int]] | None
     Purpose: Finds a path using the A* pathfinding algorithm.
     """
-    def find_path(self, start_position, end_position):
+    @profiled("pathfinding.astar")
+    def find_path_astar(self, start_position, end_position):
         start_node = self.get_node_at(*start_position)
         end_node = self.get_node_at(*end_position)
 
@@ -119,6 +169,8 @@ class Pathfinder:
         if not start_node.walkable or not end_node.walkable:
             return None
 
+        self.nodes_expanded = 0
+        start_node.parent = None  # May be left over from an earlier search on this Pathfinder
         start_node.g_cost = 0
         start_node.h_cost = self.calculate_heuristic(start_node, end_node)
         start_node.f_cost = start_node.h_cost
@@ -130,6 +182,7 @@ class Pathfinder:
             current_node = min(open_set, key=lambda n: n.f_cost)
             open_set.remove(current_node)
             closed_set.add(current_node)
+            self.nodes_expanded += 1
 
             if current_node == end_node:
                 return self.reconstruct_path(current_node)
@@ -152,6 +205,1095 @@ class Pathfinder:
 
         return None
 
+    """
+    Name: is_walkable
+    Parameters: x (int), y (int)
+    Returns: bool
+    Purpose: Checks whether the given coordinates are inside the grid and walkable.
+    """
+    def is_walkable(self, x, y):
+        return 0 <= x < self.grid_width and 0 <= y < self.grid_height and self.grid_nodes[y][x].walkable
+
+    """
+    Name: calculate_octile
+    Parameters: x1 (int), y1 (int), x2 (int), y2 (int)
+    Returns: float
+    Purpose: Exact cost of the cheapest obstacle-free 8-connected route between two cells.
+    """
+    def calculate_octile(self, x1, y1, x2, y2):
+        dx = abs(x1 - x2)
+        dy = abs(y1 - y2)
+        return max(dx, dy) + (SQRT_2 - 1) * min(dx, dy)
+
+    """
+    Name: get_jps_directions
+    Parameters: x (int), y (int), parent (tuple[int, int] | None)
+    Returns: list[tuple[int, int]]
+    Purpose: Returns the pruned set of directions to jump in from a node, given the node it was reached from.
+    """
+    def get_jps_directions(self, x, y, parent):
+        if parent is None:
+            return [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+
+        dx = (x > parent[0]) - (x < parent[0])
+        dy = (y > parent[1]) - (y < parent[1])
+        walkable = self.is_walkable
+        directions = []
+
+        if dx and dy:
+            directions.extend([(0, dy), (dx, 0), (dx, dy)])
+            if not walkable(x - dx, y):
+                directions.append((-dx, dy))
+            if not walkable(x, y - dy):
+                directions.append((dx, -dy))
+        elif dx:
+            directions.append((dx, 0))
+            if not walkable(x, y + 1):
+                directions.append((dx, 1))
+            if not walkable(x, y - 1):
+                directions.append((dx, -1))
+        else:
+            directions.append((0, dy))
+            if not walkable(x + 1, y):
+                directions.append((1, dy))
+            if not walkable(x - 1, y):
+                directions.append((-1, dy))
+
+        return directions
+
+    """
+    Name: jump_straight
+    Parameters: x (int), y (int), dx (int), dy (int), end_position (tuple[int, int])
+    Returns: tuple[int, int] | None
+    Purpose: Scans horizontally or vertically from a cell until a jump point, the goal or an obstacle is hit.
+    """
+    def jump_straight(self, x, y, dx, dy, end_position):
+        walkable = self.is_walkable
+        while True:
+            x += dx
+            y += dy
+            if not walkable(x, y):
+                return None
+            if (x, y) == end_position:
+                return x, y
+            if dx:
+                if (walkable(x + dx, y + 1) and not walkable(x, y + 1)) or \
+                        (walkable(x + dx, y - 1) and not walkable(x, y - 1)):
+                    return x, y
+            else:
+                if (walkable(x + 1, y + dy) and not walkable(x + 1, y)) or \
+                        (walkable(x - 1, y + dy) and not walkable(x - 1, y)):
+                    return x, y
+
+    """
+    Name: jump
+    Parameters: x (int), y (int), dx (int), dy (int), end_position (tuple[int, int])
+    Returns: tuple[int, int] | None
+    Purpose: Finds the next jump point from a cell in the given direction (iterative, so long scans cannot overflow the stack).
+    """
+    def jump(self, x, y, dx, dy, end_position):
+        if not (dx and dy):
+            return self.jump_straight(x, y, dx, dy, end_position)
+
+        walkable = self.is_walkable
+        while True:
+            x += dx
+            y += dy
+            if not walkable(x, y):
+                return None
+            if (x, y) == end_position:
+                return x, y
+            if (walkable(x - dx, y + dy) and not walkable(x - dx, y)) or \
+                    (walkable(x + dx, y - dy) and not walkable(x, y - dy)):
+                return x, y
+            if self.jump_straight(x, y, dx, 0, end_position) or self.jump_straight(x, y, 0, dy, end_position):
+                return x, y
+
+    """
+    Name: expand_jump_path
+    Parameters: jump_points (list[tuple[int, int]])
+    Returns: list[tuple[int, int]]
+    Purpose: Fills in every tile between consecutive jump points so the path can be followed one tile at a time.
+    """
+    def expand_jump_path(self, jump_points):
+        if not jump_points:
+            return []
+
+        path = [jump_points[0]]
+        for tx, ty in jump_points[1:]:
+            x, y = path[-1]
+            dx = (tx > x) - (tx < x)
+            dy = (ty > y) - (ty < y)
+            while (x, y) != (tx, ty):
+                x += dx
+                y += dy
+                path.append((x, y))
+        return path
+
+    """
+    Name: find_path_jps
+    Parameters: start_position (tuple[int, int]), end_position (tuple[int, int]), expand_jumps (bool)
+    Returns: list[tuple[int, int]] | None
+    Purpose: Finds an optimal path using Jump Point Search, optionally expanded back into per-tile steps.
+    """
+    @profiled("pathfinding.jps")
+    def find_path_jps(self, start_position, end_position, expand_jumps=True):
+        return run_search(self.iter_find_path_jps(start_position, end_position, expand_jumps))
+
+    """
+    Name: iter_find_path_jps
+    Parameters: start_position (tuple[int, int]), end_position (tuple[int, int]), expand_jumps (bool)
+    Returns: Generator[None, None, list[tuple[int, int]] | None]
+    Purpose: Resumable Jump Point Search that yields after every expanded node so callers can time-slice it.
+    """
+    def iter_find_path_jps(self, start_position, end_position, expand_jumps=True):
+        start_position = tuple(start_position)
+        end_position = tuple(end_position)
+        self.nodes_expanded = 0
+        if not self.is_walkable(*start_position) or not self.is_walkable(*end_position):
+            return None
+
+        ex, ey = end_position
+        g_costs = {start_position: 0}
+        parents = {start_position: None}
+        closed_set = set()
+        open_heap = [(self.calculate_octile(*start_position, ex, ey), 0, start_position)]
+        counter = 0  # Tie-breaker so the heap never compares positions
+
+        while open_heap:
+            _, _, current = heapq.heappop(open_heap)
+            if current in closed_set:
+                continue
+            closed_set.add(current)
+            self.nodes_expanded += 1
+
+            if current == end_position:
+                jump_points = []
+                while current is not None:
+                    jump_points.append(current)
+                    current = parents[current]
+                jump_points.reverse()
+                return self.expand_jump_path(jump_points) if expand_jumps else jump_points
+
+            yield
+            cx, cy = current
+            for dx, dy in self.get_jps_directions(cx, cy, parents[current]):
+                jump_point = self.jump(cx, cy, dx, dy, end_position)
+                if jump_point is None or jump_point in closed_set:
+                    continue
+
+                new_g_cost = g_costs[current] + self.calculate_octile(cx, cy, *jump_point)
+                if new_g_cost < g_costs.get(jump_point, math.inf):
+                    g_costs[jump_point] = new_g_cost
+                    parents[jump_point] = current
+                    counter += 1
+                    f_cost = new_g_cost + self.calculate_octile(*jump_point, ex, ey)
+                    heapq.heappush(open_heap, (f_cost, counter, jump_point))
+
+        return None
+
+    """
+    Name: find_paths_from_goal
+    Parameters: goal (tuple[int, int]), starts (list[tuple[int, int]])
+    Returns: dict[tuple[int, int], list[tuple[int, int]] | None]
+    Purpose: Runs one reverse Dijkstra search from a shared goal and returns a path for every start.
+    """
+    def find_paths_from_goal(self, goal, starts):
+        self.nodes_expanded = 0
+        paths = {start: None for start in starts}
+        if not self.is_walkable(*goal):
+            return paths
+
+        remaining = {start for start in starts if self.is_walkable(*start)}
+        costs = {goal: 0}
+        parents = {goal: None}  # Points one step closer to the goal
+        settled = set()
+        open_heap = [(0, goal)]
+
+        while open_heap and remaining:
+            cost, current = heapq.heappop(open_heap)
+            if current in settled:
+                continue
+            settled.add(current)
+            remaining.discard(current)
+            self.nodes_expanded += 1
+
+            x, y = current
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    neighbor = (x + dx, y + dy)
+                    if not (dx or dy) or neighbor in settled or not self.is_walkable(*neighbor):
+                        continue
+                    new_cost = cost + (SQRT_2 if dx and dy else 1)
+                    if new_cost < costs.get(neighbor, math.inf):
+                        costs[neighbor] = new_cost
+                        parents[neighbor] = current
+                        heapq.heappush(open_heap, (new_cost, neighbor))
+
+        for start in starts:
+            if start in settled:
+                path = []
+                current = start
+                while current is not None:
+                    path.append(current)
+                    current = parents[current]
+                paths[start] = path
+        return paths
+
+    """
+    Name: solve_query_group
+    Parameters: goal (tuple[int, int]), queries (list[tuple[int, tuple[int, int]]])
+    Returns: list[tuple[int, PathResult]]
+    Purpose: Solves every (index, start) query sharing a goal, using JPS for one start or a reverse search for many.
+    """
+    def solve_query_group(self, goal, queries):
+        start_time = time.perf_counter()
+        if len(queries) == 1:
+            paths = {queries[0][1]: self.find_path_jps(queries[0][1], goal)}
+        else:
+            paths = self.find_paths_from_goal(goal, [start for _, start in queries])
+        time_ms = (time.perf_counter() - start_time) * 1000
+
+        return [
+            (index, PathResult(paths[start], self.nodes_expanded, time_ms, len(queries)))
+            for index, start in queries
+        ]
+
+    """
+    Name: find_paths
+    Parameters: queries (list[tuple[tuple[int, int], tuple[int, int]]]), workers (int | None)
+    Returns: list[PathResult]
+    Purpose: Solves many (start, end) queries at once, in input order, on a process pool sharing one grid.
+    """
+    def find_paths(self, queries, workers=None):
+        groups = {}  # goal -> [(index, start)]
+        for index, (start, end) in enumerate(queries):
+            groups.setdefault(tuple(end), []).append((index, tuple(start)))
+
+        results = [None] * len(queries)
+        workers = os.cpu_count() if workers is None else workers
+        if workers <= 1 or len(groups) == 1:
+            for goal, group in groups.items():
+                for index, result in self.solve_query_group(goal, group):
+                    results[index] = result
+            return results
+
+        # Workers copy the grid out of shared memory once, instead of it being pickled with every task
+        shared_grid = shared_memory.SharedMemory(create=True, size=max(1, self.grid_width * self.grid_height))
+        try:
+            shared_grid.buf[:self.grid_width * self.grid_height] = bytes(
+                0 if node.walkable else 1 for row in self.grid_nodes for node in row
+            )
+            with ProcessPoolExecutor(max_workers=min(workers, len(groups)), initializer=init_path_worker,
+                                     initargs=(shared_grid.name, self.grid_width, self.grid_height)) as executor:
+                for group_results in executor.map(solve_path_worker_group, groups.items()):
+                    for index, result in group_results:
+                        results[index] = result
+        finally:
+            shared_grid.close()
+            shared_grid.unlink()
+
+        return results
+
+
+class HierarchicalPathfinder:
+    """
+    Name: __init__
+    Parameters: grid (list[list[int]]), cluster_size (int)
+    Returns: None
+    Purpose: Sets up HPA* over the grid. Clusters are built lazily the first time a search reaches them.
+    """
+    def __init__(self, grid, cluster_size=CLUSTER_SIZE):
+        self.pathfinder = Pathfinder(grid)  # Owns the walkability data
+        self.cluster_size = cluster_size
+        self.borders = {}  # (cluster_a, cluster_b) -> list of (cell_a, cell_b) transitions
+        self.cluster_links = {}  # cluster -> {entrance: {abstract_node: cost}}
+        self.nodes_expanded = 0  # Nodes expanded by the most recent query, abstract and local
+
+    """
+    Name: get_cluster
+    Parameters: x (int), y (int)
+    Returns: tuple[int, int]
+    Purpose: Returns the cluster coordinates that contain a tile.
+    """
+    def get_cluster(self, x, y):
+        return x // self.cluster_size, y // self.cluster_size
+
+    """
+    Name: get_cluster_bounds
+    Parameters: cluster (tuple[int, int])
+    Returns: tuple[int, int, int, int]
+    Purpose: Returns the (min_x, min_y, max_x, max_y) tile bounds of a cluster, max values exclusive.
+    """
+    def get_cluster_bounds(self, cluster):
+        min_x = cluster[0] * self.cluster_size
+        min_y = cluster[1] * self.cluster_size
+        max_x = min(min_x + self.cluster_size, self.pathfinder.grid_width)
+        max_y = min(min_y + self.cluster_size, self.pathfinder.grid_height)
+        return min_x, min_y, max_x, max_y
+
+    """
+    Name: get_adjacent_clusters
+    Parameters: cluster (tuple[int, int])
+    Returns: list[tuple[int, int]]
+    Purpose: Returns the up to eight clusters touching a cluster, including diagonal corners.
+    """
+    def get_adjacent_clusters(self, cluster):
+        max_cx, max_cy = self.get_cluster(self.pathfinder.grid_width - 1, self.pathfinder.grid_height - 1)
+        adjacent = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                cx, cy = cluster[0] + dx, cluster[1] + dy
+                if (dx or dy) and 0 <= cx <= max_cx and 0 <= cy <= max_cy:
+                    adjacent.append((cx, cy))
+        return adjacent
+
+    """
+    Name: build_border
+    Parameters: cluster_a (tuple[int, int]), cluster_b (tuple[int, int])
+    Returns: list[tuple[tuple[int, int], tuple[int, int]]]
+    Purpose: Finds the transition cell pairs across the border shared by two adjacent clusters.
+    """
+    def build_border(self, cluster_a, cluster_b):
+        walkable = self.pathfinder.is_walkable
+        dx = cluster_b[0] - cluster_a[0]
+        dy = cluster_b[1] - cluster_a[1]
+        corner_x = max(cluster_a[0], cluster_b[0]) * self.cluster_size
+        corner_y = max(cluster_a[1], cluster_b[1]) * self.cluster_size
+
+        # Diagonal neighbours only share a single corner crossing
+        if dx and dy:
+            cell_a = (corner_x - 1 if dx > 0 else corner_x, corner_y - 1 if dy > 0 else corner_y)
+            cell_b = (cell_a[0] + dx, cell_a[1] + dy)
+            if walkable(*cell_a) and walkable(*cell_b):
+                return [(cell_a, cell_b)]
+            return []
+
+        min_x, min_y, max_x, max_y = self.get_cluster_bounds(cluster_a)
+        if dx:
+            cells_a = [(corner_x - 1, y) for y in range(min_y, max_y)]
+        else:
+            cells_a = [(x, corner_y - 1) for x in range(min_x, max_x)]
+        cells_b = [(x + dx, y + dy) for x, y in cells_a]
+        open_a = [walkable(*cell) for cell in cells_a]
+        open_b = [walkable(*cell) for cell in cells_b]
+
+        transitions = []
+        run_start = None
+        for i in range(len(cells_a) + 1):
+            is_open = i < len(cells_a) and open_a[i] and open_b[i]
+            if is_open and run_start is None:
+                run_start = i
+            elif not is_open and run_start is not None:
+                run_end = i - 1
+                if run_end - run_start + 1 >= ENTRANCE_SPLIT_LENGTH:
+                    transitions.append((cells_a[run_start], cells_b[run_start]))
+                    transitions.append((cells_a[run_end], cells_b[run_end]))
+                else:
+                    middle = (run_start + run_end) // 2
+                    transitions.append((cells_a[middle], cells_b[middle]))
+                run_start = None
+
+        # Corner cutting lets agents cross diagonally where no straight crossing exists
+        for i in range(len(cells_a)):
+            for j in (i - 1, i + 1):
+                if 0 <= j < len(cells_a) and open_a[i] and open_b[j] and not open_b[i] and not open_a[j]:
+                    transitions.append((cells_a[i], cells_b[j]))
+
+        return transitions
+
+    """
+    Name: get_border
+    Parameters: cluster_a (tuple[int, int]), cluster_b (tuple[int, int])
+    Returns: list[tuple[tuple[int, int], tuple[int, int]]]
+    Purpose: Returns the cached transitions between two clusters, building them on first use.
+    """
+    def get_border(self, cluster_a, cluster_b):
+        key = (min(cluster_a, cluster_b), max(cluster_a, cluster_b))
+        if key not in self.borders:
+            self.borders[key] = self.build_border(*key)
+        return self.borders[key]
+
+    """
+    Name: costs_in_bounds
+    Parameters: source (tuple[int, int]), targets (set[tuple[int, int]]), bounds (tuple[int, int, int, int])
+    Returns: dict[tuple[int, int], float]
+    Purpose: Runs Dijkstra inside a cluster and returns the cost from the source to every reachable target.
+    """
+    def costs_in_bounds(self, source, targets, bounds):
+        min_x, min_y, max_x, max_y = bounds
+        walkable = self.pathfinder.is_walkable
+        remaining = set(targets)
+        remaining.discard(source)
+        costs = {source: 0}
+        found = {source: 0} if source in targets else {}
+        open_heap = [(0, source)]
+
+        while open_heap and remaining:
+            cost, (x, y) = heapq.heappop(open_heap)
+            if cost > costs[(x, y)]:
+                continue
+            self.nodes_expanded += 1
+            if (x, y) in remaining:
+                remaining.discard((x, y))
+                found[(x, y)] = cost
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    nx, ny = x + dx, y + dy
+                    if not (dx or dy) or not (min_x <= nx < max_x and min_y <= ny < max_y) or not walkable(nx, ny):
+                        continue
+                    new_cost = cost + (SQRT_2 if dx and dy else 1)
+                    if new_cost < costs.get((nx, ny), math.inf):
+                        costs[(nx, ny)] = new_cost
+                        heapq.heappush(open_heap, (new_cost, (nx, ny)))
+
+        return found
+
+    """
+    Name: search_in_bounds
+    Parameters: start (tuple[int, int]), goal (tuple[int, int]), bounds (tuple[int, int, int, int])
+    Returns: list[tuple[int, int]] | None
+    Purpose: Runs A* restricted to a cluster, used to refine abstract path segments into tiles.
+    """
+    def search_in_bounds(self, start, goal, bounds):
+        min_x, min_y, max_x, max_y = bounds
+        walkable = self.pathfinder.is_walkable
+        octile = self.pathfinder.calculate_octile
+        costs = {start: 0}
+        parents = {start: None}
+        open_heap = [(octile(*start, *goal), 0, start)]
+
+        while open_heap:
+            _, cost, current = heapq.heappop(open_heap)
+            if cost > costs[current]:
+                continue
+            self.nodes_expanded += 1
+            if current == goal:
+                path = []
+                while current is not None:
+                    path.append(current)
+                    current = parents[current]
+                return path[::-1]
+            x, y = current
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    nx, ny = x + dx, y + dy
+                    if not (dx or dy) or not (min_x <= nx < max_x and min_y <= ny < max_y) or not walkable(nx, ny):
+                        continue
+                    new_cost = cost + (SQRT_2 if dx and dy else 1)
+                    if new_cost < costs.get((nx, ny), math.inf):
+                        costs[(nx, ny)] = new_cost
+                        parents[(nx, ny)] = current
+                        heapq.heappush(open_heap, (new_cost + octile(nx, ny, *goal), new_cost, (nx, ny)))
+
+        return None
+
+    """
+    Name: get_cluster_links
+    Parameters: cluster (tuple[int, int])
+    Returns: dict[tuple[int, int], dict[tuple[int, int], float]]
+    Purpose: Returns the abstract graph edges leaving each entrance of a cluster, building them on first use.
+    """
+    def get_cluster_links(self, cluster):
+        if cluster in self.cluster_links:
+            return self.cluster_links[cluster]
+
+        links = {}
+        for other in self.get_adjacent_clusters(cluster):
+            for cell_a, cell_b in self.get_border(cluster, other):
+                inside, outside = (cell_a, cell_b) if self.get_cluster(*cell_a) == cluster else (cell_b, cell_a)
+                links.setdefault(inside, {})[outside] = self.pathfinder.calculate_octile(*inside, *outside)
+
+        # Intra-cluster edges between every pair of entrances
+        bounds = self.get_cluster_bounds(cluster)
+        entrances = set(links)
+        for entrance in entrances:
+            for other, cost in self.costs_in_bounds(entrance, entrances, bounds).items():
+                if other != entrance:
+                    links[entrance][other] = cost
+
+        self.cluster_links[cluster] = links
+        return links
+
+    """
+    Name: set_walkable
+    Parameters: x (int), y (int), walkable (bool)
+    Returns: None
+    Purpose: Updates a tile and invalidates only the clusters and borders it can affect.
+    """
+    def set_walkable(self, x, y, walkable):
+        node = self.pathfinder.get_node_at(x, y)
+        if node is None or node.walkable == walkable:
+            return
+        node.walkable = walkable
+
+        cluster = self.get_cluster(x, y)
+        self.cluster_links.pop(cluster, None)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                if not self.pathfinder.get_node_at(x + dx, y + dy):
+                    continue
+                other = self.get_cluster(x + dx, y + dy)
+                if other != cluster:
+                    self.borders.pop((min(cluster, other), max(cluster, other)), None)
+                    self.cluster_links.pop(other, None)
+
+    """
+    Name: find_abstract_path
+    Parameters: start_position (tuple[int, int]), end_position (tuple[int, int])
+    Returns: list[tuple[int, int]] | None
+    Purpose: Searches the abstract entrance graph and returns the start, the entrances crossed and the end.
+    """
+    def find_abstract_path(self, start_position, end_position):
+        start = tuple(start_position)
+        end = tuple(end_position)
+        if not self.pathfinder.is_walkable(*start) or not self.pathfinder.is_walkable(*end):
+            return None
+
+        start_cluster = self.get_cluster(*start)
+        end_cluster = self.get_cluster(*end)
+
+        # Temporarily connect the start and end to the entrances of their clusters
+        start_links = self.costs_in_bounds(
+            start, set(self.get_cluster_links(start_cluster)), self.get_cluster_bounds(start_cluster))
+        end_links = self.costs_in_bounds(
+            end, set(self.get_cluster_links(end_cluster)), self.get_cluster_bounds(end_cluster))
+        if start_cluster == end_cluster:
+            local_path = self.search_in_bounds(start, end, self.get_cluster_bounds(start_cluster))
+            if local_path:
+                start_links[end] = get_path_cost(local_path)
+
+        octile = self.pathfinder.calculate_octile
+        costs = {start: 0}
+        parents = {start: None}
+        open_heap = [(octile(*start, *end), 0, 0, start)]
+        counter = 0
+
+        while open_heap:
+            _, cost, _, current = heapq.heappop(open_heap)
+            if cost > costs[current]:
+                continue
+            self.nodes_expanded += 1
+            if current == end:
+                path = []
+                while current is not None:
+                    path.append(current)
+                    current = parents[current]
+                return path[::-1]
+
+            edges = dict(self.get_cluster_links(self.get_cluster(*current)).get(current, {}))
+            if current == start:
+                edges.update(start_links)
+            if current in end_links:
+                edges[end] = end_links[current]
+
+            for neighbor, edge_cost in edges.items():
+                new_cost = costs[current] + edge_cost
+                if new_cost < costs.get(neighbor, math.inf):
+                    costs[neighbor] = new_cost
+                    parents[neighbor] = current
+                    counter += 1
+                    heapq.heappush(open_heap, (new_cost + octile(*neighbor, *end), new_cost, counter, neighbor))
+
+        return None
+
+    """
+    Name: refine_path
+    Parameters: abstract_path (list[tuple[int, int]]), max_clusters (int | None)
+    Returns: list[tuple[int, int]]
+    Purpose: Expands an abstract path into tiles, stopping after max_clusters clusters so the rest stays lazy.
+    """
+    def refine_path(self, abstract_path, max_clusters=None):
+        if not abstract_path:
+            return []
+
+        path = [abstract_path[0]]
+        clusters_refined = 0
+        for current, following in zip(abstract_path, abstract_path[1:]):
+            cluster = self.get_cluster(*current)
+            if cluster != self.get_cluster(*following):
+                path.append(following)  # Inter-cluster edges are always between adjacent tiles
+                continue
+            if max_clusters is not None and clusters_refined >= max_clusters:
+                break
+            segment = self.search_in_bounds(current, following, self.get_cluster_bounds(cluster))
+            path.extend(segment[1:])
+            clusters_refined += 1
+
+        return path
+
+    """
+    Name: find_local_path
+    Parameters: start (tuple[int, int]), end (tuple[int, int])
+    Returns: list[tuple[int, int]] | None
+    Purpose: Searches directly when the start and end are in the same or neighbouring clusters, where the entrance
+             graph only adds detours. The search is kept to those clusters and one cluster around them.
+    """
+    def find_local_path(self, start, end):
+        start_cluster = self.get_cluster(*start)
+        end_cluster = self.get_cluster(*end)
+        if max(abs(start_cluster[0] - end_cluster[0]), abs(start_cluster[1] - end_cluster[1])) > 1:
+            return None
+        size = self.cluster_size
+        bounds = (
+            max(0, (min(start_cluster[0], end_cluster[0]) - 1) * size),
+            max(0, (min(start_cluster[1], end_cluster[1]) - 1) * size),
+            min(self.pathfinder.grid_width, (max(start_cluster[0], end_cluster[0]) + 2) * size),
+            min(self.pathfinder.grid_height, (max(start_cluster[1], end_cluster[1]) + 2) * size)
+        )
+        return self.search_in_bounds(start, end, bounds)
+
+    """
+    Name: smooth_path
+    Parameters: path (list[tuple[int, int]])
+    Returns: list[tuple[int, int]]
+    Purpose: Straightens the path around each cluster border crossing. The stretch from a cluster before to a
+             cluster after the crossing is searched again, so it no longer has to pass through the entrance tiles.
+    """
+    def smooth_path(self, path):
+        get_cluster = self.get_cluster
+        crossings = [i for i in range(len(path) - 1) if get_cluster(*path[i]) != get_cluster(*path[i + 1])]
+        for crossing in reversed(crossings):  # Back to front, so earlier indices stay valid
+            first = max(0, crossing - self.cluster_size)
+            last = min(len(path) - 1, crossing + 1 + self.cluster_size)
+            stretch = path[first:last + 1]
+            stretch_cost = get_path_cost(stretch)
+            if stretch_cost <= self.pathfinder.calculate_octile(*path[first], *path[last]) + 1e-9:
+                continue  # Already as short as an open field allows
+            bounds = (
+                max(0, min(x for x, _ in stretch) - SMOOTHING_MARGIN),
+                max(0, min(y for _, y in stretch) - SMOOTHING_MARGIN),
+                min(self.pathfinder.grid_width, max(x for x, _ in stretch) + SMOOTHING_MARGIN + 1),
+                min(self.pathfinder.grid_height, max(y for _, y in stretch) + SMOOTHING_MARGIN + 1)
+            )
+            straighter = self.search_in_bounds(path[first], path[last], bounds)
+            if straighter and get_path_cost(straighter) < stretch_cost - 1e-9:
+                path[first:last + 1] = straighter
+        return path
+
+    """
+    Name: find_path
+    Parameters: start_position (tuple[int, int]), end_position (tuple[int, int]), refine_clusters (int | None)
+    Returns: list[tuple[int, int]] | None
+    Purpose: Finds a tile path using HPA*, refining only the first refine_clusters clusters when given. Nearby
+             goals are searched directly, and the refined path is smoothed across cluster borders.
+    """
+    @profiled("pathfinding.hpa")
+    def find_path(self, start_position, end_position, refine_clusters=None):
+        self.nodes_expanded = 0
+        start = tuple(start_position)
+        end = tuple(end_position)
+        if not self.pathfinder.is_walkable(*start) or not self.pathfinder.is_walkable(*end):
+            return None
+        local_path = self.find_local_path(start, end)
+        if local_path is not None:
+            return local_path
+        abstract_path = self.find_abstract_path(start, end)
+        if abstract_path is None:
+            return None
+        return self.smooth_path(self.refine_path(abstract_path, refine_clusters))
+
+
+class FlowField:
+    """
+    Name: __init__
+    Parameters: grid (list[list[int]]), radius (float)
+    Returns: None
+    Purpose: Holds a Dijkstra map towards one target so any number of agents can look up their next step.
+    """
+    def __init__(self, grid, radius=FLOW_FIELD_RADIUS):
+        self.pathfinder = Pathfinder(grid)  # Owns the walkability data
+        self.radius = radius
+        self.target = None
+        self.distances = {}  # (x, y) -> path cost to the target
+        self.next_steps = {}  # (x, y) -> neighbouring tile one step closer to the target
+
+    """
+    Name: propagate
+    Parameters: open_heap (list[tuple[float, tuple[int, int]]])
+    Returns: None
+    Purpose: Relaxes distances outward from the queued tiles, keeping only tiles within the radius.
+    """
+    def propagate(self, open_heap):
+        walkable = self.pathfinder.is_walkable
+        distances = self.distances
+        next_steps = self.next_steps
+
+        while open_heap:
+            cost, (x, y) = heapq.heappop(open_heap)
+            if cost > distances.get((x, y), math.inf):
+                continue
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    nx, ny = x + dx, y + dy
+                    if not (dx or dy) or not walkable(nx, ny):
+                        continue
+                    new_cost = cost + (SQRT_2 if dx and dy else 1)
+                    if new_cost <= self.radius and new_cost < distances.get((nx, ny), math.inf):
+                        distances[(nx, ny)] = new_cost
+                        next_steps[(nx, ny)] = (x, y)
+                        heapq.heappush(open_heap, (new_cost, (nx, ny)))
+
+    """
+    Name: compute
+    Parameters: target_x (int), target_y (int)
+    Returns: None
+    Purpose: Rebuilds the whole field from scratch around a target tile.
+    """
+    @profiled("pathfinding.flow_field")
+    def compute(self, target_x, target_y):
+        self.target = (target_x, target_y)
+        self.distances = {}
+        self.next_steps = {}
+        if not self.pathfinder.is_walkable(target_x, target_y):
+            return
+
+        self.distances[self.target] = 0
+        self.next_steps[self.target] = None
+        self.propagate([(0, self.target)])
+
+    """
+    Name: update_target
+    Parameters: target_x (int), target_y (int)
+    Returns: None
+    Purpose: Moves the target, repairing the existing field when it only stepped to a neighbouring tile.
+    """
+    @profiled("pathfinding.flow_field")
+    def update_target(self, target_x, target_y):
+        new_target = (target_x, target_y)
+        if new_target == self.target:
+            return
+
+        old_target = self.target
+        if old_target is None or new_target not in self.distances or \
+                max(abs(target_x - old_target[0]), abs(target_y - old_target[1])) != 1:
+            self.compute(target_x, target_y)
+            return
+
+        # Every old route plus the single step from the old target is still a valid upper bound,
+        # so only tiles that get closer to the new target need revisiting.
+        step_cost = self.pathfinder.calculate_octile(*old_target, *new_target)
+        edge_cost = self.radius - SQRT_2 + step_cost
+        open_heap = []
+        for tile in self.distances:
+            self.distances[tile] += step_cost
+            if self.distances[tile] > edge_cost:
+                open_heap.append((self.distances[tile], tile))  # Edge of the old field may grow outwards
+
+        self.next_steps[old_target] = new_target
+        self.distances[new_target] = 0
+        self.next_steps[new_target] = None
+        self.target = new_target
+        open_heap.append((0, new_target))
+        heapq.heapify(open_heap)
+        self.propagate(open_heap)
+
+        for tile in [tile for tile, cost in self.distances.items() if cost > self.radius]:
+            del self.distances[tile]
+            del self.next_steps[tile]
+
+    """
+    Name: get_next_step
+    Parameters: x (int), y (int)
+    Returns: tuple[int, int] | None
+    Purpose: Returns the neighbouring tile an agent at (x, y) should move to, or None if outside the field.
+    """
+    def get_next_step(self, x, y):
+        return self.next_steps.get((x, y))
+
+    """
+    Name: get_distance
+    Parameters: x (int), y (int)
+    Returns: float | None
+    Purpose: Returns the path cost from a tile to the target, or None if outside the field.
+    """
+    def get_distance(self, x, y):
+        return self.distances.get((x, y))
+
+
+class IncrementalPathfinder:
+    """
+    Name: __init__
+    Parameters: grid (list[list[int]] | None), pathfinder (Pathfinder | None): Existing walkability data to search
+                instead of building it from grid
+    Returns: None
+    Purpose: D* Lite planner that keeps its search tree between queries and only repairs what changed.
+    """
+    def __init__(self, grid, pathfinder=None):
+        self.pathfinder = pathfinder or Pathfinder(grid)  # Walkability data, shared when one was passed in
+        self.start = None
+        self.goal = None
+        self.key_modifier = 0  # Accumulated heuristic drift from start moves (km)
+        self.g_costs = {}  # (x, y) -> cost to the goal found so far
+        self.rhs_costs = {}  # (x, y) -> one-step lookahead cost to the goal
+        self.open_heap = []
+        self.open_keys = {}  # (x, y) -> key of its live heap entry
+        self.nodes_expanded = 0  # Nodes expanded by the most recent query
+
+    """
+    Name: get_neighbors
+    Parameters: position (tuple[int, int])
+    Returns: list[tuple[int, int]]
+    Purpose: Returns every in-bounds neighbouring tile, walkable or not.
+    """
+    def get_neighbors(self, position):
+        x, y = position
+        return [
+            (x + dx, y + dy)
+            for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+            if (dx or dy) and 0 <= x + dx < self.pathfinder.grid_width and 0 <= y + dy < self.pathfinder.grid_height
+        ]
+
+    """
+    Name: get_edge_cost
+    Parameters: position_a (tuple[int, int]), position_b (tuple[int, int])
+    Returns: float
+    Purpose: Returns the cost of stepping between two neighbouring tiles, or infinity if either is blocked.
+    """
+    def get_edge_cost(self, position_a, position_b):
+        if not self.pathfinder.is_walkable(*position_a) or not self.pathfinder.is_walkable(*position_b):
+            return math.inf
+        return SQRT_2 if position_a[0] != position_b[0] and position_a[1] != position_b[1] else 1
+
+    """
+    Name: calculate_key
+    Parameters: position (tuple[int, int])
+    Returns: tuple[float, float]
+    Purpose: Computes the D* Lite priority of a tile relative to the current start.
+    """
+    def calculate_key(self, position):
+        cost = min(self.g_costs.get(position, math.inf), self.rhs_costs.get(position, math.inf))
+        return cost + self.pathfinder.calculate_octile(*self.start, *position) + self.key_modifier, cost
+
+    """
+    Name: update_vertex
+    Parameters: position (tuple[int, int])
+    Returns: None
+    Purpose: Recomputes a tile's lookahead cost and queues it if it became inconsistent.
+    """
+    def update_vertex(self, position):
+        if position != self.goal:
+            best_cost = math.inf
+            if self.pathfinder.is_walkable(*position):
+                g_costs = self.g_costs
+                for neighbor in self.get_neighbors(position):
+                    cost = g_costs.get(neighbor, math.inf)
+                    if cost < best_cost and self.pathfinder.is_walkable(*neighbor):
+                        cost += SQRT_2 if neighbor[0] != position[0] and neighbor[1] != position[1] else 1
+                        best_cost = min(best_cost, cost)
+            self.rhs_costs[position] = best_cost
+
+        if self.g_costs.get(position, math.inf) != self.rhs_costs.get(position, math.inf):
+            key = self.calculate_key(position)
+            self.open_keys[position] = key
+            heapq.heappush(self.open_heap, (key, position))
+        else:
+            self.open_keys.pop(position, None)
+
+    """
+    Name: compute_shortest_path
+    Parameters: None
+    Returns: None
+    Purpose: Expands inconsistent tiles until the start's cost is correct.
+    """
+    def compute_shortest_path(self):
+        run_search(self.iter_compute_shortest_path())
+
+    """
+    Name: iter_compute_shortest_path
+    Parameters: None
+    Returns: Generator[None, None, None]
+    Purpose: Resumable compute_shortest_path that yields after every expanded tile. The tree stays valid between
+             expansions, so an abandoned run is simply carried on by the next query.
+    """
+    def iter_compute_shortest_path(self):
+        while self.open_heap:
+            key, position = self.open_heap[0]
+            if self.open_keys.get(position) != key:
+                heapq.heappop(self.open_heap)  # Superseded entry
+                continue
+
+            # Ties with the start are expanded too, otherwise path extraction can walk into stale tiles
+            start_g = self.g_costs.get(self.start, math.inf)
+            if key[0] > self.calculate_key(self.start)[0] + KEY_TOLERANCE and \
+                    self.rhs_costs.get(self.start, math.inf) == start_g:
+                break
+
+            heapq.heappop(self.open_heap)
+            new_key = self.calculate_key(position)
+            if key < new_key:
+                self.open_keys[position] = new_key
+                heapq.heappush(self.open_heap, (new_key, position))
+                continue
+
+            del self.open_keys[position]
+            self.nodes_expanded += 1
+            if self.g_costs.get(position, math.inf) > self.rhs_costs.get(position, math.inf):
+                self.g_costs[position] = self.rhs_costs[position]
+            else:
+                self.g_costs[position] = math.inf
+                self.update_vertex(position)
+            for neighbor in self.get_neighbors(position):
+                self.update_vertex(neighbor)
+            yield
+
+    """
+    Name: reset
+    Parameters: start (tuple[int, int]), goal (tuple[int, int])
+    Returns: None
+    Purpose: Discards the search tree and seeds a fresh search towards the goal.
+    """
+    def reset(self, start, goal):
+        self.start = start
+        self.goal = goal
+        self.key_modifier = 0
+        self.g_costs = {}
+        self.rhs_costs = {goal: 0}
+        self.open_heap = []
+        self.open_keys = {}
+        self.update_vertex(goal)
+
+    """
+    Name: move_goal
+    Parameters: goal (tuple[int, int])
+    Returns: None
+    Purpose: Re-roots the search tree on a new goal already inside it instead of starting over.
+    """
+    def move_goal(self, goal):
+        step_cost = self.g_costs.get(goal, math.inf)
+        if step_cost == math.inf or step_cost != self.rhs_costs.get(goal):
+            self.reset(self.start, goal)
+            return
+
+        # Every old route followed by the path to the new goal is still a valid route,
+        # so shifting all costs keeps most tiles consistent and only shorter routes get repaired.
+        for position in self.g_costs:
+            self.g_costs[position] += step_cost
+        for position in self.rhs_costs:
+            self.rhs_costs[position] += step_cost
+
+        old_goal = self.goal
+        self.goal = goal
+        self.rhs_costs[goal] = 0
+        self.update_vertex(goal)
+        self.update_vertex(old_goal)
+
+    """
+    Name: set_walkable
+    Parameters: x (int), y (int), walkable (bool)
+    Returns: None
+    Purpose: Updates a tile and queues the affected tiles for repair on the next query.
+    """
+    def set_walkable(self, x, y, walkable):
+        node = self.pathfinder.get_node_at(x, y)
+        if node is None or node.walkable == walkable:
+            return
+        node.walkable = walkable
+
+        if self.goal is not None:
+            self.update_vertex((x, y))
+            for neighbor in self.get_neighbors((x, y)):
+                self.update_vertex(neighbor)
+
+    """
+    Name: find_path
+    Parameters: start_position (tuple[int, int]), end_position (tuple[int, int])
+    Returns: list[tuple[int, int]] | None
+    Purpose: Finds a path, reusing the previous search when the start or goal only moved slightly.
+    """
+    @profiled("pathfinding.incremental")
+    def find_path(self, start_position, end_position):
+        return run_search(self.iter_find_path(start_position, end_position))
+
+    """
+    Name: iter_find_path
+    Parameters: start_position (tuple[int, int]), end_position (tuple[int, int])
+    Returns: Generator[None, None, list[tuple[int, int]] | None]
+    Purpose: Resumable find_path that yields after every expanded tile so callers can time-slice it.
+    """
+    def iter_find_path(self, start_position, end_position):
+        start = tuple(start_position)
+        goal = tuple(end_position)
+        self.nodes_expanded = 0
+        if not self.pathfinder.is_walkable(*start) or not self.pathfinder.is_walkable(*goal):
+            return None
+
+        if self.goal is None:
+            self.reset(start, goal)
+        else:
+            if start != self.start:
+                self.key_modifier += self.pathfinder.calculate_octile(*self.start, *start)
+                self.start = start
+            if goal != self.goal:
+                self.move_goal(goal)
+
+        yield from self.iter_compute_shortest_path()
+        if self.g_costs.get(start, math.inf) == math.inf:
+            return None
+
+        path = [start]
+        current = start
+        while current != goal:
+            current = min(
+                self.get_neighbors(current),
+                key=lambda n: self.get_edge_cost(current, n) + self.g_costs.get(n, math.inf)
+            )
+            path.append(current)
+            if len(path) > len(self.g_costs) + 1:
+                return None  # Safety net against an inconsistent tree
+        return path
+
+
+worker_pathfinder = None  # Per-process Pathfinder used by find_paths workers
+
+
+"""
+Name: init_path_worker
+Parameters: shared_grid_name (str), width (int), height (int)
+Returns: None
+Purpose: Process pool initializer that builds the worker's Pathfinder from the shared grid once.
+"""
+def init_path_worker(shared_grid_name, width, height):
+    global worker_pathfinder
+    shared_grid = shared_memory.SharedMemory(name=shared_grid_name)
+    cells = bytes(shared_grid.buf[:width * height])
+    shared_grid.close()
+    worker_pathfinder = Pathfinder([list(cells[y * width:(y + 1) * width]) for y in range(height)])
+
+
+"""
+Name: solve_path_worker_group
+Parameters: group (tuple[tuple[int, int], list[tuple[int, tuple[int, int]]]])
+Returns: list[tuple[int, PathResult]]
+Purpose: Process pool task that solves one goal group on the worker's Pathfinder.
+"""
+def solve_path_worker_group(group):
+    return worker_pathfinder.solve_query_group(*group)
+
+
+"""
+Name: get_path_cost
+Parameters: path (list[tuple[int, int]])
+Returns: float
+Purpose: Sums the 8-connected step costs along a tile path.
+"""
+def get_path_cost(path):
+    return sum(SQRT_2 if a[0] != b[0] and a[1] != b[1] else 1 for a, b in zip(path, path[1:]))
+
+
+"""
+Name: run_search
+Parameters: search (Generator)
+Returns: list[tuple[int, int]] | None
+Purpose: Runs a resumable search to completion and returns its path.
+"""
+def run_search(search):
+    while True:
+        try:
+            next(search)
+        except StopIteration as finished:
+            return finished.value
+
 
 """
 Name: display_grid_with_path
@@ -0,0 +1,240 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+PROFILE_HISTORY = 120  # Frames kept for rolling averages and percentiles
+MAX_TRACE_EVENTS = 1000000  # Trace recording stops growing past this many events
+TRACE_FILE = "profile_trace_{}.json"  # Formatted with a timestamp when a trace is saved from the overlay
+
+NO_STAGE = nullcontext()  # Shared by every stage while profiling is off, so a disabled stage costs one attribute check
+
+
+class ProfileStage:
+    __slots__ = ("profiler", "name", "start")
+
+    """
+    Name: __init__
+    Parameters: profiler (FrameProfiler), name (str)
+    Returns: None
+    Purpose: Times one run of a named stage between entering and leaving a with block.
+    """
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    """
+    Name: __enter__
+    Parameters: None
+    Returns: ProfileStage
+    Purpose: Starts the timer.
+    """
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    """
+    Name: __exit__
+    Parameters: exc_info (tuple): Exception details, if the block raised
+    Returns: bool
+    Purpose: Stops the timer and records the stage, letting any exception carry on.
+    """
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class FrameProfiler:
+    """
+    Name: __init__
+    Parameters: history (int)
+    Returns: None
+    Purpose: Collects named stage timings per frame. Stages on other threads are kept apart under the thread's name,
+             since they do not add to the frame's time.
+    """
+    def __init__(self, history=PROFILE_HISTORY):
+        self.enabled = False
+        self.history = history
+        self.frame_times = deque(maxlen=history)  # Whole frame in ms, including any wait for the frame cap
+        # Net change in allocated memory blocks per frame. Blocks freed within the frame cancel out, so this shows
+        # growth rather than churn; CPython has no cheap count of every allocation.
+        self.net_blocks = deque(maxlen=history)
+        self.stage_times = {}  # stage -> deque of ms per frame
+        self.current = {}  # stage -> ms so far in the frame being measured
+        self.frame_start = None
+        self.blocks_start = 0
+        self.thread_id = None  # Thread running the frame loop
+        self.trace = None  # Chrome trace events while recording a trace
+        self.frame_count = 0
+
+    """
+    Name: set_enabled
+    Parameters: enabled (bool), history (int | None): Frames to keep from now on, every frame if None
+    Returns: None
+    Purpose: Turns timing on or off, clearing anything measured before.
+    """
+    def set_enabled(self, enabled, history=PROFILE_HISTORY):
+        self.enabled = enabled
+        self.history = history
+        self.frame_times = deque(maxlen=history)
+        self.net_blocks = deque(maxlen=history)
+        self.stage_times = {}
+        self.current = {}
+        self.frame_start = None
+
+    """
+    Name: stage
+    Parameters: name (str)
+    Returns: context manager
+    Purpose: Times a with block as a named stage of the current frame; does nothing while profiling is off.
+    """
+    def stage(self, name):
+        if not self.enabled:
+            return NO_STAGE
+        return ProfileStage(self, name)
+
+    """
+    Name: record
+    Parameters: name (str), start (float), end (float): perf_counter times
+    Returns: None
+    Purpose: Adds one timed run of a stage to the current frame and to the trace if one is being recorded.
+    """
+    def record(self, name, start, end):
+        thread = threading.current_thread()
+        key = name if thread.ident == self.thread_id else f"{thread.name}:{name}"
+        self.current[key] = self.current.get(key, 0.0) + (end - start) * 1000
+        trace = self.trace
+        if trace is not None and len(trace) < MAX_TRACE_EVENTS:
+            trace.append({"name": name, "ph": "X", "ts": start * 1e6, "dur": (end - start) * 1e6,
+                          "pid": os.getpid(), "tid": thread.ident})
+
+    """
+    Name: begin_frame
+    Parameters: None
+    Returns: None
+    Purpose: Starts measuring a frame. Called at the top of the frame loop.
+    """
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.thread_id = threading.get_ident()
+        self.frame_start = time.perf_counter()
+        self.blocks_start = sys.getallocatedblocks()
+        self.current = {}
+
+    """
+    Name: end_frame
+    Parameters: None
+    Returns: None
+    Purpose: Finishes the frame started by begin_frame and adds its timings to the rolling history.
+    """
+    def end_frame(self):
+        if not self.enabled or self.frame_start is None:
+            return
+        end = time.perf_counter()
+        self.frame_times.append((end - self.frame_start) * 1000)
+        self.net_blocks.append(sys.getallocatedblocks() - self.blocks_start)
+        current = self.current
+        for name in self.stage_times.keys() | current.keys():
+            times = self.stage_times.get(name)
+            if times is None:
+                times = self.stage_times[name] = deque(maxlen=self.history)
+            times.append(current.get(name, 0.0))
+        if self.trace is not None and len(self.trace) < MAX_TRACE_EVENTS:
+            self.trace.append({"name": "frame", "ph": "X", "ts": self.frame_start * 1e6,
+                               "dur": (end - self.frame_start) * 1e6, "pid": os.getpid(), "tid": self.thread_id})
+        self.frame_start = None
+        self.frame_count += 1
+
+    """
+    Name: summary
+    Parameters: None
+    Returns: dict
+    Purpose: Summarises the rolling history: FPS, frame time percentiles, net memory blocks allocated and each
+             stage's cost, most expensive first.
+    """
+    def summary(self):
+        frames = sorted(self.frame_times)
+        if not frames:
+            return {"frames": 0, "fps": 0.0, "frame_p50_ms": 0.0, "frame_p95_ms": 0.0, "frame_p99_ms": 0.0,
+                    "low_1pct_fps": 0.0, "net_blocks_per_frame": 0.0, "stages": {}}
+        mean_ms = sum(frames) / len(frames)
+        p99_ms = percentile(frames, 0.99)
+        stages = {
+            name: {"mean_ms": sum(times) / len(times), "max_ms": max(times)}
+            for name, times in self.stage_times.items() if times
+        }
+        return {
+            "frames": len(frames),
+            "fps": 1000 / mean_ms if mean_ms else 0.0,
+            "frame_p50_ms": percentile(frames, 0.5),
+            "frame_p95_ms": percentile(frames, 0.95),
+            "frame_p99_ms": p99_ms,
+            "low_1pct_fps": 1000 / p99_ms if p99_ms else 0.0,
+            "net_blocks_per_frame": sum(self.net_blocks) / len(self.net_blocks),
+            "stages": dict(sorted(stages.items(), key=lambda item: item[1]["mean_ms"], reverse=True))
+        }
+
+    """
+    Name: start_trace
+    Parameters: None
+    Returns: None
+    Purpose: Starts recording every stage and frame for export, turning profiling on if it was off.
+    """
+    def start_trace(self):
+        if not self.enabled:
+            self.set_enabled(True)
+        self.trace = []
+
+    """
+    Name: stop_trace
+    Parameters: path (str | None): File to write, a timestamped TRACE_FILE if None
+    Returns: str
+    Purpose: Stops recording and writes the trace in Chrome trace event format, which chrome://tracing and
+             Perfetto open. Returns the file written.
+    """
+    def stop_trace(self, path=None):
+        trace, self.trace = self.trace or [], None
+        path = path or TRACE_FILE.format(time.strftime("%Y%m%d-%H%M%S"))
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": ident, "args": {"name": name}}
+                    for ident, name in names.items()]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": metadata + trace, "displayTimeUnit": "ms"}, f)
+        return path
+
+
+"""
+Name: percentile
+Parameters: ordered (list[float]): Sorted values, fraction (float)
+Returns: float
+Purpose: Returns the value below which the given fraction of the values fall.
+"""
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+profiler = FrameProfiler()  # Shared by the game loops and the instrumented modules
+
+
+"""
+Name: profiled
+Parameters: name (str)
+Returns: callable
+Purpose: Decorator that times every call of a function as a stage of the shared profiler.
+"""
+def profiled(name):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            with ProfileStage(profiler, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,94 @@
+import pygame
+from Profiler import profiler
+
+OVERLAY_REFRESH_FRAMES = 15  # Frames between text redraws, so the overlay barely shows up in its own numbers
+OVERLAY_STAGES = 10  # Most expensive stages listed
+OVERLAY_BACKGROUND = (0, 0, 0, 170)
+OVERLAY_TEXT = (255, 255, 120)
+TOGGLE_OVERLAY_KEY = pygame.K_F3
+TOGGLE_TRACE_KEY = pygame.K_F4
+
+
+class ProfilerOverlay:
+    """
+    Name: __init__
+    Parameters: profiler (FrameProfiler)
+    Returns: None
+    Purpose: Draws the profiler's rolling stage timings, net memory growth and FPS percentiles in a corner of the
+             screen. F3 shows it (and turns profiling on); F4 starts and stops recording a trace file.
+    """
+    def __init__(self, frame_profiler=profiler):
+        self.profiler = frame_profiler
+        self.visible = False
+        self.font = None  # Loaded the first time the overlay is shown
+        self.surface = None
+        self.frames_since_refresh = OVERLAY_REFRESH_FRAMES
+
+    """
+    Name: handle_event
+    Parameters: event (pygame.event.Event)
+    Returns: bool
+    Purpose: Handles the overlay and trace keys. Returns whether the event was used.
+    """
+    def handle_event(self, event):
+        if event.type != pygame.KEYDOWN:
+            return False
+        if event.key == TOGGLE_OVERLAY_KEY:
+            self.visible = not self.visible
+            if self.profiler.trace is None:
+                self.profiler.set_enabled(self.visible)
+            self.frames_since_refresh = OVERLAY_REFRESH_FRAMES
+            return True
+        if event.key == TOGGLE_TRACE_KEY:
+            if self.profiler.trace is None:
+                self.profiler.start_trace()
+                print("Recording profiler trace, press F4 again to save it")
+            else:
+                print(f"Profiler trace saved to {self.profiler.stop_trace()}")
+                if not self.visible:
+                    self.profiler.set_enabled(False)
+            return True
+        return False
+
+    """
+    Name: build_lines
+    Parameters: None
+    Returns: list[str]
+    Purpose: Formats the profiler summary as overlay text.
+    """
+    def build_lines(self):
+        summary = self.profiler.summary()
+        lines = [
+            f"FPS {summary['fps']:5.1f}   1% low {summary['low_1pct_fps']:5.1f}",
+            f"frame p50 {summary['frame_p50_ms']:5.1f}  p95 {summary['frame_p95_ms']:5.1f}  "
+            f"p99 {summary['frame_p99_ms']:5.1f} ms",
+            f"net blocks {summary['net_blocks_per_frame']:+8.0f}/frame"
+        ]
+        for name, stage in list(summary["stages"].items())[:OVERLAY_STAGES]:
+            lines.append(f"{name[:24]:24} {stage['mean_ms']:6.2f} ms  max {stage['max_ms']:6.2f}")
+        if self.profiler.trace is not None:
+            lines.append(f"TRACE recording ({len(self.profiler.trace)} events)")
+        return lines
+
+    """
+    Name: draw
+    Parameters: screen (pygame.Surface)
+    Returns: None
+    Purpose: Draws the overlay if it is shown, re-rendering its text every OVERLAY_REFRESH_FRAMES frames.
+    """
+    def draw(self, screen):
+        if not self.visible:
+            return
+        if self.font is None:
+            self.font = pygame.font.Font(None, 18)
+        self.frames_since_refresh += 1
+        if self.frames_since_refresh >= OVERLAY_REFRESH_FRAMES:
+            self.frames_since_refresh = 0
+            rendered = [self.font.render(line, True, OVERLAY_TEXT) for line in self.build_lines()]
+            line_height = self.font.get_linesize()
+            width = max(text.get_width() for text in rendered) + 12
+            self.surface = pygame.Surface((width, line_height * len(rendered) + 10), pygame.SRCALPHA)
+            self.surface.fill(OVERLAY_BACKGROUND)
+            for i, text in enumerate(rendered):
+                self.surface.blit(text, (6, 5 + i * line_height))
+        screen.blit(self.surface, (8, 8))
@@ -0,0 +1,403 @@
+import json
+import struct
+
+PROTOCOL_JSON = "json"
+PROTOCOL_BINARY = "binary"
+BINARY_PROTOCOL_VERSION = 2  # 2: positions sent as delta snapshots
+FIXED_POINT_SCALE = 16  # Coordinates are sent in 1/16 pixel units
+
+# Binary opcodes
+OP_MOVE = 1
+OP_UPDATE_POS = 2
+OP_ENTER = 3
+OP_LEAVE = 4
+OP_SNAPSHOT = 5
+OP_ACK = 6
+
+FRAME_HEADER = struct.Struct("!HB")  # payload length, opcode
+POSITION = struct.Struct("!ii")  # x, y in fixed point
+PLAYER_POSITION = struct.Struct("!Iii")  # player id, x, y in fixed point
+PLAYER_ID = struct.Struct("!I")
+PLAYER_DELTA = struct.Struct("!Ihh")  # player id, dx, dy in fixed point since the base snapshot
+SNAPSHOT_HEADER = struct.Struct("!IIHHH")  # sequence, base sequence (0 = full), absolute, delta and removed counts
+SEQUENCE = struct.Struct("!I")
+DELTA_LIMIT = 0x7FFF  # Larger moves are sent as absolute positions
+SNAPSHOT_HISTORY = 32  # Snapshots kept on each side for use as delta bases
+COUNT = struct.Struct("!H")
+MAX_PAYLOAD_SIZE = 0xFFFF
+READ_BUFFER_SIZE = 64 * 1024  # Initial receive buffer per connection
+MIN_READ_SIZE = 4096  # Free space guaranteed for each recv_into
+MAX_LINE_SIZE = 64 * 1024  # Longest JSON line accepted, the limit asyncio's readline() used to enforce
+
+
+"""
+Name: to_fixed
+Parameters: value (float)
+Returns: int
+Purpose: Converts a pixel coordinate to fixed point for the binary protocol.
+"""
+def to_fixed(value):
+    return int(round(value * FIXED_POINT_SCALE))
+
+
+"""
+Name: from_fixed
+Parameters: value (int)
+Returns: float
+Purpose: Converts a fixed point coordinate back to pixels.
+"""
+def from_fixed(value):
+    return value / FIXED_POINT_SCALE
+
+
+"""
+Name: encode_frame
+Parameters: opcode (int), payload (bytes)
+Returns: bytes
+Purpose: Prefixes a binary payload with its length and opcode.
+"""
+def encode_frame(opcode, payload):
+    if len(payload) > MAX_PAYLOAD_SIZE:
+        raise ValueError(f"Payload too large for one frame: {len(payload)} bytes")
+    return FRAME_HEADER.pack(len(payload), opcode) + payload
+
+
+"""
+Name: encode_json
+Parameters: packet (dict)
+Returns: bytes
+Purpose: Encodes a packet as one newline-terminated JSON line.
+"""
+def encode_json(packet):
+    return (json.dumps(packet) + "\n").encode()
+
+
+"""
+Name: encode_positions
+Parameters: positions (dict[int, dict])
+Returns: bytes
+Purpose: Packs player positions into an UPDATE_POS payload.
+"""
+def encode_positions(positions):
+    payload = bytearray(COUNT.pack(len(positions)))
+    for player_id, pos in positions.items():
+        payload += PLAYER_POSITION.pack(int(player_id), to_fixed(pos["x"]), to_fixed(pos["y"]))
+    return bytes(payload)
+
+
+"""
+Name: decode_positions
+Parameters: payload (bytes | memoryview)
+Returns: dict[int, dict]
+Purpose: Unpacks an UPDATE_POS payload into player positions.
+"""
+def decode_positions(payload):
+    (count,) = COUNT.unpack_from(payload, 0)
+    positions = {}
+    for i in range(count):
+        player_id, x, y = PLAYER_POSITION.unpack_from(payload, COUNT.size + i * PLAYER_POSITION.size)
+        positions[player_id] = {"x": from_fixed(x), "y": from_fixed(y)}
+    return positions
+
+
+"""
+Name: encode_ids
+Parameters: player_ids (list[int])
+Returns: bytes
+Purpose: Packs a list of player ids into a LEAVE payload.
+"""
+def encode_ids(player_ids):
+    payload = bytearray(COUNT.pack(len(player_ids)))
+    for player_id in player_ids:
+        payload += PLAYER_ID.pack(int(player_id))
+    return bytes(payload)
+
+
+"""
+Name: decode_ids
+Parameters: payload (bytes | memoryview)
+Returns: list[int]
+Purpose: Unpacks a LEAVE payload into player ids.
+"""
+def decode_ids(payload):
+    (count,) = COUNT.unpack_from(payload, 0)
+    return [PLAYER_ID.unpack_from(payload, COUNT.size + i * PLAYER_ID.size)[0] for i in range(count)]
+
+
+"""
+Name: encode_snapshot
+Parameters: sequence (int), snapshot (dict[int, tuple[int, int]]), base_sequence (int),
+            base (dict[int, tuple[int, int]])
+Returns: bytes
+Purpose: Packs a snapshot of fixed point positions as the changes since a base snapshot the client holds.
+         A base_sequence of 0 with an empty base gives a full snapshot.
+"""
+def encode_snapshot(sequence, snapshot, base_sequence=0, base=None):
+    base = base or {}
+    absolute = bytearray()
+    delta = bytearray()
+    absolute_count = delta_count = 0
+    for player_id, (x, y) in snapshot.items():
+        old = base.get(player_id)
+        if old == (x, y):
+            continue
+        if old is not None and abs(x - old[0]) <= DELTA_LIMIT and abs(y - old[1]) <= DELTA_LIMIT:
+            delta += PLAYER_DELTA.pack(player_id, x - old[0], y - old[1])
+            delta_count += 1
+        else:
+            absolute += PLAYER_POSITION.pack(player_id, x, y)
+            absolute_count += 1
+    removed = [player_id for player_id in base if player_id not in snapshot]
+
+    header = SNAPSHOT_HEADER.pack(sequence, base_sequence, absolute_count, delta_count, len(removed))
+    return header + absolute + delta + b"".join(PLAYER_ID.pack(player_id) for player_id in removed)
+
+
+"""
+Name: decode_snapshot
+Parameters: payload (bytes | memoryview)
+Returns: dict
+Purpose: Unpacks a SNAPSHOT payload. Positions stay in fixed point so deltas apply exactly.
+"""
+def decode_snapshot(payload):
+    sequence, base_sequence, absolute_count, delta_count, removed_count = SNAPSHOT_HEADER.unpack_from(payload, 0)
+    offset = SNAPSHOT_HEADER.size
+    absolute = {}
+    for _ in range(absolute_count):
+        player_id, x, y = PLAYER_POSITION.unpack_from(payload, offset)
+        absolute[player_id] = (x, y)
+        offset += PLAYER_POSITION.size
+    delta = {}
+    for _ in range(delta_count):
+        player_id, dx, dy = PLAYER_DELTA.unpack_from(payload, offset)
+        delta[player_id] = (dx, dy)
+        offset += PLAYER_DELTA.size
+    removed = []
+    for _ in range(removed_count):
+        removed.append(PLAYER_ID.unpack_from(payload, offset)[0])
+        offset += PLAYER_ID.size
+    return {"Sequence": sequence, "Base": base_sequence, "Absolute": absolute, "Delta": delta, "Removed": removed}
+
+
+"""
+Name: apply_snapshot
+Parameters: base (dict[int, tuple[int, int]]), data (dict)
+Returns: dict[int, tuple[int, int]]
+Purpose: Rebuilds a full snapshot from the base it was encoded against and a decoded SNAPSHOT packet.
+"""
+def apply_snapshot(base, data):
+    snapshot = dict(base)
+    for player_id in data["Removed"]:
+        snapshot.pop(player_id, None)
+    for player_id, (dx, dy) in data["Delta"].items():
+        x, y = snapshot[player_id]
+        snapshot[player_id] = (x + dx, y + dy)
+    snapshot.update(data["Absolute"])
+    return snapshot
+
+
+"""
+Name: encode_packet
+Parameters: packet (dict), protocol (str)
+Returns: bytes
+Purpose: Encodes a packet for the wire using the negotiated protocol.
+"""
+def encode_packet(packet, protocol=PROTOCOL_JSON):
+    if protocol == PROTOCOL_JSON:
+        return encode_json(packet)
+
+    command = packet["command"]
+    if command == "MOVE":
+        return encode_frame(OP_MOVE, POSITION.pack(to_fixed(packet["data"]["x"]), to_fixed(packet["data"]["y"])))
+    if command == "UPDATE_POS":
+        return encode_frame(OP_UPDATE_POS, encode_positions(packet["data"]))
+    if command == "ENTER":
+        return encode_frame(OP_ENTER, encode_positions(packet["data"]))
+    if command == "LEAVE":
+        return encode_frame(OP_LEAVE, encode_ids(packet["data"]))
+    if command == "ACK":
+        return encode_frame(OP_ACK, SEQUENCE.pack(packet["data"]["Sequence"]))
+    raise ValueError(f"No binary encoding for command: {command}")
+
+
+"""
+Name: decode_frame
+Parameters: opcode (int), payload (bytes | memoryview)
+Returns: dict
+Purpose: Decodes a binary frame into the same packet dictionary the JSON protocol produces.
+"""
+def decode_frame(opcode, payload):
+    if opcode == OP_MOVE:
+        x, y = POSITION.unpack_from(payload, 0)
+        return {"command": "MOVE", "data": {"x": from_fixed(x), "y": from_fixed(y)}}
+    if opcode == OP_UPDATE_POS:
+        return {"command": "UPDATE_POS", "data": decode_positions(payload)}
+    if opcode == OP_ENTER:
+        return {"command": "ENTER", "data": decode_positions(payload)}
+    if opcode == OP_LEAVE:
+        return {"command": "LEAVE", "data": decode_ids(payload)}
+    if opcode == OP_SNAPSHOT:
+        return {"command": "SNAPSHOT", "data": decode_snapshot(payload)}
+    if opcode == OP_ACK:
+        return {"command": "ACK", "data": {"Sequence": SEQUENCE.unpack_from(payload, 0)[0]}}
+    raise ValueError(f"Unknown opcode: {opcode}")
+
+
+"""
+Name: protocol_request
+Parameters: None
+Returns: dict
+Purpose: Builds the packet a client sends after SETUP to ask for the binary protocol.
+"""
+def protocol_request():
+    return {"command": "PROTOCOL", "data": {"Name": PROTOCOL_BINARY, "Version": BINARY_PROTOCOL_VERSION}}
+
+
+"""
+Name: choose_protocol
+Parameters: request (dict)
+Returns: str
+Purpose: Picks the protocol to use for a client's PROTOCOL request, falling back to JSON.
+"""
+def choose_protocol(request):
+    if request.get("Name") == PROTOCOL_BINARY and request.get("Version") == BINARY_PROTOCOL_VERSION:
+        return PROTOCOL_BINARY
+    return PROTOCOL_JSON
+
+
+class FrameReader:
+    """
+    Name: __init__
+    Parameters: capacity (int), max_line (int): Longest JSON line accepted before the peer is treated as broken
+    Returns: None
+    Purpose: Receive buffer that extracts whole packets in place, for either protocol, without re-copying
+             the data still waiting behind them.
+    """
+    def __init__(self, capacity=READ_BUFFER_SIZE, max_line=MAX_LINE_SIZE):
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # First byte not yet consumed
+        self.end = 0  # One past the last byte received
+        self.scanned = 0  # Bytes after start already searched for a newline, so slow lines are scanned once
+        self.max_line = max_line
+        self.protocol = PROTOCOL_JSON  # Switch when the connection changes protocol; applies to the next packet
+        self.eof = False
+
+    """
+    Name: reserve
+    Parameters: size (int)
+    Returns: None
+    Purpose: Makes room for size more bytes, moving the unconsumed bytes to the front or growing the buffer.
+    """
+    def reserve(self, size):
+        if len(self.buffer) - self.end >= size:
+            return
+        pending = self.end - self.start
+        if pending + size > len(self.buffer):
+            # Only happens for packets bigger than the buffer, so growing stays rare
+            buffer = bytearray(max(len(self.buffer) * 2, pending + size))
+            buffer[:pending] = self.view[self.start:self.end]
+            self.buffer = buffer
+            self.view = memoryview(buffer)
+        else:
+            self.view[:pending] = self.view[self.start:self.end]
+        self.start, self.end = 0, pending
+
+    """
+    Name: writable
+    Parameters: None
+    Returns: memoryview
+    Purpose: Returns the free space at the end of the buffer for recv_into.
+    """
+    def writable(self):
+        self.reserve(MIN_READ_SIZE)
+        return self.view[self.end:]
+
+    """
+    Name: commit
+    Parameters: size (int)
+    Returns: None
+    Purpose: Marks size bytes written into writable() as received. A size of 0 means the peer closed.
+    """
+    def commit(self, size):
+        if size == 0:
+            self.eof = True
+        self.end += size
+
+    """
+    Name: recv_from
+    Parameters: sock (socket.socket)
+    Returns: int
+    Purpose: Reads straight from a socket into the buffer. Returns 0 once the peer has closed the connection.
+    """
+    def recv_from(self, sock):
+        size = sock.recv_into(self.writable())
+        self.commit(size)
+        return size
+
+    """
+    Name: feed
+    Parameters: data (bytes)
+    Returns: None
+    Purpose: Adds data read some other way, such as from an asyncio stream. Empty data means EOF.
+    """
+    def feed(self, data):
+        self.reserve(len(data))
+        self.view[self.end:self.end + len(data)] = data
+        self.commit(len(data))
+
+    """
+    Name: pending
+    Parameters: None
+    Returns: int
+    Purpose: Returns how many received bytes belong to a packet that is not complete yet.
+    """
+    def pending(self):
+        return self.end - self.start
+
+    """
+    Name: unconsumed
+    Parameters: None
+    Returns: bytes
+    Purpose: Returns a copy of the received bytes not yet returned as packets, e.g. to hand to another reader.
+    """
+    def unconsumed(self):
+        return bytes(self.view[self.start:self.end])
+
+    """
+    Name: packets
+    Parameters: None
+    Returns: generator[dict]
+    Purpose: Yields every complete packet received so far, leaving any partial packet in the buffer. Raises
+             ValueError once a JSON line grows past max_line.
+    """
+    def packets(self):
+        while self.start < self.end:
+            if self.protocol == PROTOCOL_BINARY:
+                if self.end - self.start < FRAME_HEADER.size:
+                    break
+                length, opcode = FRAME_HEADER.unpack_from(self.buffer, self.start)
+                payload_start = self.start + FRAME_HEADER.size
+                if self.end - payload_start < length:
+                    break
+                self.start = payload_start + length
+                packet = decode_frame(opcode, self.view[payload_start:self.start])
+            else:
+                newline = self.buffer.find(b"\n", self.start + self.scanned, self.end)
+                if newline < 0:
+                    self.scanned = self.end - self.start
+                    if self.scanned > self.max_line:
+                        raise ValueError(f"JSON line longer than {self.max_line} bytes")
+                    break
+                if newline - self.start > self.max_line:
+                    raise ValueError(f"JSON line longer than {self.max_line} bytes")
+                line = bytes(self.view[self.start:newline])  # json needs bytes, so text lines are copied once
+                self.start = newline + 1
+                self.scanned = 0
+                if not line.strip():
+                    continue
+                packet = json.loads(line)
+
+            if self.start == self.end:
+                self.start = self.end = 0  # Drained, so the next read starts at the front again
+            yield packet
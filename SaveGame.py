@@ -0,0 +1,236 @@
+import json
+import os
+import struct
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+SAVE_FILE = "savegame.sav"
+LEGACY_SAVE_FILE = "savegame.json"  # Older JSON saves, still loaded when there is no binary save
+SAVE_MAGIC = b"NEAS"
+SAVE_VERSION = 1
+WORLD_CACHE_SIZE = 2  # Generated worlds kept in memory, so loading a recent seed skips generation
+
+SAVE_HEADER = struct.Struct("!4sBIHH")  # magic, version, seed, world width, world height
+COUNT = struct.Struct("!I")
+TILE_CHANGE = struct.Struct("!HHB")  # x, y, index into TILE_TYPES
+ENTITY = struct.Struct("!BddHH")  # kind, x, y, path target index, path length
+PATH_POINT = struct.Struct("!HH")
+
+TILE_TYPES = ['water', 'sand', 'grass', 'forest', 'dirt', 'mountain']  # Saved by index, so only ever append
+ENTITY_KINDS = ["player", "follower"]  # Saved by index, so only ever append
+
+
+"""
+Name: encode_save
+Parameters: state (dict): Seed, world size, tile changes and entity states
+Returns: bytes
+Purpose: Packs a game state into the binary save format. Terrain is stored as the seed plus only the tiles that
+         differ from what the seed generates.
+"""
+def encode_save(state):
+    parts = [SAVE_HEADER.pack(SAVE_MAGIC, SAVE_VERSION, state["seed"], state["width"], state["height"]),
+             COUNT.pack(len(state["tiles"]))]
+    for (x, y), tile_type in state["tiles"].items():
+        parts.append(TILE_CHANGE.pack(x, y, TILE_TYPES.index(tile_type)))
+
+    parts.append(COUNT.pack(len(state["entities"])))
+    for entity in state["entities"]:
+        path = entity.get("path", [])
+        parts.append(ENTITY.pack(ENTITY_KINDS.index(entity["kind"]), entity["x"], entity["y"],
+                                 entity.get("target_index", 0), len(path)))
+        parts.extend(PATH_POINT.pack(x, y) for x, y in path)
+    return b"".join(parts)
+
+
+"""
+Name: decode_save
+Parameters: data (bytes)
+Returns: dict
+Purpose: Unpacks a binary save into the state dict encode_save was given.
+"""
+def decode_save(data):
+    magic, version, seed, width, height = SAVE_HEADER.unpack_from(data, 0)
+    if magic != SAVE_MAGIC or version != SAVE_VERSION:
+        raise ValueError(f"Not a version {SAVE_VERSION} save file")
+    offset = SAVE_HEADER.size
+
+    (tile_count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    tiles = {}
+    for x, y, tile_index in TILE_CHANGE.iter_unpack(data[offset:offset + tile_count * TILE_CHANGE.size]):
+        tiles[(x, y)] = TILE_TYPES[tile_index]
+    offset += tile_count * TILE_CHANGE.size
+
+    (entity_count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    entities = []
+    for _ in range(entity_count):
+        kind, x, y, target_index, path_length = ENTITY.unpack_from(data, offset)
+        offset += ENTITY.size
+        path = list(PATH_POINT.iter_unpack(data[offset:offset + path_length * PATH_POINT.size]))
+        offset += path_length * PATH_POINT.size
+        entities.append({"kind": ENTITY_KINDS[kind], "x": x, "y": y, "path": path, "target_index": target_index})
+    return {"seed": seed, "width": width, "height": height, "tiles": tiles, "entities": entities}
+
+
+"""
+Name: write_atomic
+Parameters: path (str), data (bytes)
+Returns: None
+Purpose: Writes a file through a temporary file and a rename, so a crash mid-save never leaves a torn save.
+"""
+def write_atomic(path, data):
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+"""
+Name: read_save
+Parameters: path (str)
+Returns: dict | None
+Purpose: Reads a save file, falling back to an old JSON save. Returns None when there is no save at all.
+"""
+def read_save(path=SAVE_FILE):
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return decode_save(f.read())
+    if path == SAVE_FILE and os.path.exists(LEGACY_SAVE_FILE):
+        with open(LEGACY_SAVE_FILE, "r") as f:
+            data = json.load(f)
+        return {
+            "seed": data["seed"], "width": None, "height": None, "tiles": {},
+            "entities": [dict(data["player"], kind="player"), dict(data["follower"], kind="follower")]
+        }
+    return None
+
+
+class WorldCache:
+    """
+    Name: __init__
+    Parameters: build_world (callable): seed -> World, size (int)
+    Returns: None
+    Purpose: Keeps the most recently used worlds by seed, so loading one already generated skips generation.
+    """
+    def __init__(self, build_world, size=WORLD_CACHE_SIZE):
+        self.build_world = build_world
+        self.size = size
+        self.worlds = OrderedDict()  # seed -> World, most recently used last
+        self.lock = threading.Lock()
+
+    """
+    Name: add
+    Parameters: world (World)
+    Returns: None
+    Purpose: Caches a world generated elsewhere, such as the one the game started with.
+    """
+    def add(self, world):
+        with self.lock:
+            self.worlds[world.seed] = world
+            self.worlds.move_to_end(world.seed)
+            while len(self.worlds) > self.size:
+                self.worlds.popitem(last=False)
+
+    """
+    Name: get
+    Parameters: seed (int)
+    Returns: World
+    Purpose: Returns the cached world for a seed, generating it on the calling thread if it is not cached.
+    """
+    def get(self, seed):
+        with self.lock:
+            world = self.worlds.get(seed)
+            if world is not None:
+                self.worlds.move_to_end(seed)
+                return world
+        world = self.build_world(seed)
+        self.add(world)
+        return world
+
+
+class SaveManager:
+    """
+    Name: __init__
+    Parameters: path (str)
+    Returns: None
+    Purpose: Saves and loads on a background thread. Results are handed back to the main thread by update().
+    """
+    def __init__(self, path=SAVE_FILE):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1)  # One worker, so saves and loads run in request order
+        self.completed = deque()  # (callback, arguments) waiting to run on the main thread
+
+    """
+    Name: save
+    Parameters: state (dict), callback (callable | None)
+    Returns: None
+    Purpose: Queues a save of a state snapshot. The callback gets None on success or the error that stopped it.
+    """
+    def save(self, state, callback=None):
+        self.executor.submit(self.run_save, state, callback)
+
+    """
+    Name: run_save
+    Parameters: state (dict), callback (callable | None)
+    Returns: None
+    Purpose: Worker thread task that encodes and writes one save.
+    """
+    def run_save(self, state, callback):
+        try:
+            write_atomic(self.path, encode_save(state))
+            error = None
+        except (OSError, ValueError, struct.error) as e:
+            error = e
+        self.completed.append((callback, (error,)))
+
+    """
+    Name: load
+    Parameters: callback (callable), prepare (callable | None)
+    Returns: None
+    Purpose: Queues a load. prepare runs on the worker with the loaded state, for slow work such as fetching
+             its world; the callback then gets (state, prepared), or (None, error) if there was nothing to load.
+    """
+    def load(self, callback, prepare=None):
+        self.executor.submit(self.run_load, callback, prepare)
+
+    """
+    Name: run_load
+    Parameters: callback (callable), prepare (callable | None)
+    Returns: None
+    Purpose: Worker thread task that reads one save and prepares it.
+    """
+    def run_load(self, callback, prepare):
+        try:
+            state = read_save(self.path)
+            if state is None:
+                result = (None, FileNotFoundError(f"No save file found: {self.path}"))
+            else:
+                result = (state, prepare(state) if prepare else None)
+        except (OSError, ValueError, KeyError, IndexError, struct.error) as e:
+            result = (None, e)
+        self.completed.append((callback, result))
+
+    """
+    Name: update
+    Parameters: None
+    Returns: None
+    Purpose: Called once per frame. Runs the callbacks of finished saves and loads.
+    """
+    def update(self):
+        while self.completed:
+            callback, arguments = self.completed.popleft()
+            if callback:
+                callback(*arguments)
+
+    """
+    Name: shutdown
+    Parameters: None
+    Returns: None
+    Purpose: Waits for queued saves to reach the disk, then stops the worker thread.
+    """
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
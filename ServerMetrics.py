@@ -0,0 +1,192 @@
+import json
+import math
+from collections import deque
+
+STATS_PORT = 50001  # Local socket answering stats requests
+METRICS_LOG_INTERVAL = 10.0  # Seconds between metrics log lines
+RATE_WINDOW = 10  # Seconds averaged for per-second rates
+DURATION_BUCKETS_MS = [0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, math.inf]
+COUNTERS = ["packets_in", "bytes_in", "packets_out", "bytes_out"]
+
+
+class DurationHistogram:
+    """
+    Name: __init__
+    Parameters: buckets (list[float])
+    Returns: None
+    Purpose: Counts durations into fixed millisecond buckets, cheap enough to record every tick.
+    """
+    def __init__(self, buckets=DURATION_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    """
+    Name: record
+    Parameters: duration_ms (float)
+    Returns: None
+    Purpose: Adds one duration.
+    """
+    def record(self, duration_ms):
+        for i, bound in enumerate(self.buckets):
+            if duration_ms <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    """
+    Name: percentile
+    Parameters: fraction (float)
+    Returns: float
+    Purpose: Estimates the duration below which the given fraction of durations fall, interpolating linearly
+             within the bucket that holds it. The slowest bucket is capped at the longest duration seen.
+    """
+    def percentile(self, fraction):
+        target = fraction * self.total
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= target:
+                upper = min(bound, self.max_ms)
+                return lower + (upper - lower) * max(0.0, target - seen) / count
+            seen += count
+            lower = bound
+        return 0.0
+
+    """
+    Name: to_dict
+    Parameters: None
+    Returns: dict
+    Purpose: Summarises the histogram for a stats report.
+    """
+    def to_dict(self):
+        return {
+            "count": self.total,
+            "mean_ms": self.sum_ms / self.total if self.total else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)}
+        }
+
+
+class ServerMetrics:
+    """
+    Name: __init__
+    Parameters: None
+    Returns: None
+    Purpose: Runtime counters for GameServer, rolled once a second so rates cover the last RATE_WINDOW seconds.
+    """
+    def __init__(self):
+        self.totals = {name: 0 for name in COUNTERS}  # Since the server started
+        self.window = deque(maxlen=RATE_WINDOW)  # Per-second counter deltas, newest last
+        self.last_totals = dict(self.totals)
+        self.last_roll = None
+        self.tick_times = DurationHistogram()  # Whole tick, including interest checks and queueing
+        self.fanout_times = DurationHistogram()  # Building and queueing every client's update
+        self.clients_dropped = 0  # Disconnected for falling behind
+
+    """
+    Name: add
+    Parameters: name (str), amount (int)
+    Returns: None
+    Purpose: Increases one of the COUNTERS.
+    """
+    def add(self, name, amount=1):
+        self.totals[name] += amount
+
+    """
+    Name: roll
+    Parameters: now (float)
+    Returns: None
+    Purpose: Closes the current one-second window once it has passed.
+    """
+    def roll(self, now):
+        if self.last_roll is None:
+            self.last_roll = now
+            return
+        elapsed = now - self.last_roll
+        if elapsed < 1.0:
+            return
+        self.window.append((elapsed, {name: self.totals[name] - self.last_totals[name] for name in COUNTERS}))
+        self.last_totals = dict(self.totals)
+        self.last_roll = now
+
+    """
+    Name: rates
+    Parameters: None
+    Returns: dict[str, float]
+    Purpose: Returns each counter's average per-second rate over the recent windows.
+    """
+    def rates(self):
+        seconds = sum(elapsed for elapsed, _ in self.window)
+        if not seconds:
+            return {name: 0.0 for name in COUNTERS}
+        return {name: sum(deltas[name] for _, deltas in self.window) / seconds for name in COUNTERS}
+
+    """
+    Name: report
+    Parameters: connections (dict): player_id -> ClientConnection
+    Returns: dict
+    Purpose: Builds the full stats report, including each client's current queue depth.
+    """
+    def report(self, connections):
+        queues = {
+            str(player_id): {
+                "queued_packets": len(connection.outbound),
+                "buffered_bytes": connection.buffered_bytes()
+            }
+            for player_id, connection in connections.items() if not connection.closed
+        }
+        return {
+            "players": len(queues),
+            "rates_per_s": self.rates(),
+            "totals": dict(self.totals),
+            "tick": self.tick_times.to_dict(),
+            "fanout": self.fanout_times.to_dict(),
+            "max_queued_packets": max((queue["queued_packets"] for queue in queues.values()), default=0),
+            "max_buffered_bytes": max((queue["buffered_bytes"] for queue in queues.values()), default=0),
+            "clients_dropped": self.clients_dropped,
+            "clients": queues
+        }
+
+
+"""
+Name: format_log_line
+Parameters: report (dict)
+Returns: str
+Purpose: Condenses a stats report into one log line.
+"""
+def format_log_line(report):
+    rates = report["rates_per_s"]
+    return (f"players={report['players']} "
+            f"in={rates['packets_in']:.0f}pkt/s {rates['bytes_in'] / 1024:.1f}KiB/s "
+            f"out={rates['packets_out']:.0f}pkt/s {rates['bytes_out'] / 1024:.1f}KiB/s "
+            f"tick p50={report['tick']['p50_ms']:.2f}ms p99={report['tick']['p99_ms']:.2f}ms "
+            f"max={report['tick']['max_ms']:.2f}ms "
+            f"fanout mean={report['fanout']['mean_ms']:.2f}ms "
+            f"queue max={report['max_queued_packets']}pkt {report['max_buffered_bytes']}B "
+            f"dropped={report['clients_dropped']}")
+
+
+"""
+Name: format_report
+Parameters: report (dict), output_format (str)
+Returns: str
+Purpose: Renders a stats report as JSON or as readable text.
+"""
+def format_report(report, output_format="text"):
+    if output_format == "json":
+        return json.dumps(report, indent=2)
+    lines = [format_log_line(report)]
+    for name in ("tick", "fanout"):
+        histogram = report[name]
+        counts = " ".join(f"<={bound}:{count}" for bound, count in histogram["buckets"].items() if count)
+        lines.append(f"{name}: count={histogram['count']} mean={histogram['mean_ms']:.3f}ms {counts}")
+    for player_id, queue in sorted(report["clients"].items(), key=lambda item: int(item[0])):
+        lines.append(f"client {player_id}: queued={queue['queued_packets']} buffered={queue['buffered_bytes']}B")
+    return "\n".join(lines)
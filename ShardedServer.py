@@ -0,0 +1,498 @@
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import signal
+import socket
+from collections import deque
+from server import (GameServer, HOST, PORT, TICK_RATE, OVER_BUDGET_TIMEOUT, WORLD_PIXEL_WIDTH, VIEW_WIDTH, AOI_MARGIN,
+                    AOI_HYSTERESIS, start_positions)
+
+REGION_COUNT = 2
+BORDER_ZONE = VIEW_WIDTH / 2 + AOI_MARGIN + AOI_HYSTERESIS  # Players this close to a region edge can be seen from
+                                                            # the other side, so the neighbour is told about them
+HANDOFF_MARGIN = 64  # Pixels past a region edge before a player moves to the next region, so edge walkers stay put
+IPC_MESSAGE_SIZE = 256 * 1024  # Largest control message between processes
+IPC_MAX_FDS = 4
+WORKER_STOP_TIMEOUT = OVER_BUDGET_TIMEOUT + 2  # Seconds to wait for workers to close their clients
+
+
+"""
+Name: region_of
+Parameters: x (float), regions (int)
+Returns: int
+Purpose: Returns the region owning a world x coordinate. The world is split into equal vertical strips.
+"""
+def region_of(x, regions):
+    return max(0, min(regions - 1, int(x // (WORLD_PIXEL_WIDTH / regions))))
+
+
+class IpcChannel:
+    """
+    Name: __init__
+    Parameters: sock (socket.socket), on_message (callable), on_close (callable | None)
+    Returns: None
+    Purpose: JSON messages, optionally carrying file descriptors, over a Unix SOCK_SEQPACKET socket. The socket keeps
+             message boundaries, so every recv is exactly one message with its descriptors.
+    """
+    def __init__(self, sock, on_message, on_close=None):
+        self.sock = sock
+        self.on_message = on_message  # Called with (message, fds); it owns the fds
+        self.on_close = on_close
+        self.outbound = deque()  # (encoded message, fds) waiting for room in the socket
+        self.loop = None
+        self.closed = False
+        sock.setblocking(False)
+
+    """
+    Name: start
+    Parameters: None
+    Returns: None
+    Purpose: Starts receiving on the running event loop.
+    """
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop.add_reader(self.sock.fileno(), self.receive)
+
+    """
+    Name: send
+    Parameters: message (dict), fds (list[int])
+    Returns: None
+    Purpose: Queues a message. Any fds are closed here once sent, since the receiver gets its own copies.
+    """
+    def send(self, message, fds=()):
+        if self.closed:
+            for fd in fds:
+                os.close(fd)
+            return
+        self.outbound.append((json.dumps(message).encode(), list(fds)))
+        if len(self.outbound) == 1:
+            self.flush()
+
+    """
+    Name: flush
+    Parameters: None
+    Returns: None
+    Purpose: Sends queued messages until the socket is full, then waits for it to become writable.
+    """
+    def flush(self):
+        while self.outbound:
+            data, fds = self.outbound[0]
+            try:
+                if fds:
+                    socket.send_fds(self.sock, [data], fds)
+                else:
+                    self.sock.send(data)
+            except BlockingIOError:
+                self.loop.add_writer(self.sock.fileno(), self.flush)
+                return
+            except OSError:
+                self.close()
+                return
+            self.outbound.popleft()
+            for fd in fds:
+                os.close(fd)
+        self.loop.remove_writer(self.sock.fileno())
+
+    """
+    Name: receive
+    Parameters: None
+    Returns: None
+    Purpose: Reads every waiting message and passes each to on_message.
+    """
+    def receive(self):
+        while not self.closed:
+            try:
+                data, fds, _, _ = socket.recv_fds(self.sock, IPC_MESSAGE_SIZE, IPC_MAX_FDS)
+            except BlockingIOError:
+                return
+            except OSError:
+                data, fds = b"", []
+            if not data:
+                self.close()
+                return
+            self.on_message(json.loads(data), fds)
+
+    """
+    Name: close
+    Parameters: None
+    Returns: None
+    Purpose: Closes the channel and any descriptors still waiting to be sent.
+    """
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.loop is not None:
+            self.loop.remove_reader(self.sock.fileno())
+            self.loop.remove_writer(self.sock.fileno())
+        for _, fds in self.outbound:
+            for fd in fds:
+                os.close(fd)
+        self.outbound.clear()
+        self.sock.close()
+        if self.on_close:
+            self.on_close()
+
+
+class RegionServer(GameServer):
+    """
+    Name: __init__
+    Parameters: region (int), regions (int), channel_sock (socket.socket), seed (int), tick_rate (float),
+                log_interval (float | None)
+    Returns: None
+    Purpose: Worker process server owning the players in one vertical strip of the world. Clients arrive from the
+             front process as socket descriptors; players near the edges are mirrored to neighbouring regions.
+    """
+    def __init__(self, region, regions, channel_sock, seed, tick_rate=TICK_RATE, log_interval=None):
+        super().__init__(seed=seed, tick_rate=tick_rate, log_interval=log_interval)
+        self.region = region
+        self.regions = regions
+        width = WORLD_PIXEL_WIDTH / regions
+        self.left = region * width
+        self.right = (region + 1) * width
+        self.channel = IpcChannel(channel_sock, self.handle_ipc, self.stop)
+        self.ghosts = set()  # Players owned by a neighbouring region, shown because they are near our edge
+        self.published = {}  # neighbour region -> players last sent to it as border updates
+        self.log_prefix = f"[region {region}] "
+
+    """
+    Name: start
+    Parameters: None
+    Returns: None
+    Purpose: Starts the tick loop and listens to the front process instead of a TCP port.
+    """
+    async def start(self):
+        self.stopped = asyncio.Event()
+        self.channel.start()
+        self.tick_task = asyncio.create_task(self.tick_loop())
+        print(f"{self.log_prefix}Owning x {self.left:.0f} to {self.right:.0f}")
+
+    """
+    Name: handle_ipc
+    Parameters: message (dict), fds (list[int])
+    Returns: None
+    Purpose: Handles a message from the front process.
+    """
+    def handle_ipc(self, message, fds):
+        if message["type"] == "client" and fds:
+            asyncio.create_task(self.accept_client(message, fds.pop(0)))
+        elif message["type"] == "handoff" and fds:
+            asyncio.create_task(self.adopt_client(message["state"], fds.pop(0)))
+        elif message["type"] == "border":
+            self.apply_border(message)
+        elif message["type"] == "stop":
+            self.stop()
+        for fd in fds:
+            os.close(fd)
+
+    """
+    Name: accept_client
+    Parameters: message (dict), fd (int)
+    Returns: None
+    Purpose: Sets up a newly connected client that the front process placed in this region.
+    """
+    async def accept_client(self, message, fd):
+        reader, writer = await asyncio.open_connection(sock=socket.socket(fileno=fd))
+        self.ghosts.discard(message["player_id"])
+        connection = self.add_connection(message["player_id"], writer, message["x"], message["y"])
+        self.send_setup(connection)
+        await self.read_client(connection, reader)
+
+    """
+    Name: adopt_client
+    Parameters: state (dict), fd (int)
+    Returns: None
+    Purpose: Takes over a client handed off by a neighbouring region, carrying on its protocol where it stopped.
+    """
+    async def adopt_client(self, state, fd):
+        reader, writer = await asyncio.open_connection(sock=socket.socket(fileno=fd))
+        player_id = state["PlayerID"]
+        self.ghosts.discard(player_id)
+        connection = self.add_connection(player_id, writer, state["X"], state["Y"])
+        if not state["Legacy"]:
+            connection.set_protocol(state["Protocol"])
+        # Continue the old region's numbering so stale acks cannot match our snapshots; the first one is full
+        connection.sequence = state["Sequence"]
+        connection.visible = set(state["Visible"])
+        unread = base64.b64decode(state["Unread"])
+        if unread:
+            connection.frames.feed(unread)
+        self.changed_players.add(player_id)
+        # Always report to the old region, so it drops its ghost even if the player is already past the border zone
+        self.published.setdefault(state["From"], set()).add(player_id)
+        await self.read_client(connection, reader)
+
+    """
+    Name: handle_packet
+    Parameters: player_id (int): Player identifier, packet (dict): Data packet
+    Returns: None
+    Purpose: Applies a packet, marking the client for handoff once it moves far enough into another region.
+    """
+    def handle_packet(self, player_id, packet):
+        super().handle_packet(player_id, packet)
+        if packet["command"] == "MOVE":
+            x = self.players[player_id]["x"]  # As checked and stored by the base handler
+            if x < self.left - HANDOFF_MARGIN or x >= self.right + HANDOFF_MARGIN:
+                target = region_of(x, self.regions)
+                if target != self.region:
+                    self.connections[player_id].handoff_to = target
+
+    """
+    Name: hand_off
+    Parameters: connection (ClientConnection), reader (asyncio.StreamReader)
+    Returns: bool
+    Purpose: Flushes everything queued for the client, then sends its socket and protocol state to the region
+             that now owns it. Returns True once the client is no longer ours, whether it moved or was dropped.
+    """
+    async def hand_off(self, connection, reader):
+        target = connection.handoff_to
+        player_id = connection.player_id
+        pos = self.players[player_id]
+        self.connections.pop(player_id, None)
+        self.ghosts.add(player_id)  # Still shown here until the new owner's border updates take over
+        for region, published in self.published.items():
+            if player_id in published:
+                published.discard(player_id)
+                if region != target:
+                    self.channel.send({"type": "border", "to": region, "positions": {}, "removed": [player_id]})
+
+        writer = connection.writer
+        writer.transport.pause_reading()
+        connection.flush_task.cancel()
+        for data in connection.outbound:
+            writer.write(data)
+        connection.outbound.clear()
+        writer.transport.set_write_buffer_limits(high=0)  # So drain() waits for every byte to be sent
+        try:
+            await asyncio.wait_for(writer.drain(), OVER_BUDGET_TIMEOUT)
+            # The stream reader may already hold bytes read from the socket. pause_reading() stopped any more
+            # arriving, so ending the stream here makes read() return just those.
+            reader.feed_eof()
+            unread = connection.frames.unconsumed() + await reader.read()
+        except (asyncio.TimeoutError, ConnectionError):
+            print(f"{self.log_prefix}Client {player_id} dropped: could not flush before handoff")
+            self.ghosts.discard(player_id)
+            self.players.pop(player_id, None)
+            self.spatial_hash.remove(player_id)
+            connection.close(abort=True)
+            return True
+
+        fd = os.dup(writer.transport.get_extra_info("socket").fileno())
+        connection.close(abort=True)  # Closes only our descriptor; the duplicate keeps the connection open
+        self.channel.send({"type": "handoff", "to": target, "state": {
+            "PlayerID": player_id,
+            "X": pos["x"],
+            "Y": pos["y"],
+            "From": self.region,
+            "Protocol": connection.protocol,
+            "Legacy": connection.legacy,
+            "Sequence": connection.sequence,
+            "Visible": sorted(connection.visible),
+            "Unread": base64.b64encode(unread).decode()
+        }}, [fd])
+        return True
+
+    """
+    Name: apply_border
+    Parameters: message (dict)
+    Returns: None
+    Purpose: Updates the ghosts of a neighbouring region's players near our edge.
+    """
+    def apply_border(self, message):
+        for key, (x, y) in message["positions"].items():
+            player_id = int(key)
+            if player_id in self.connections:
+                continue  # Already handed to us; the update was sent before the handoff
+            self.players[player_id] = {"x": x, "y": y}
+            self.spatial_hash.move(player_id, x, y)
+            self.changed_players.add(player_id)
+            self.ghosts.add(player_id)
+        for player_id in message["removed"]:
+            if player_id in self.ghosts:
+                self.ghosts.discard(player_id)
+                self.players.pop(player_id, None)
+                self.spatial_hash.remove(player_id)
+
+    """
+    Name: publish_border
+    Parameters: changed (set[int])
+    Returns: None
+    Purpose: Sends each neighbour the players in the border zone along our shared edge that are new or moved,
+             and those that left it.
+    """
+    def publish_border(self, changed):
+        for neighbour, edge in ((self.region - 1, self.left), (self.region + 1, self.right)):
+            if not 0 <= neighbour < self.regions:
+                continue
+            current = {
+                player_id for player_id in self.connections if abs(self.players[player_id]["x"] - edge) <= BORDER_ZONE
+            }
+            previous = self.published.get(neighbour, set())
+            positions = {
+                str(player_id): [self.players[player_id]["x"], self.players[player_id]["y"]]
+                for player_id in current if player_id in changed or player_id not in previous
+            }
+            removed = previous - current
+            if positions or removed:
+                self.channel.send({"type": "border", "to": neighbour, "positions": positions,
+                                   "removed": sorted(removed)})
+            self.published[neighbour] = current
+
+    """
+    Name: tick
+    Parameters: None
+    Returns: None
+    Purpose: Runs the normal tick for our clients, then shares border zone changes with the neighbours.
+    """
+    def tick(self):
+        changed = set(self.changed_players)
+        super().tick()
+        self.publish_border(changed)
+
+
+"""
+Name: run_region_worker
+Parameters: region (int), regions (int), channel_sock (socket.socket), seed (int), tick_rate (float),
+            log_interval (float | None), inherited (list[socket.socket])
+Returns: None
+Purpose: Worker process entry point. Closes the front's ends of other workers' channels copied in by fork, so
+         each worker sees EOF as soon as the front process exits.
+"""
+def run_region_worker(region, regions, channel_sock, seed, tick_rate, log_interval, inherited):
+    for sock in inherited:
+        sock.close()
+    asyncio.run(RegionServer(region, regions, channel_sock, seed, tick_rate, log_interval).serve())
+
+
+class ShardedFrontServer:
+    """
+    Name: __init__
+    Parameters: host (str), port (int), seed (int), regions (int), tick_rate (float), log_interval (float | None)
+    Returns: None
+    Purpose: Front process of the sharded server. Accepts connections, passes each socket to the region worker
+             owning the player's start position, and relays border updates and handoffs between workers.
+    """
+    def __init__(self, host=HOST, port=PORT, seed=0, regions=REGION_COUNT, tick_rate=TICK_RATE, log_interval=None):
+        self.host = host
+        self.port = port
+        self.world_seed = seed
+        self.regions = regions
+        self.tick_rate = tick_rate
+        self.log_interval = log_interval
+        self.player_count = 0
+        self.workers = []
+        self.channels = []
+        self.listener = None
+        self.stopped = None
+
+    """
+    Name: start_workers
+    Parameters: None
+    Returns: None
+    Purpose: Forks one worker per region, each connected to us by its own socket pair. Call before the event loop
+             starts so workers do not inherit it.
+    """
+    def start_workers(self):
+        context = multiprocessing.get_context("fork")  # Socket pairs and descriptor passing are Unix-only anyway
+        for region in range(self.regions):
+            front_sock, worker_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            inherited = [front_sock] + [channel.sock for channel in self.channels]
+            worker = context.Process(target=run_region_worker, daemon=True, args=(
+                region, self.regions, worker_sock, self.world_seed, self.tick_rate, self.log_interval, inherited))
+            worker.start()
+            worker_sock.close()
+            self.workers.append(worker)
+            self.channels.append(IpcChannel(front_sock, self.relay, self.stop))
+
+    """
+    Name: relay
+    Parameters: message (dict), fds (list[int])
+    Returns: None
+    Purpose: Forwards a worker's border update or handoff to the region it is addressed to.
+    """
+    def relay(self, message, fds):
+        target = message.get("to")
+        if message["type"] in ("border", "handoff") and 0 <= target < self.regions:
+            self.channels[target].send(message, fds)
+        else:
+            for fd in fds:
+                os.close(fd)
+
+    """
+    Name: accept_loop
+    Parameters: None
+    Returns: None
+    Purpose: Accepts clients, giving out player ids and start positions exactly like GameServer.
+    """
+    async def accept_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            sock, _ = await loop.sock_accept(self.listener)
+            self.player_count += 1
+            player_id = self.player_count
+            px, py = start_positions[(player_id - 1) % len(start_positions)]
+            region = region_of(px, self.regions)
+            self.channels[region].send({"type": "client", "player_id": player_id, "x": px, "y": py},
+                                       [sock.detach()])
+
+    """
+    Name: stop
+    Parameters: None
+    Returns: None
+    Purpose: Asks the front process to shut down. Safe to call from a signal handler.
+    """
+    def stop(self):
+        if self.stopped is not None:
+            self.stopped.set()
+
+    """
+    Name: serve
+    Parameters: None
+    Returns: None
+    Purpose: Runs the front process until stopped, then stops the workers.
+    """
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        for channel in self.channels:
+            channel.start()
+        self.listener = socket.create_server((self.host, self.port))
+        self.listener.setblocking(False)
+        self.port = self.listener.getsockname()[1]
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+        print(f"Sharded server listening on {self.host}:{self.port}, World Seed: {self.world_seed}, "
+              f"{self.regions} regions")
+
+        accept_task = asyncio.create_task(self.accept_loop())
+        try:
+            await self.stopped.wait()
+        finally:
+            accept_task.cancel()
+            self.listener.close()
+            for channel in self.channels:
+                channel.send({"type": "stop"})
+            for worker in self.workers:
+                await loop.run_in_executor(None, worker.join, WORKER_STOP_TIMEOUT)
+                if worker.is_alive():
+                    worker.terminate()
+            for channel in self.channels:
+                channel.close()
+            print("Sharded server stopped")
+
+
+"""
+Name: run_sharded_server
+Parameters: host (str), port (int), seed (int), regions (int), tick_rate (float), log_interval (float | None)
+Returns: None
+Purpose: Starts the region workers and runs the front process.
+"""
+def run_sharded_server(host=HOST, port=PORT, seed=0, regions=REGION_COUNT, tick_rate=TICK_RATE, log_interval=None):
+    front = ShardedFrontServer(host, port, seed, regions, tick_rate, log_interval)
+    front.start_workers()
+    asyncio.run(front.serve())
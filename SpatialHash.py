@@ -0,0 +1,96 @@
+SPATIAL_CELL_SIZE = 256  # Spatial hash cell size in pixels
+
+
+class SpatialHash:
+    """
+    Name: __init__
+    Parameters: cell_size (int)
+    Returns: None
+    Purpose: Buckets players and other entities by position so area queries only look at nearby ones. Shared by the
+             server's area of interest and the client's culling and proximity queries.
+    """
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # (cx, cy) -> set of entity keys
+        self.entity_cells = {}  # key -> (cx, cy)
+        self.positions = {}  # key -> (x, y) last given to move
+
+    """
+    Name: move
+    Parameters: key (hashable), x (float), y (float)
+    Returns: None
+    Purpose: Inserts an entity or moves it to the cell holding its new position.
+    """
+    def move(self, key, x, y):
+        self.positions[key] = (x, y)
+        cell = (int(x // self.cell_size), int(y // self.cell_size))
+        old_cell = self.entity_cells.get(key)
+        if old_cell == cell:
+            return
+        if old_cell is not None:
+            self.discard(old_cell, key)
+        self.cells.setdefault(cell, set()).add(key)
+        self.entity_cells[key] = cell
+
+    """
+    Name: remove
+    Parameters: key (hashable)
+    Returns: None
+    Purpose: Removes an entity from the hash.
+    """
+    def remove(self, key):
+        self.positions.pop(key, None)
+        cell = self.entity_cells.pop(key, None)
+        if cell is not None:
+            self.discard(cell, key)
+
+    """
+    Name: discard
+    Parameters: cell (tuple[int, int]), key (hashable)
+    Returns: None
+    Purpose: Removes an entity from one cell, dropping the cell once it is empty.
+    """
+    def discard(self, cell, key):
+        members = self.cells[cell]
+        members.discard(key)
+        if not members:
+            del self.cells[cell]
+
+    """
+    Name: query
+    Parameters: left (float), top (float), right (float), bottom (float)
+    Returns: generator[hashable]
+    Purpose: Yields entities in every cell overlapping the rectangle. Callers check exact positions themselves.
+    """
+    def query(self, left, top, right, bottom):
+        size = self.cell_size
+        for cx in range(int(left // size), int(right // size) + 1):
+            for cy in range(int(top // size), int(bottom // size) + 1):
+                yield from self.cells.get((cx, cy), ())
+
+    """
+    Name: within
+    Parameters: left (float), top (float), right (float), bottom (float)
+    Returns: list[hashable]
+    Purpose: Returns the entities whose position lies inside the rectangle.
+    """
+    def within(self, left, top, right, bottom):
+        positions = self.positions
+        return [key for key in self.query(left, top, right, bottom)
+                if left <= positions[key][0] <= right and top <= positions[key][1] <= bottom]
+
+    """
+    Name: near
+    Parameters: x (float), y (float), radius (float)
+    Returns: list[tuple[float, hashable]]
+    Purpose: Returns (distance, key) for every entity within radius of a point, nearest first.
+    """
+    def near(self, x, y, radius):
+        found = []
+        for key in self.query(x - radius, y - radius, x + radius, y + radius):
+            px, py = self.positions[key]
+            distance_sq = (px - x) ** 2 + (py - y) ** 2
+            if distance_sq <= radius * radius:
+                found.append((distance_sq ** 0.5, key))
+        found.sort(key=lambda item: item[0])
+        return found
@@ -0,0 +1,376 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # Set before pygame starts; override it to watch a run
+
+import argparse
+import json
+import math
+import random
+import time
+from collections import deque
+import pygame
+from main import run_window, TILE_SIZE, SCREEN_WIDTH, SCREEN_HEIGHT, LIGHT_BLOCKING_TILES
+from Profiler import profiler, percentile
+
+BENCHMARK_SEED = 1234
+SCRIPT_SEED = 0  # Seed for the wandering legs inside the forest
+PHASE_FRAMES = {"explore": 240, "forest": 150, "chase": 600}  # Frames of each scripted phase, in order
+WARMUP_FRAMES = 30  # Frames left out of the results, while caches fill
+EXPLORE_DISTANCE = 30  # Tiles walked from the start in the explore phase
+FOREST_SEARCH_RADIUS = 150  # Tiles around the start searched for the densest forest
+FOREST_WANDER_RADIUS = 8  # Tiles from the forest's centre the player wanders within
+CHASE_DISTANCE = 60  # Tiles the player jumps away from the follower at the start of the chase
+WAYPOINT_TIMEOUT = 60  # Frames spent walking to one waypoint before giving up on it
+COMPARED_RESULTS = ["fps", "frame_p50_ms", "frame_p95_ms", "frame_p99_ms"]
+
+
+"""
+Name: flood
+Parameters: world (World), start (tuple[int, int]), max_steps (int), bounds (tuple[int, int, int, int] | None):
+            min x, min y, max x, max y tiles the flood may enter
+Returns: dict[tuple[int, int], tuple[int, int] | None]
+Purpose: Breadth-first search over passable tiles with 4-connected steps, which the player can walk without
+         catching on corners. Returns each reached tile's parent.
+"""
+def flood(world, start, max_steps, bounds=None):
+    min_x, min_y, max_x, max_y = bounds or (0, 0, world.width - 1, world.height - 1)
+    parents = {start: None}
+    frontier = [start]
+    for _ in range(max_steps):
+        next_frontier = []
+        for x, y in frontier:
+            for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if min_x <= nx <= max_x and min_y <= ny <= max_y and (nx, ny) not in parents and \
+                        not world.blocked_tiles[ny * world.width + nx]:
+                    parents[(nx, ny)] = (x, y)
+                    next_frontier.append((nx, ny))
+        frontier = next_frontier
+    return parents
+
+
+"""
+Name: route_to
+Parameters: parents (dict), goal (tuple[int, int])
+Returns: list[tuple[int, int]]
+Purpose: Reads the route from a flood's start to one of its tiles, start excluded.
+"""
+def route_to(parents, goal):
+    route = []
+    while parents[goal] is not None:
+        route.append(goal)
+        goal = parents[goal]
+    return route[::-1]
+
+
+"""
+Name: find_densest_forest
+Parameters: world (World), centre (tuple[int, int]), radius (int)
+Returns: tuple[int, int]
+Purpose: Finds the passable tile near centre with the most light-blocking tiles on a screen around it, where the
+         lightmap has the most walls to test.
+"""
+def find_densest_forest(world, centre, radius):
+    min_x, min_y = max(0, centre[0] - radius), max(0, centre[1] - radius)
+    max_x, max_y = min(world.width, centre[0] + radius), min(world.height, centre[1] + radius)
+    width = max_x - min_x
+    # Summed-area table of light-blocking tiles, one row and column of padding at the top and left
+    sums = [[0] * (width + 1)]
+    for y in range(min_y, max_y):
+        row_total = 0
+        row = [0]
+        above = sums[-1]
+        for x in range(min_x, max_x):
+            row_total += world.tile_map[y][x] in LIGHT_BLOCKING_TILES
+            row.append(above[x - min_x + 1] + row_total)
+        sums.append(row)
+
+    half_w, half_h = SCREEN_WIDTH // TILE_SIZE // 2, SCREEN_HEIGHT // TILE_SIZE // 2
+    best, best_count = centre, -1
+    for y in range(half_h, max_y - min_y - half_h):
+        for x in range(half_w, width - half_w):
+            if world.blocked_tiles[(y + min_y) * world.width + x + min_x]:
+                continue
+            top, bottom, left, right = y - half_h, y + half_h + 1, x - half_w, x + half_w + 1
+            count = sums[bottom][right] - sums[top][right] - sums[bottom][left] + sums[top][left]
+            if count > best_count:
+                best, best_count = (x + min_x, y + min_y), count
+    return best
+
+
+class ScriptedRoute:
+    """
+    Name: __init__
+    Parameters: phase_frames (dict[str, int]), seed (int)
+    Returns: None
+    Purpose: Scripted input for main.run_window. The player explores from the start, wanders through the densest
+             forest nearby where lighting is most expensive, then jumps far from the follower and runs, so the
+             follower makes long chases. The route depends only on the world seed and the script seed.
+    """
+    def __init__(self, phase_frames=PHASE_FRAMES, seed=SCRIPT_SEED):
+        self.phase_frames = phase_frames
+        self.phases = list(phase_frames)
+        self.rng = random.Random(seed)
+        self.phase_index = -1
+        self.frames_left = 0
+        self.waypoints = deque()
+        self.waypoint_frames = 0  # Frames spent walking to the current waypoint
+        self.frame_phases = []  # Phase of every frame served, for per-phase results
+
+    """
+    Name: start
+    Parameters: simulation (GameSimulation)
+    Returns: None
+    Purpose: Called by run_window before its first frame.
+    """
+    def start(self, simulation):
+        self.phase_index = -1
+        self.frames_left = 0
+
+    """
+    Name: next_input
+    Parameters: simulation (GameSimulation)
+    Returns: tuple[int, int] | None
+    Purpose: Returns the direction for this frame, planning each phase as it starts, or None once the script ends.
+    """
+    def next_input(self, simulation):
+        while self.frames_left <= 0:
+            self.phase_index += 1
+            if self.phase_index >= len(self.phases):
+                return None
+            name = self.phases[self.phase_index]
+            self.frames_left = self.phase_frames[name]
+            self.waypoints = deque(getattr(self, "plan_" + name)(simulation))
+            self.waypoint_frames = 0
+        self.frames_left -= 1
+        self.frame_phases.append(self.phases[self.phase_index])
+        return self.steer(simulation.player)
+
+    """
+    Name: steer
+    Parameters: player (Player)
+    Returns: tuple[int, int]
+    Purpose: Steers the player's centre toward the next waypoint's centre, moving on to the waypoint after once it is
+             reached or has taken too long.
+    """
+    def steer(self, player):
+        while self.waypoints:
+            tile_x, tile_y = self.waypoints[0]
+            dx = tile_x * TILE_SIZE + TILE_SIZE / 2 - (player.x + player.width / 2)
+            dy = tile_y * TILE_SIZE + TILE_SIZE / 2 - (player.y + player.height / 2)
+            reached = abs(dx) <= player.speed and abs(dy) <= player.speed
+            if not reached and self.waypoint_frames < WAYPOINT_TIMEOUT:
+                self.waypoint_frames += 1
+                return (0 if abs(dx) <= player.speed else int(math.copysign(1, dx)),
+                        0 if abs(dy) <= player.speed else int(math.copysign(1, dy)))
+            self.waypoints.popleft()
+            self.waypoint_frames = 0
+        return 0, 0
+
+    """
+    Name: plan_explore
+    Parameters: simulation (GameSimulation)
+    Returns: list[tuple[int, int]]
+    Purpose: Walks to the reachable tile furthest from the start within EXPLORE_DISTANCE steps.
+    """
+    def plan_explore(self, simulation):
+        start = player_tile(simulation.player)
+        parents = flood(simulation.world, start, EXPLORE_DISTANCE)
+        goal = max(parents, key=lambda tile: (tile[0] - start[0]) ** 2 + (tile[1] - start[1]) ** 2)
+        return route_to(parents, goal)
+
+    """
+    Name: plan_forest
+    Parameters: simulation (GameSimulation)
+    Returns: list[tuple[int, int]]
+    Purpose: Moves the player and follower into the densest forest nearby and wanders between random tiles there.
+    """
+    def plan_forest(self, simulation):
+        world = simulation.world
+        centre = find_densest_forest(world, player_tile(simulation.player), FOREST_SEARCH_RADIUS)
+        place(simulation, simulation.player, centre)
+        place(simulation, simulation.follower, centre)
+        bounds = (centre[0] - FOREST_WANDER_RADIUS, centre[1] - FOREST_WANDER_RADIUS,
+                  centre[0] + FOREST_WANDER_RADIUS, centre[1] + FOREST_WANDER_RADIUS)
+        frames_per_tile = TILE_SIZE / simulation.player.speed
+        route, position = [], centre
+        while len(route) * frames_per_tile < self.phase_frames["forest"]:
+            parents = flood(world, position, FOREST_WANDER_RADIUS * 2, bounds)
+            if len(parents) < 2:
+                break
+            position = self.rng.choice(sorted(tile for tile in parents if tile != position))
+            route.extend(route_to(parents, position))
+        return route
+
+    """
+    Name: plan_chase
+    Parameters: simulation (GameSimulation)
+    Returns: list[tuple[int, int]]
+    Purpose: Moves the player CHASE_DISTANCE steps from the follower, then runs further away, so the follower
+             repeatedly searches long paths.
+    """
+    def plan_chase(self, simulation):
+        world = simulation.world
+        follower = player_tile(simulation.follower)
+        parents = flood(world, player_tile(simulation.player), CHASE_DISTANCE)
+        jump = max(parents, key=lambda tile: (tile[0] - follower[0]) ** 2 + (tile[1] - follower[1]) ** 2)
+        place(simulation, simulation.player, jump)
+        frames_per_tile = TILE_SIZE / simulation.player.speed
+        parents = flood(world, jump, int(self.phase_frames["chase"] / frames_per_tile) + 1)
+        goal = max(parents, key=lambda tile: (tile[0] - follower[0]) ** 2 + (tile[1] - follower[1]) ** 2)
+        return route_to(parents, goal)
+
+
+"""
+Name: player_tile
+Parameters: entity (Player | Follower)
+Returns: tuple[int, int]
+Purpose: Returns the tile under an entity's centre.
+"""
+def player_tile(entity):
+    return int(entity.x + entity.width / 2) // TILE_SIZE, int(entity.y + entity.height / 2) // TILE_SIZE
+
+
+"""
+Name: place
+Parameters: simulation (GameSimulation), entity (Player | Follower), tile (tuple[int, int])
+Returns: None
+Purpose: Moves an entity to the middle of a tile without drawing it sliding there.
+"""
+def place(simulation, entity, tile):
+    entity.x = tile[0] * TILE_SIZE + (TILE_SIZE - entity.width) / 2
+    entity.y = tile[1] * TILE_SIZE + (TILE_SIZE - entity.height) / 2
+    simulation.entities.snap()
+
+
+"""
+Name: distribution
+Parameters: values (list[float])
+Returns: dict
+Purpose: Summarises frame or stage times in ms.
+"""
+def distribution(values):
+    ordered = sorted(values)
+    if not ordered:
+        return {"mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    return {
+        "mean_ms": sum(ordered) / len(ordered),
+        "p50_ms": percentile(ordered, 0.5),
+        "p95_ms": percentile(ordered, 0.95),
+        "p99_ms": percentile(ordered, 0.99),
+        "max_ms": ordered[-1]
+    }
+
+
+"""
+Name: run_benchmark
+Parameters: seed (int), lighting (bool), phase_frames (dict[str, int]), warmup (int), trace_path (str | None)
+Returns: dict
+Purpose: Plays the scripted route through main.run_window with an uncapped frame rate, profiling every frame, and
+         summarises frame and stage times after the warm-up frames, overall and per phase.
+"""
+def run_benchmark(seed=BENCHMARK_SEED, lighting=True, phase_frames=PHASE_FRAMES, warmup=WARMUP_FRAMES,
+                  trace_path=None):
+    pygame.init()
+    script = ScriptedRoute(phase_frames)
+    if trace_path:
+        profiler.start_trace()
+    profiler.set_enabled(True, history=None)  # Keep every frame
+    start = time.perf_counter()
+    frames = run_window(seed, lighting=lighting, script=script, fps=0)
+    elapsed = time.perf_counter() - start
+    if trace_path:
+        profiler.stop_trace(trace_path)
+    frame_times = list(profiler.frame_times)
+    stage_times = {name: list(times) for name, times in profiler.stage_times.items()}
+    profiler.set_enabled(False)
+    pygame.quit()
+
+    measured = frame_times[warmup:]
+    frame = distribution(measured)
+    # Every stage has an entry for each frame since it first ran, so trimming from the end lines them up
+    kept = len(measured)
+    stages = {name: distribution(times[-kept:] if kept else []) for name, times in stage_times.items()}
+    phases = {}
+    for name in script.phases:
+        times = [ms for ms, phase in zip(measured, script.frame_phases[warmup:]) if phase == name]
+        phases[name] = dict(distribution(times), frames=len(times))
+    return {
+        "seed": seed,
+        "lighting": lighting,
+        "frames": frames,
+        "warmup_frames": warmup,
+        "phase_frames": dict(phase_frames),
+        "seconds": elapsed,
+        "fps": 1000 / frame["mean_ms"] if frame["mean_ms"] else 0.0,
+        "frame_p50_ms": frame["p50_ms"],
+        "frame_p95_ms": frame["p95_ms"],
+        "frame_p99_ms": frame["p99_ms"],
+        "frame_max_ms": frame["max_ms"],
+        "stages": dict(sorted(stages.items(), key=lambda item: item[1]["mean_ms"], reverse=True)),
+        "phases": phases
+    }
+
+
+"""
+Name: print_results
+Parameters: results (dict), baseline (dict | None)
+Returns: None
+Purpose: Prints frame and stage time distributions, with changes from an earlier run when one is given.
+"""
+def print_results(results, baseline=None):
+    print(f"seed {results['seed']}, lighting {'on' if results['lighting'] else 'off'}: {results['frames']} frames "
+          f"in {results['seconds']:.1f}s, first {results['warmup_frames']} left out")
+    print(f"  frame: {results['fps']:.1f} fps  p50 {results['frame_p50_ms']:.2f}  p95 {results['frame_p95_ms']:.2f}  "
+          f"p99 {results['frame_p99_ms']:.2f}  max {results['frame_max_ms']:.2f} ms")
+    print(f"  {'stage':26}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, stage in results["stages"].items():
+        print(f"  {name:26}{stage['mean_ms']:9.3f}{stage['p50_ms']:9.3f}{stage['p95_ms']:9.3f}"
+              f"{stage['p99_ms']:9.3f}{stage['max_ms']:9.3f}")
+    print(f"  {'phase':26}{'frames':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, phase in results["phases"].items():
+        print(f"  {name:26}{phase['frames']:9}{phase['p50_ms']:9.3f}{phase['p95_ms']:9.3f}"
+              f"{phase['p99_ms']:9.3f}{phase['max_ms']:9.3f}")
+
+    if baseline is not None:
+        print(f"  compared with seed {baseline['seed']}, lighting {'on' if baseline['lighting'] else 'off'}:")
+        rows = [(name, baseline.get(name), results.get(name)) for name in COMPARED_RESULTS]
+        rows += [(f"{name} p50", baseline["stages"][name]["p50_ms"], stage["p50_ms"])
+                 for name, stage in results["stages"].items() if name in baseline.get("stages", {})]
+        for name, before, after in rows:
+            if before is None or after is None:
+                continue
+            change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+            print(f"    {name:26}{before:12.3f}{after:12.3f}{change:>10}")
+
+
+"""
+Name: main
+Parameters: None
+Returns: None
+Purpose: Command-line entry point for the end-to-end frame benchmark.
+"""
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark main.py's whole frame on a scripted route.")
+    parser.add_argument("--seed", type=int, default=BENCHMARK_SEED, help="World seed")
+    parser.add_argument("--no-lighting", action="store_true", help="Leave out the lightmap")
+    for name, frames in PHASE_FRAMES.items():
+        parser.add_argument(f"--{name}-frames", type=int, default=frames, help=f"Frames in the {name} phase")
+    parser.add_argument("--warmup", type=int, default=WARMUP_FRAMES, help="Frames left out of the results")
+    parser.add_argument("--trace", help="Also write a Chrome trace of the run to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    phase_frames = {name: getattr(args, f"{name}_frames") for name in PHASE_FRAMES}
+    results = run_benchmark(args.seed, not args.no_lighting, phase_frames, args.warmup, args.trace)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
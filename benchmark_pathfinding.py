@@ -0,0 +1,337 @@
+import argparse
+import heapq
+import json
+import math
+import random
+import time
+import tracemalloc
+from main import World
+from Pathfinding import Pathfinder, HierarchicalPathfinder, IncrementalPathfinder, ALGORITHM_ASTAR, ALGORITHM_JPS
+
+BENCHMARK_SEEDS = [1234, 98765]
+BENCHMARK_SIZES = [64, 128, 256]
+BENCHMARK_MODES = ["astar", "jps", "hpa", "incremental"]
+PAIR_CATEGORIES = ["short", "long", "unreachable", "chokepoint"]
+PAIRS_PER_CATEGORY = 5
+SHORT_DISTANCE = 8  # Max tiles between start and goal for a short query
+LONG_FRACTION = 0.6  # Long queries span at least this fraction of the map
+ISLAND_RADIUS = 3  # Walled-off islands keep this many tiles of open ground around their goal
+COST_TOLERANCE = 1e-6
+
+
+"""
+Name: build_benchmark_grid
+Parameters: seed (int), size (int)
+Returns: list[list[int]]
+Purpose: Generates a World with the given seed and returns its passability grid.
+"""
+def build_benchmark_grid(seed, size):
+    return World(size, size, seed).build_passability_grid()
+
+
+"""
+Name: reference_search
+Parameters: grid (list[list[int]]), goal (tuple[int, int])
+Returns: tuple[dict, dict]
+Purpose: Plain Dijkstra from the goal over the whole grid, used as the optimality reference.
+"""
+def reference_search(grid, goal):
+    height, width = len(grid), len(grid[0])
+    costs = {goal: 0}
+    parents = {goal: None}
+    open_heap = [(0, goal)]
+
+    while open_heap:
+        cost, (x, y) = heapq.heappop(open_heap)
+        if cost > costs[(x, y)]:
+            continue
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                nx, ny = x + dx, y + dy
+                if not (dx or dy) or not (0 <= nx < width and 0 <= ny < height) or grid[ny][nx]:
+                    continue
+                new_cost = cost + (math.sqrt(2) if dx and dy else 1)
+                if new_cost < costs.get((nx, ny), math.inf):
+                    costs[(nx, ny)] = new_cost
+                    parents[(nx, ny)] = (x, y)
+                    heapq.heappush(open_heap, (new_cost, (nx, ny)))
+
+    return costs, parents
+
+
+"""
+Name: path_cost
+Parameters: path (list[tuple[int, int]])
+Returns: float
+Purpose: Sums the 8-connected step costs along a path.
+"""
+def path_cost(path):
+    return sum(math.sqrt(2) if a[0] != b[0] and a[1] != b[1] else 1 for a, b in zip(path, path[1:]))
+
+
+"""
+Name: find_chokepoints
+Parameters: grid (list[list[int]])
+Returns: set[tuple[int, int]]
+Purpose: Finds walkable tiles whose walkable neighbours fall into two or more separate groups around them.
+"""
+def find_chokepoints(grid):
+    height, width = len(grid), len(grid[0])
+    ring = [(-1, -1), (0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0)]
+    chokepoints = set()
+
+    for y in range(height):
+        for x in range(width):
+            if grid[y][x]:
+                continue
+            open_ring = [
+                0 <= x + dx < width and 0 <= y + dy < height and not grid[y + dy][x + dx]
+                for dx, dy in ring
+            ]
+            groups = sum(1 for i in range(8) if open_ring[i] and not open_ring[i - 1])
+            if groups >= 2 and not all(open_ring):
+                chokepoints.add((x, y))
+
+    return chokepoints
+
+
+"""
+Name: wall_off_islands
+Parameters: grid (list[list[int]]), rng (random.Random), count (int)
+Returns: tuple[list[list[int]], list[tuple[tuple[int, int], tuple[int, int]]]]
+Purpose: Copies the grid and rings walkable goals with walls, turning them into islands. Returns the copy and
+         pairs whose start on the main landmass cannot reach the island's goal.
+"""
+def wall_off_islands(grid, rng, count):
+    height, width = len(grid), len(grid[0])
+    walled = [row[:] for row in grid]
+    goals = []
+    for _ in range(count * 20):
+        if len(goals) >= count:
+            break
+        gx, gy = rng.randrange(width), rng.randrange(height)
+        if walled[gy][gx] or any(max(abs(gx - x), abs(gy - y)) <= 2 * ISLAND_RADIUS + 2 for x, y in goals):
+            continue
+        # One step changes the Chebyshev distance by at most one, so a closed square ring cannot be crossed
+        ring = ISLAND_RADIUS + 1
+        for x in range(gx - ring, gx + ring + 1):
+            for y in range(gy - ring, gy + ring + 1):
+                if max(abs(x - gx), abs(y - gy)) == ring and 0 <= x < width and 0 <= y < height:
+                    walled[y][x] = 1
+        goals.append((gx, gy))
+
+    islands = set()
+    for goal in goals:
+        islands.update(reference_search(walled, goal)[0])
+    walkable = [(x, y) for y in range(height) for x in range(width) if not walled[y][x] and (x, y) not in islands]
+    if not walkable:
+        return walled, []
+    return walled, [(rng.choice(walkable), goal) for goal in goals]
+
+
+"""
+Name: generate_pairs
+Parameters: grid (list[list[int]]), rng (random.Random), count (int)
+Returns: tuple[dict[str, list[tuple[tuple[int, int], tuple[int, int]]]], dict[str, list[list[int]]]]
+Purpose: Picks reproducible short, long, unreachable and chokepoint start/goal pairs for a grid, and the grid each
+         category is searched on. Unreachable pairs use a walled-off copy when the map has too few separate islands.
+"""
+def generate_pairs(grid, rng, count=PAIRS_PER_CATEGORY):
+    height, width = len(grid), len(grid[0])
+    walkable = [(x, y) for y in range(height) for x in range(width) if not grid[y][x]]
+    chokepoints = find_chokepoints(grid)
+    pairs = {category: [] for category in PAIR_CATEGORIES}
+
+    for _ in range(count * 40):
+        if all(len(found) >= count for found in pairs.values()):
+            break
+        goal = rng.choice(walkable)
+        costs, parents = reference_search(grid, goal)
+
+        near = [cell for cell in costs if 0 < max(abs(cell[0] - goal[0]), abs(cell[1] - goal[1])) <= SHORT_DISTANCE]
+        if near and len(pairs["short"]) < count:
+            pairs["short"].append((rng.choice(near), goal))
+
+        far = [cell for cell in costs if math.dist(cell, goal) >= LONG_FRACTION * width]
+        if far and len(pairs["long"]) < count:
+            pairs["long"].append((rng.choice(far), goal))
+
+        unreachable = [cell for cell in walkable if cell not in costs]
+        if unreachable and len(pairs["unreachable"]) < count:
+            pairs["unreachable"].append((rng.choice(unreachable), goal))
+
+        if len(pairs["chokepoint"]) < count:
+            candidates = [cell for cell in costs if SHORT_DISTANCE < costs[cell] <= width]
+            rng.shuffle(candidates)
+            for start in candidates[:50]:
+                current = parents[start]
+                while current is not None and current not in chokepoints:
+                    current = parents[current]
+                if current is not None and current != goal:
+                    pairs["chokepoint"].append((start, goal))
+                    break
+
+    grids = {category: grid for category in PAIR_CATEGORIES}
+    # Maps without enough natural islands get some walled off in a copy, so the searches still have to fail
+    if len(pairs["unreachable"]) < count:
+        grids["unreachable"], pairs["unreachable"] = wall_off_islands(grid, rng, count)
+
+    return pairs, grids
+
+
+"""
+Name: create_mode
+Parameters: mode (str), grid (list[list[int]])
+Returns: callable
+Purpose: Builds the planner for an algorithm mode and returns a query function giving (path, nodes_expanded).
+"""
+def create_mode(mode, grid):
+    if mode in (ALGORITHM_ASTAR, ALGORITHM_JPS):
+        pathfinder = Pathfinder(grid)
+
+        def query(start, goal):
+            path = pathfinder.find_path(start, goal, algorithm=mode)
+            return path, pathfinder.nodes_expanded
+        return query
+
+    if mode == "hpa":
+        pathfinder = HierarchicalPathfinder(grid)
+        max_cx, max_cy = pathfinder.get_cluster(len(grid[0]) - 1, len(grid) - 1)
+        for cx in range(max_cx + 1):
+            for cy in range(max_cy + 1):
+                pathfinder.get_cluster_links((cx, cy))  # Measure warm queries, not lazy cluster builds
+
+        def query(start, goal):
+            path = pathfinder.find_path(start, goal)
+            return path, pathfinder.nodes_expanded
+        return query
+
+    if mode == "incremental":
+        planner = IncrementalPathfinder(grid)
+
+        def query(start, goal):
+            planner.reset(start, goal)  # Independent pairs, so measure a full search rather than a repair
+            path = planner.find_path(start, goal)
+            return path, planner.nodes_expanded
+        return query
+
+    raise ValueError(f"Unknown benchmark mode: {mode}")
+
+
+"""
+Name: run_category
+Parameters: mode (str), grid (list[list[int]]), pairs (list), references (dict)
+Returns: dict
+Purpose: Times one mode over one category of pairs, then measures peak memory and checks path costs.
+"""
+def run_category(mode, grid, pairs, references):
+    query = create_mode(mode, grid)
+    times_ms = []
+    expanded = []
+    cost_ratios = []
+    failures = 0
+
+    for start, goal in pairs:
+        begin = time.perf_counter()
+        path, nodes_expanded = query(start, goal)
+        times_ms.append((time.perf_counter() - begin) * 1000)
+        expanded.append(nodes_expanded)
+
+        reference_cost = references.get((start, goal))
+        if reference_cost is None:
+            failures += path is not None
+        elif path is None or path[0] != start or path[-1] != goal:
+            failures += 1
+        elif reference_cost > 0:
+            cost_ratios.append(path_cost(path) / reference_cost)
+
+    # Separate pass so tracemalloc overhead does not distort the timings
+    query = create_mode(mode, grid)
+    peak_bytes = 0
+    for start, goal in pairs:
+        tracemalloc.start()
+        query(start, goal)
+        peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {
+        "queries": len(pairs),
+        "mean_ms": sum(times_ms) / len(times_ms) if times_ms else 0,
+        "max_ms": max(times_ms, default=0),
+        "mean_expanded": sum(expanded) / len(expanded) if expanded else 0,
+        "peak_kib": peak_bytes / 1024,
+        "optimal": sum(1 for ratio in cost_ratios if ratio <= 1 + COST_TOLERANCE),
+        "worst_cost_ratio": max(cost_ratios, default=1.0),
+        "failures": failures
+    }
+
+
+"""
+Name: run_benchmark
+Parameters: seeds (list[int]), sizes (list[int]), modes (list[str]), pair_count (int)
+Returns: list[dict]
+Purpose: Runs every mode over every seed, size and pair category and returns one row per combination.
+"""
+def run_benchmark(seeds, sizes, modes, pair_count=PAIRS_PER_CATEGORY):
+    rows = []
+    for seed in seeds:
+        for size in sizes:
+            grid = build_benchmark_grid(seed, size)
+            pairs, grids = generate_pairs(grid, random.Random(seed * 7919 + size), pair_count)
+
+            references = {}
+            for category, category_pairs in pairs.items():
+                for start, goal in category_pairs:
+                    references[(start, goal)] = reference_search(grids[category], goal)[0].get(start)
+
+            for mode in modes:
+                for category in PAIR_CATEGORIES:
+                    if not pairs[category]:
+                        continue
+                    row = {"seed": seed, "size": size, "mode": mode, "category": category}
+                    row.update(run_category(mode, grids[category], pairs[category], references))
+                    rows.append(row)
+    return rows
+
+
+"""
+Name: print_rows
+Parameters: rows (list[dict])
+Returns: None
+Purpose: Prints benchmark rows as an aligned console table.
+"""
+def print_rows(rows):
+    header = f"{'seed':>7} {'size':>5} {'mode':>12} {'category':>12} {'n':>3} {'ms/query':>10} {'max ms':>9} " \
+             f"{'expanded':>10} {'peak KiB':>9} {'optimal':>8} {'worst':>7} {'fail':>5}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['seed']:>7} {row['size']:>5} {row['mode']:>12} {row['category']:>12} {row['queries']:>3} "
+              f"{row['mean_ms']:>10.2f} {row['max_ms']:>9.2f} {row['mean_expanded']:>10.0f} "
+              f"{row['peak_kib']:>9.1f} {row['optimal']:>8} {row['worst_cost_ratio']:>7.3f} {row['failures']:>5}")
+
+
+"""
+Name: main
+Parameters: None
+Returns: None
+Purpose: Command-line entry point for the pathfinding benchmark.
+"""
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pathfinding modes on Perlin-generated worlds.")
+    parser.add_argument("--seeds", type=int, nargs="+", default=BENCHMARK_SEEDS)
+    parser.add_argument("--sizes", type=int, nargs="+", default=BENCHMARK_SIZES)
+    parser.add_argument("--modes", nargs="+", default=BENCHMARK_MODES, choices=BENCHMARK_MODES)
+    parser.add_argument("--pairs", type=int, default=PAIRS_PER_CATEGORY, help="Pairs per category")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    rows = run_benchmark(args.seeds, args.sizes, args.modes, args.pairs)
+    print_rows(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
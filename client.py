@@ -1,20 +1,34 @@
 import pygame
 import sys
 import socket
-import json
 import threading
+import time
+from collections import deque
 from worldGenerator import PerlinNoise
 from Lighting import Light, Wall, render_lightmap
+from FixedTimestep import FixedTimestep, SIM_TICK_RATE
+from Profiler import profiler
+from ProfilerOverlay import ProfilerOverlay
+from SpatialHash import SpatialHash
+from Protocol import (PROTOCOL_JSON, PROTOCOL_BINARY, BINARY_PROTOCOL_VERSION, SNAPSHOT_HISTORY, FrameReader,
+                      encode_packet, protocol_request, apply_snapshot, from_fixed)
 
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 WORLD_WIDTH = 1000
 WORLD_HEIGHT = 1000
 TILE_SIZE = 32
-FPS = 60
+FPS = 60  # Frames drawn per second; local movement runs at SIM_TICK_RATE whatever the frame rate
 
 HOST = '127.0.0.1'
 PORT = 50000
+SEND_RATE = 20  # Most MOVE packets sent per second
+INTERPOLATION_DELAY = 0.1  # Seconds remote players are drawn behind the newest update; about two update intervals
+POSITION_BUFFER_SIZE = 16  # Timestamped positions kept per remote player
+PLAYER_SIZE = 24
+PLAYER_LIGHT_RADIUS = 150
+REMOTE_LIGHT_RADIUS = 120
+DRAW_LAG_MARGIN = 64  # Pixels a remote player may be drawn from its newest position, since drawing lags behind updates
 
 
 class World:
@@ -77,19 +91,22 @@ class Player:
     def __init__(self, x, y, color=(255, 0, 0)):
         self.x = x
         self.y = y
-        self.width = 24
-        self.height = 24
-        self.speed = 3
+        self.width = PLAYER_SIZE
+        self.height = PLAYER_SIZE
+        self.speed = 3  # Pixels per simulation tick
         self.color = color
+        self.prev_x = x  # Position before the last move, for drawing between ticks
+        self.prev_y = y
 
 
     """
     Name: move
     Parameters: dx (int): X direction, dy (int): Y direction, world (World): World reference
     Returns: None
-    Purpose: Moves the player while enforcing world boundaries.
+    Purpose: Moves the player by one simulation tick while enforcing world boundaries.
     """
     def move(self, dx, dy, world):
+        self.prev_x, self.prev_y = self.x, self.y
         new_x = self.x + dx * self.speed
         new_y = self.y + dy * self.speed
         # simple boundary check
@@ -98,15 +115,25 @@ class Player:
         if 0 <= new_y <= WORLD_HEIGHT * TILE_SIZE - self.height:
             self.y = new_y
 
+    """
+    Name: render_position
+    Parameters: alpha (float): How far between the last two ticks to draw, from 0 to 1
+    Returns: tuple[float, float]
+    Purpose: Interpolates the player's position between its last two ticks.
+    """
+    def render_position(self, alpha=1.0):
+        return (self.prev_x + (self.x - self.prev_x) * alpha,
+                self.prev_y + (self.y - self.prev_y) * alpha)
+
     """
     Name: draw
-    Parameters: screen (pygame.Surface): Display surface, camera (Camera): Camera instance
+    Parameters: screen (pygame.Surface): Display surface, camera (Camera): Camera instance, alpha (float)
     Returns: None
-    Purpose: Renders the player on screen.
+    Purpose: Renders the player on screen, interpolated between simulation ticks.
     """
-    def draw(self, screen, camera):
-        pygame.draw.rect(screen, self.color,
-                         (self.x - camera.x, self.y - camera.y, self.width, self.height))
+    def draw(self, screen, camera, alpha=1.0):
+        x, y = self.render_position(alpha)
+        pygame.draw.rect(screen, self.color, (x - camera.x, y - camera.y, self.width, self.height))
 
 
 class Camera:
@@ -123,8 +150,8 @@ class Camera:
     Purpose: Centers the camera on a target while clamping to world bounds.
     """
     def update(self, target_x, target_y):
-        self.x = target_x - self.width // 2
-        self.y = target_y - self.height // 2
+        self.x = int(target_x) - self.width // 2  # Whole pixels, so tile ranges and offsets stay integers
+        self.y = int(target_y) - self.height // 2
         self.x = max(0, min(self.x, WORLD_WIDTH * TILE_SIZE - self.width))
         self.y = max(0, min(self.y, WORLD_HEIGHT * TILE_SIZE - self.height))
 
@@ -136,8 +163,19 @@ class NetworkClient:
         self.player_id = None
         self.world_seed = None
         self.other_players = {}  # player_id -> {"x":, "y":}
-
-        threading.Thread(target=self.recv_loop, daemon=True).start()
+        self.protocol = PROTOCOL_JSON
+        self.negotiating = False  # True between asking for the binary protocol and the server's reply
+        self.send_lock = threading.Lock()  # recv_loop and the game loop both send
+        self.frames = FrameReader()
+        self.snapshots = {}  # sequence -> fixed point snapshot, oldest first, kept as delta bases
+        self.position_buffers = {}  # player_id -> deque of (arrival time, x, y) used for interpolation
+        self.spatial_hash = SpatialHash()  # Newest position of every remote player, for culling and proximity queries
+        self.spatial_lock = threading.Lock()  # recv_loop updates the hash while the game loop queries it
+        self.interpolation_delay = INTERPOLATION_DELAY  # Raise alongside lower server tick rates
+        self.last_sent = None  # Last position sent to the server
+        self.last_send_time = 0.0
+
+        threading.Thread(target=self.recv_loop, name="network", daemon=True).start()
 
     """
     Name: recv_loop
@@ -146,51 +184,192 @@ class NetworkClient:
     Purpose: Continuously receives and processes packets from the server.
     """
     def recv_loop(self):
-        buffer = ""
-        while True:
-            try:
-                data = self.sock.recv(4096).decode()
-                if not data:
-                    continue
-                buffer += data
-                while "\n" in buffer:
-                    line, buffer = buffer.split("\n", 1)
-                    if not line.strip():
-                        continue
-                    packet = json.loads(line)
-                    if packet["command"] == "SETUP":
-                        self.player_id = packet["data"]["PlayerID"]
-                        self.world_seed = packet["data"]["WorldSeed"]
-                        self.x = packet["data"]["PlayerX"]
-                        self.y = packet["data"]["PlayerY"]
-                    elif packet["command"] == "UPDATE_POS":
-                        for pid, pos in packet["data"].items():
-                            self.other_players[pid] = pos
-            except Exception as e:
-                print("Connection lost:", e)
-                break
+        try:
+            while self.frames.recv_from(self.sock):
+                with profiler.stage("packets"):  # Shown as network:packets, apart from the frame's own stages
+                    for packet in self.frames.packets():
+                        self.handle_packet(packet)
+            if self.frames.pending():
+                print("Connection closed by server part way through a packet")
+            else:
+                print("Connection closed by server")
+        except Exception as e:
+            print("Connection lost:", e)
+
+    """
+    Name: handle_packet
+    Parameters: packet (dict): Data packet
+    Returns: None
+    Purpose: Applies one packet received from the server.
+    """
+    def handle_packet(self, packet):
+        if packet["command"] == "SETUP":
+            self.player_id = packet["data"]["PlayerID"]
+            self.world_seed = packet["data"]["WorldSeed"]
+            self.x = packet["data"]["PlayerX"]
+            self.y = packet["data"]["PlayerY"]
+            # Older servers do not advertise any protocols and stay on JSON
+            if (PROTOCOL_BINARY in packet["data"].get("Protocols", [])
+                    and packet["data"].get("ProtocolVersion") == BINARY_PROTOCOL_VERSION):
+                self.negotiating = True
+                self.send(encode_packet(protocol_request()))
+        elif packet["command"] == "PROTOCOL":
+            self.protocol = packet["data"]["Name"]
+            self.frames.protocol = self.protocol
+            self.negotiating = False
+        elif packet["command"] in ("UPDATE_POS", "ENTER"):
+            positions = {int(pid): pos for pid, pos in packet["data"].items()}  # JSON object keys arrive as strings
+            self.other_players.update(positions)
+            self.record_positions(positions)
+        elif packet["command"] == "SNAPSHOT":
+            self.handle_snapshot(packet["data"])
+        elif packet["command"] == "LEAVE":
+            # Out of range or disconnected; the server resends them with ENTER if they come back
+            with self.spatial_lock:
+                for pid in packet["data"]:
+                    self.other_players.pop(pid, None)
+                    self.position_buffers.pop(pid, None)
+                    self.spatial_hash.remove(pid)
 
+    """
+    Name: handle_snapshot
+    Parameters: data (dict): Decoded SNAPSHOT packet
+    Returns: None
+    Purpose: Rebuilds the visible players from a delta snapshot and acknowledges it, or asks for a full
+             snapshot if its base is no longer held.
+    """
+    def handle_snapshot(self, data):
+        if data["Base"]:
+            base = self.snapshots.get(data["Base"])
+            if base is None:
+                self.send(encode_packet({"command": "ACK", "data": {"Sequence": 0}}, self.protocol))
+                return
+        else:
+            base = {}
+        snapshot = apply_snapshot(base, data)
+        self.snapshots[data["Sequence"]] = snapshot
+        if len(self.snapshots) > SNAPSHOT_HISTORY:
+            del self.snapshots[next(iter(self.snapshots))]
+
+        # Replaced rather than updated in place, so the game loop never sees a half-applied snapshot
+        self.other_players = {pid: {"x": from_fixed(x), "y": from_fixed(y)} for pid, (x, y) in snapshot.items()}
+        self.record_positions(self.other_players)
+        with self.spatial_lock:
+            for pid in list(self.position_buffers):
+                if pid not in snapshot:
+                    del self.position_buffers[pid]  # Full snapshots do not list removals
+                    self.spatial_hash.remove(pid)
+        self.send(encode_packet({"command": "ACK", "data": {"Sequence": data["Sequence"]}}, self.protocol))
+
+    """
+    Name: record_positions
+    Parameters: positions (dict): player_id -> {"x":, "y":}
+    Returns: None
+    Purpose: Adds newly received positions to each remote player's interpolation buffer and the spatial hash.
+    """
+    def record_positions(self, positions):
+        now = time.monotonic()
+        with self.spatial_lock:
+            for pid, pos in positions.items():
+                self.spatial_hash.move(pid, pos["x"], pos["y"])
+        for pid, pos in positions.items():
+            buffer = self.position_buffers.get(pid)
+            if buffer is None:
+                buffer = self.position_buffers[pid] = deque(maxlen=POSITION_BUFFER_SIZE)
+            elif buffer[-1][1] == pos["x"] and buffer[-1][2] == pos["y"]:
+                continue
+            elif now - buffer[-1][0] > self.interpolation_delay:
+                # Only moves are sent, so after standing still the last sample is old. Hold it until just before
+                # this one, otherwise the player would glide slowly across the whole idle period.
+                buffer.append((now - self.interpolation_delay, buffer[-1][1], buffer[-1][2]))
+            buffer.append((now, pos["x"], pos["y"]))
+
+    """
+    Name: get_render_positions
+    Parameters: now (float | None): time.monotonic() value to render at, area (tuple[float, float, float, float] |
+                None): left, top, right, bottom world pixels to limit the players to
+    Returns: dict[int, tuple[float, float]]
+    Purpose: Returns each remote player's position interpolated at interpolation_delay seconds in the past. With an
+             area, only players the spatial hash places in or near it are interpolated; callers cull exactly.
+    """
+    def get_render_positions(self, now=None, area=None):
+        render_time = (time.monotonic() if now is None else now) - self.interpolation_delay
+        if area is None:
+            pids = list(self.position_buffers)
+        else:
+            left, top, right, bottom = area
+            with self.spatial_lock:
+                pids = self.spatial_hash.within(left - DRAW_LAG_MARGIN, top - DRAW_LAG_MARGIN,
+                                                right + DRAW_LAG_MARGIN, bottom + DRAW_LAG_MARGIN)
+        positions = {}
+        for pid in pids:
+            buffer = self.position_buffers.get(pid)
+            samples = list(buffer) if buffer is not None else None  # The receive thread may append while we read
+            if not samples:
+                continue
+            previous = samples[0]
+            if render_time <= previous[0]:
+                positions[pid] = (previous[1], previous[2])
+                continue
+            for sample in samples[1:]:
+                if sample[0] >= render_time:
+                    t = (render_time - previous[0]) / (sample[0] - previous[0])
+                    positions[pid] = (previous[1] + (sample[1] - previous[1]) * t,
+                                      previous[2] + (sample[2] - previous[2]) * t)
+                    break
+                previous = sample
+            else:
+                positions[pid] = (previous[1], previous[2])  # No newer update yet, so hold the last position
+        return positions
+
+    """
+    Name: players_near
+    Parameters: x (float), y (float), radius (float)
+    Returns: list[tuple[float, int]]
+    Purpose: Returns (distance, player_id) for every remote player whose newest position is within radius of a
+             point, nearest first, for AI and interaction checks.
+    """
+    def players_near(self, x, y, radius):
+        with self.spatial_lock:
+            return [(distance, pid) for distance, pid in self.spatial_hash.near(x, y, radius)
+                    if pid != self.player_id]
+
+    """
+    Name: send
+    Parameters: data (bytes): Encoded packet
+    Returns: None
+    Purpose: Sends one encoded packet, keeping packets from different threads whole.
+    """
+    def send(self, data):
+        with self.send_lock:
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                pass
 
     """
     Name: send_move
     Parameters: x (float): Player X position, y (float): Player Y position
     Returns: None
-    Purpose: Sends the player's position to the server.
+    Purpose: Sends the player's position to the server if it changed, at most SEND_RATE times a second. Safe to
+             call every frame; a throttled position goes out on a later call.
     """
     def send_move(self, x, y):
-        if self.player_id is None:
+        # Moves are skipped while negotiating, since the server switches protocol on reading the request
+        if self.player_id is None or self.negotiating or self.last_sent == (x, y):
             return
-        packet = {"command": "MOVE", "data": {"x": x, "y": y}}
-        try:
-            self.sock.send((json.dumps(packet) + "\n").encode())
-        except:
-            pass
+        now = time.monotonic()
+        if now - self.last_send_time < 1 / SEND_RATE:
+            return
+        self.last_sent = (x, y)
+        self.last_send_time = now
+        self.send(encode_packet({"command": "MOVE", "data": {"x": x, "y": y}}, self.protocol))
 
 """
 Name: main
 Parameters: None
 Returns: None
-Purpose: Entry point for the multiplayer game client.
+Purpose: Entry point for the multiplayer game client. F3 shows the profiler overlay and F4 records a profiler trace.
 """
 def main():
     pygame.init()
@@ -207,12 +386,18 @@ def main():
     world = World(WORLD_WIDTH, WORLD_HEIGHT, network.world_seed)
     player = Player(network.x, network.y)
     camera = Camera(SCREEN_WIDTH, SCREEN_HEIGHT)
+    timestep = FixedTimestep(SIM_TICK_RATE)
+    overlay = ProfilerOverlay(profiler)
 
     running = True
     while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
+        profiler.begin_frame()
+        with profiler.stage("events"):
+            for event in pygame.event.get():
+                if overlay.handle_event(event):
+                    continue
+                if event.type == pygame.QUIT:
+                    running = False
 
         keys = pygame.key.get_pressed()
         dx = dy = 0
@@ -221,55 +406,79 @@ def main():
         if keys[pygame.K_UP] or keys[pygame.K_w]: dy = -1
         if keys[pygame.K_DOWN] or keys[pygame.K_s]: dy = 1
 
-        player.move(dx, dy, world)
-        camera.update(player.x + player.width // 2, player.y + player.height // 2)
-        network.send_move(player.x, player.y)
+        # Movement runs in fixed ticks, so slow lighting frames no longer slow the player down
+        with profiler.stage("movement"):
+            for _ in range(timestep.advance()):
+                player.move(dx, dy, world)
+        with profiler.stage("network"):
+            network.send_move(player.x, player.y)
+        alpha = timestep.alpha()
+        player_x, player_y = player.render_position(alpha)
+        camera.update(player_x + player.width // 2, player_y + player.height // 2)
 
-        screen.fill((0, 0, 0))
         start_x = max(0, camera.x // TILE_SIZE)
         end_x = min(world.width, (camera.x + camera.width) // TILE_SIZE + 1)
         start_y = max(0, camera.y // TILE_SIZE)
         end_y = min(world.height, (camera.y + camera.height) // TILE_SIZE + 1)
-        for y in range(start_y, end_y):
-            for x in range(start_x, end_x):
-                color = world.get_tile_color(world.tile_map[y][x])
-                screen.fill(color, rect=(x * TILE_SIZE - camera.x, y * TILE_SIZE - camera.y, TILE_SIZE, TILE_SIZE))
-
-        walls = []
-        margin = 2
-        for y in range(start_y - margin, end_y + margin):
-            for x in range(start_x - margin, end_x + margin):
-                if 0 <= x < world.width and 0 <= y < world.height:
-                    tile = world.tile_map[y][x]
-                    if tile in ['mountain', 'forest']:
-                        wx = x * TILE_SIZE - camera.x
-                        wy = y * TILE_SIZE - camera.y
-                        walls.extend([
-                            Wall(wx, wy, wx + TILE_SIZE, wy),
-                            Wall(wx + TILE_SIZE, wy, wx + TILE_SIZE, wy + TILE_SIZE),
-                            Wall(wx + TILE_SIZE, wy + TILE_SIZE, wx, wy + TILE_SIZE),
-                            Wall(wx, wy + TILE_SIZE, wx, wy)
-                        ])
+        with profiler.stage("terrain"):
+            screen.fill((0, 0, 0))
+            for y in range(start_y, end_y):
+                for x in range(start_x, end_x):
+                    color = world.get_tile_color(world.tile_map[y][x])
+                    screen.fill(color, rect=(x * TILE_SIZE - camera.x, y * TILE_SIZE - camera.y,
+                                             TILE_SIZE, TILE_SIZE))
+
+        with profiler.stage("walls"):
+            walls = []
+            margin = 2
+            for y in range(start_y - margin, end_y + margin):
+                for x in range(start_x - margin, end_x + margin):
+                    if 0 <= x < world.width and 0 <= y < world.height:
+                        tile = world.tile_map[y][x]
+                        if tile in ['mountain', 'forest']:
+                            wx = x * TILE_SIZE - camera.x
+                            wy = y * TILE_SIZE - camera.y
+                            walls.extend([
+                                Wall(wx, wy, wx + TILE_SIZE, wy),
+                                Wall(wx + TILE_SIZE, wy, wx + TILE_SIZE, wy + TILE_SIZE),
+                                Wall(wx + TILE_SIZE, wy + TILE_SIZE, wx, wy + TILE_SIZE),
+                                Wall(wx, wy + TILE_SIZE, wx, wy)
+                            ])
 
         lights = [
-            Light(player.x - camera.x + player.width // 2,
-                  player.y - camera.y + player.height // 2, 150, (255, 255, 255))
+            Light(player_x - camera.x + player.width // 2,
+                  player_y - camera.y + player.height // 2, PLAYER_LIGHT_RADIUS, (255, 255, 255))
         ]
-        for pid, pos in network.other_players.items():
-            if pid != network.player_id:
-                lights.append(Light(pos["x"] - camera.x + 12,
-                                    pos["y"] - camera.y + 12, 120, (255, 255, 255)))
-
-        render_lightmap(screen, lights, walls, step=20)
-
-        for pid, pos in network.other_players.items():
-            if pid != network.player_id:
-                pygame.draw.rect(screen, (255, 255, 255),
-                                 (pos["x"] - camera.x, pos["y"] - camera.y, 24, 24))
-        player.draw(screen, camera)
-
-        pygame.display.flip()
-        clock.tick(FPS)
+        # Only players whose light can reach the screen are looked at
+        reach = REMOTE_LIGHT_RADIUS + PLAYER_SIZE
+        with profiler.stage("network"):
+            remote_positions = network.get_render_positions(area=(camera.x - reach, camera.y - reach,
+                                                                  camera.x + camera.width + reach,
+                                                                  camera.y + camera.height + reach))
+        remote_positions.pop(network.player_id, None)
+        for rx, ry in remote_positions.values():
+            light_x = rx - camera.x + PLAYER_SIZE // 2
+            light_y = ry - camera.y + PLAYER_SIZE // 2
+            if -REMOTE_LIGHT_RADIUS < light_x < camera.width + REMOTE_LIGHT_RADIUS and \
+                    -REMOTE_LIGHT_RADIUS < light_y < camera.height + REMOTE_LIGHT_RADIUS:
+                lights.append(Light(light_x, light_y, REMOTE_LIGHT_RADIUS, (255, 255, 255)))
+
+        render_lightmap(screen, lights, walls, step=20)  # Profiled as "lighting"
+
+        with profiler.stage("entities"):
+            for rx, ry in remote_positions.values():
+                if -PLAYER_SIZE < rx - camera.x < camera.width and -PLAYER_SIZE < ry - camera.y < camera.height:
+                    pygame.draw.rect(screen, (255, 255, 255),
+                                     (rx - camera.x, ry - camera.y, PLAYER_SIZE, PLAYER_SIZE))
+            player.draw(screen, camera, alpha)
+        with profiler.stage("overlay"):
+            overlay.draw(screen)
+
+        with profiler.stage("present"):
+            pygame.display.flip()
+        with profiler.stage("idle"):  # Waiting for the frame cap
+            clock.tick(FPS)
+        profiler.end_frame()
 
     pygame.quit()
     sys.exit()
@@ -0,0 +1,397 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from server import GameServer, HOST, TICK_RATE
+from Protocol import (PROTOCOL_JSON, PROTOCOL_BINARY, BINARY_PROTOCOL_VERSION, SNAPSHOT_HISTORY, FrameReader,
+                      encode_packet, protocol_request, apply_snapshot, to_fixed)
+
+LOADTEST_BOTS = 50
+LOADTEST_DURATION = 10.0  # Seconds measured after every bot has connected
+MOVE_RATE = 20  # MOVE packets per second per bot, matching client.SEND_RATE
+BOT_SPEED = 180  # Pixels per second, the same as a player moving 3 pixels a frame at 60 FPS
+ARENA_SIZE = 1500  # Bots wander inside a square this big, so most of them can see each other
+SENT_POSITION_HISTORY = 64  # Sent positions remembered per bot for matching latency
+MOVEMENT_PATTERNS = ["random", "circle"]
+
+
+class LoadStats:
+    """
+    Name: __init__
+    Parameters: None
+    Returns: None
+    Purpose: Counters shared by every bot in a load test.
+    """
+    def __init__(self):
+        self.sent_positions = {}  # player_id -> {(fixed x, fixed y): send time}
+        self.reset()
+
+    """
+    Name: reset
+    Parameters: None
+    Returns: None
+    Purpose: Clears the counters so the measured window excludes connecting.
+    """
+    def reset(self):
+        self.moves_sent = 0
+        self.packets_received = 0
+        self.updates_received = 0  # Individual player positions that changed on a receiving bot
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latencies_ms = []
+        self.disconnects = 0
+
+    """
+    Name: record_send
+    Parameters: player_id (int), x (int), y (int), now (float)
+    Returns: None
+    Purpose: Remembers when a bot sent a position, so receivers can work out its latency.
+    """
+    def record_send(self, player_id, x, y, now):
+        sent = self.sent_positions.setdefault(player_id, {})
+        sent[(to_fixed(x), to_fixed(y))] = now
+        if len(sent) > SENT_POSITION_HISTORY:
+            del sent[next(iter(sent))]
+
+    """
+    Name: record_receive
+    Parameters: player_id (int), fixed_position (tuple[int, int]), now (float)
+    Returns: None
+    Purpose: Counts a position update arriving at a bot and records its end-to-end latency if it can be matched.
+    """
+    def record_receive(self, player_id, fixed_position, now):
+        self.updates_received += 1
+        sent_time = self.sent_positions.get(player_id, {}).get(fixed_position)
+        if sent_time is not None:
+            self.latencies_ms.append((now - sent_time) * 1000)
+
+
+class Bot:
+    """
+    Name: __init__
+    Parameters: index (int), stats (LoadStats), protocol (str), movement (str), rng (random.Random)
+    Returns: None
+    Purpose: Headless client speaking the same protocol as NetworkClient, moving on a script or at random.
+    """
+    def __init__(self, index, stats, protocol, movement, rng):
+        self.index = index
+        self.stats = stats
+        self.protocol_choice = protocol  # Protocol to ask for after SETUP
+        self.movement = movement
+        self.rng = rng
+        self.player_id = None
+        self.protocol = PROTOCOL_JSON
+        self.ready = asyncio.Event()  # Set once SETUP and protocol negotiation are done
+        self.frames = FrameReader()
+        self.snapshots = {}  # sequence -> snapshot, for delta decoding
+        self.known = {}  # player_id -> last fixed point position seen
+        self.x = self.y = 0
+        self.heading = rng.uniform(0, 2 * math.pi)
+        self.writer = None
+
+    """
+    Name: send
+    Parameters: packet (dict)
+    Returns: None
+    Purpose: Encodes and writes one packet with the negotiated protocol.
+    """
+    def send(self, packet):
+        data = encode_packet(packet, self.protocol)
+        self.stats.bytes_sent += len(data)
+        self.writer.write(data)
+
+    """
+    Name: handle_packet
+    Parameters: packet (dict)
+    Returns: None
+    Purpose: Applies one packet from the server, acknowledging snapshots like NetworkClient does.
+    """
+    def handle_packet(self, packet):
+        now = time.monotonic()
+        self.stats.packets_received += 1
+        command = packet["command"]
+        if command == "SETUP":
+            self.player_id = packet["data"]["PlayerID"]
+            # Spread bots over the arena straight away rather than starting on the shared spawn points
+            self.x = self.rng.randrange(ARENA_SIZE)
+            self.y = self.rng.randrange(ARENA_SIZE)
+            if self.protocol_choice == PROTOCOL_BINARY and \
+                    packet["data"].get("ProtocolVersion") == BINARY_PROTOCOL_VERSION:
+                self.send(protocol_request())
+            else:
+                self.ready.set()
+        elif command == "PROTOCOL":
+            self.protocol = packet["data"]["Name"]
+            self.frames.protocol = self.protocol
+            self.ready.set()
+        elif command in ("UPDATE_POS", "ENTER"):
+            for pid, pos in packet["data"].items():
+                self.observe(int(pid), (to_fixed(pos["x"]), to_fixed(pos["y"])), now)
+        elif command == "LEAVE":
+            for pid in packet["data"]:
+                self.known.pop(pid, None)
+        elif command == "SNAPSHOT":
+            data = packet["data"]
+            if data["Base"] and data["Base"] not in self.snapshots:
+                self.send({"command": "ACK", "data": {"Sequence": 0}})
+                return
+            snapshot = apply_snapshot(self.snapshots.get(data["Base"], {}), data)
+            self.snapshots[data["Sequence"]] = snapshot
+            if len(self.snapshots) > SNAPSHOT_HISTORY:
+                del self.snapshots[next(iter(self.snapshots))]
+            for pid, position in snapshot.items():
+                self.observe(pid, position, now)
+            self.known = {pid: self.known[pid] for pid in snapshot}
+            self.send({"command": "ACK", "data": {"Sequence": data["Sequence"]}})
+
+    """
+    Name: observe
+    Parameters: player_id (int), position (tuple[int, int]), now (float)
+    Returns: None
+    Purpose: Records a position only if it differs from what this bot last saw for that player.
+    """
+    def observe(self, player_id, position, now):
+        if self.known.get(player_id) != position:
+            self.known[player_id] = position
+            self.stats.record_receive(player_id, position, now)
+
+    """
+    Name: step
+    Parameters: dt (float), elapsed (float)
+    Returns: None
+    Purpose: Advances the bot along its movement pattern, staying inside the arena.
+    """
+    def step(self, dt, elapsed):
+        if self.movement == "circle":
+            radius = ARENA_SIZE / 4
+            angle = self.heading + elapsed * BOT_SPEED / radius
+            self.x = round(ARENA_SIZE / 2 + math.cos(angle) * radius)
+            self.y = round(ARENA_SIZE / 2 + math.sin(angle) * radius)
+            return
+
+        if self.rng.random() < dt:  # Turn about once a second
+            self.heading = self.rng.uniform(0, 2 * math.pi)
+        x = self.x + math.cos(self.heading) * BOT_SPEED * dt
+        y = self.y + math.sin(self.heading) * BOT_SPEED * dt
+        if not (0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE):
+            self.heading += math.pi
+            return
+        # Whole pixels, so the fixed point positions the server echoes back match exactly
+        self.x, self.y = round(x), round(y)
+
+    """
+    Name: receive_loop
+    Parameters: reader (asyncio.StreamReader)
+    Returns: None
+    Purpose: Reads and handles packets until the server closes the connection.
+    """
+    async def receive_loop(self, reader):
+        while not self.frames.eof:
+            data = await reader.read(65536)
+            self.stats.bytes_received += len(data)
+            self.frames.feed(data)
+            for packet in self.frames.packets():
+                self.handle_packet(packet)
+
+    """
+    Name: move_loop
+    Parameters: rate (float), stop (asyncio.Event)
+    Returns: None
+    Purpose: Sends a MOVE at a fixed rate until stopped.
+    """
+    async def move_loop(self, rate, stop):
+        await self.ready.wait()
+        interval = 1 / rate
+        start = time.monotonic()
+        # Stagger bots so their moves do not all land in the same instant
+        await asyncio.sleep(self.rng.uniform(0, interval))
+        while not stop.is_set():
+            now = time.monotonic()
+            self.step(interval, now - start)
+            self.stats.record_send(self.player_id, self.x, self.y, now)
+            self.send({"command": "MOVE", "data": {"x": self.x, "y": self.y}})
+            self.stats.moves_sent += 1
+            await asyncio.sleep(interval)
+
+    """
+    Name: run
+    Parameters: host (str), port (int), rate (float), stop (asyncio.Event)
+    Returns: None
+    Purpose: Connects, moves until stopped, then disconnects.
+    """
+    async def run(self, host, port, rate, stop):
+        reader, self.writer = await asyncio.open_connection(host, port)
+        receive_task = asyncio.create_task(self.receive_loop(reader))
+        move_task = asyncio.create_task(self.move_loop(rate, stop))
+        stop_task = asyncio.create_task(stop.wait())
+        try:
+            await asyncio.wait([receive_task, stop_task], return_when=asyncio.FIRST_COMPLETED)
+            if receive_task.done() and not stop.is_set():
+                self.stats.disconnects += 1
+        except (ConnectionError, ValueError) as e:
+            print(f"Bot {self.index} failed: {e}")
+            self.stats.disconnects += 1
+        finally:
+            for task in (receive_task, move_task, stop_task):
+                task.cancel()
+            self.writer.close()
+
+
+"""
+Name: start_local_server
+Parameters: tick_rate (float), seed (int | None)
+Returns: tuple[GameServer, asyncio.AbstractEventLoop]
+Purpose: Runs a GameServer on its own thread and event loop, so its CPU time can be measured apart from the bots.
+"""
+def start_local_server(tick_rate, seed=None):
+    loop = asyncio.new_event_loop()
+    server = GameServer(HOST, 0, tick_rate=tick_rate) if seed is None else GameServer(HOST, 0, seed, tick_rate)
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return server, loop
+
+
+"""
+Name: read_thread_time
+Parameters: None
+Returns: float
+Purpose: Returns the CPU time of the thread running the calling event loop.
+"""
+async def read_thread_time():
+    return time.thread_time()
+
+
+"""
+Name: percentile
+Parameters: values (list[float]), fraction (float)
+Returns: float
+Purpose: Returns the value below which the given fraction of the sorted values fall.
+"""
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+"""
+Name: run_load_test
+Parameters: bots (int), duration (float), rate (float), protocol (str), movement (str), host (str | None),
+            port (int), tick_rate (float), seed (int)
+Returns: dict
+Purpose: Connects the bots, drives the server for the given duration and returns the measured results.
+"""
+async def run_load_test(bots, duration, rate, protocol, movement, host=None, port=0, tick_rate=TICK_RATE, seed=0):
+    server_loop = None
+    if host is None:
+        server, server_loop = start_local_server(tick_rate)
+        host, port = server.host, server.port
+
+    stats = LoadStats()
+    stop = asyncio.Event()
+    rng = random.Random(seed)
+    bot_list = [Bot(i, stats, protocol, movement, random.Random(rng.random())) for i in range(bots)]
+    tasks = [asyncio.create_task(bot.run(host, port, rate, stop)) for bot in bot_list]
+    await asyncio.wait_for(asyncio.gather(*(bot.ready.wait() for bot in bot_list)), timeout=30)
+
+    # Measure only once everyone is connected
+    stats.reset()
+    wall_start = time.monotonic()
+    bot_cpu_start = time.thread_time()
+    server_cpu_start = asyncio.run_coroutine_threadsafe(read_thread_time(), server_loop).result() \
+        if server_loop else None
+    await asyncio.sleep(duration)
+    elapsed = time.monotonic() - wall_start
+    bot_cpu = time.thread_time() - bot_cpu_start
+    server_cpu = asyncio.run_coroutine_threadsafe(read_thread_time(), server_loop).result() - server_cpu_start \
+        if server_loop else None
+    results = {
+        "bots": bots,
+        "protocol": protocol,
+        "movement": movement,
+        "seconds": elapsed,
+        "moves_per_s": stats.moves_sent / elapsed,
+        "packets_received_per_s": stats.packets_received / elapsed,
+        "updates_per_s": stats.updates_received / elapsed,
+        "latency_p50_ms": percentile(stats.latencies_ms, 0.5),
+        "latency_p95_ms": percentile(stats.latencies_ms, 0.95),
+        "latency_p99_ms": percentile(stats.latencies_ms, 0.99),
+        "latency_max_ms": max(stats.latencies_ms, default=0.0),
+        "down_bytes_per_player_s": stats.bytes_received / bots / elapsed,
+        "up_bytes_per_player_s": stats.bytes_sent / bots / elapsed,
+        "server_cpu_percent": server_cpu / elapsed * 100 if server_cpu is not None else None,
+        "bot_cpu_percent": bot_cpu / elapsed * 100,
+        "disconnects": stats.disconnects
+    }
+
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if server_loop:
+        asyncio.run_coroutine_threadsafe(server.shutdown(), server_loop).result()
+        server_loop.call_soon_threadsafe(server_loop.stop)
+    return results
+
+
+"""
+Name: print_results
+Parameters: results (dict)
+Returns: None
+Purpose: Prints a load test report.
+"""
+def print_results(results):
+    print(f"{results['bots']} bots, {results['protocol']} protocol, {results['movement']} movement, "
+          f"{results['seconds']:.1f}s")
+    print(f"  moves sent:        {results['moves_per_s']:10.0f} /s")
+    print(f"  packets received:  {results['packets_received_per_s']:10.0f} /s")
+    print(f"  position updates:  {results['updates_per_s']:10.0f} /s")
+    print(f"  latency ms:        p50 {results['latency_p50_ms']:.1f}  p95 {results['latency_p95_ms']:.1f}  "
+          f"p99 {results['latency_p99_ms']:.1f}  max {results['latency_max_ms']:.1f}")
+    print(f"  bytes/player/s:    down {results['down_bytes_per_player_s']:.0f}  "
+          f"up {results['up_bytes_per_player_s']:.0f}")
+    if results["server_cpu_percent"] is not None:
+        print(f"  server CPU:        {results['server_cpu_percent']:10.1f} %")
+    print(f"  bot CPU:           {results['bot_cpu_percent']:10.1f} %")
+    print(f"  disconnects:       {results['disconnects']:10}")
+
+
+"""
+Name: main
+Parameters: None
+Returns: None
+Purpose: Command-line entry point for the server load test.
+"""
+def main():
+    parser = argparse.ArgumentParser(description="Drive server.py with headless bot clients.")
+    parser.add_argument("--bots", type=int, default=LOADTEST_BOTS)
+    parser.add_argument("--duration", type=float, default=LOADTEST_DURATION, help="Seconds to measure")
+    parser.add_argument("--rate", type=float, default=MOVE_RATE, help="MOVE packets per second per bot")
+    parser.add_argument("--protocol", choices=[PROTOCOL_JSON, PROTOCOL_BINARY], default=PROTOCOL_BINARY)
+    parser.add_argument("--movement", choices=MOVEMENT_PATTERNS, default="random")
+    parser.add_argument("--host", help="Test a running server instead of starting one in-process")
+    parser.add_argument("--port", type=int, default=50000)
+    parser.add_argument("--tick-rate", type=float, default=TICK_RATE, help="Tick rate of the in-process server")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_load_test(args.bots, args.duration, args.rate, args.protocol, args.movement,
+                                        args.host, args.port, args.tick_rate, args.seed))
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,19 @@
 import pygame
 import sys
-import random
+import argparse
 import json
-import os
+import math
+import random
+import time
 from worldGenerator import PerlinNoise
-from Pathfinding import Pathfinder
+from Pathfinding import Pathfinder, IncrementalPathfinder, ALGORITHM_INCREMENTAL
+from PathScheduler import PathRequestScheduler, PATH_FRAME_BUDGET_MS
 from Lighting import Light, Wall, render_lightmap
+from SaveGame import SaveManager, WorldCache
+from EntityStore import EntityStore, EntityField, FOLLOWS_PATH, COLLIDES
+from FixedTimestep import FixedTimestep, LockstepTimestep, SIM_TICK_RATE
+from Profiler import profiler
+from ProfilerOverlay import ProfilerOverlay
 
 pygame.init()
 
@@ -14,8 +22,16 @@ SCREEN_HEIGHT = 600
 WORLD_WIDTH = 1000
 WORLD_HEIGHT = 1000
 TILE_SIZE = 32
-FPS = 60
-SAVE_FILE = "savegame.json"
+FPS = 60  # Frames drawn per second; the simulation runs at SIM_TICK_RATE whatever the frame rate
+REPATH_INTERVAL_MS = 500  # How often the follower asks for a fresh path to the player
+REPATH_INTERVAL_TICKS = REPATH_INTERVAL_MS * SIM_TICK_RATE // 1000
+HEADLESS_TICKS = 3600  # One minute of game time
+HEADLESS_INPUT_TICKS = 30  # Ticks between changes of the scripted player's direction
+LIGHT_STEP = 20  # Pixels per lightmap sample, as in client.py
+LIGHT_WALL_MARGIN = 2  # Tiles beyond the screen edge whose walls still cast shadows onto it
+LIGHT_BLOCKING_TILES = ['mountain', 'forest']
+PLAYER_LIGHT_RADIUS = 150
+FOLLOWER_LIGHT_RADIUS = 120
 
 WHITE = (255, 255, 255)
 BLUE = (0, 100, 255)
@@ -31,34 +47,51 @@ BLACK = (0, 0, 0)
 
 """
 Name: save_game
-Parameters: player (Player), follower (Follower), seed (int)
+Parameters: save_manager (SaveManager), world (World), player (Player), follower (Follower)
 Returns: None
-Purpose: Saves the current game state to disk.
+Purpose: Snapshots the current game state and writes it to disk in the background.
 """
-def save_game(player, follower, seed):
-    data = {
-        "seed": seed,
-        "player": {"x": player.x, "y": player.y},
-        "follower": {"x": follower.x, "y": follower.y}
+def save_game(save_manager, world, player, follower):
+    state = {
+        "seed": world.seed,
+        "width": world.width,
+        "height": world.height,
+        "tiles": world.get_tile_changes(),
+        "entities": [
+            {"kind": "player", "x": player.x, "y": player.y},
+            {"kind": "follower", "x": follower.x, "y": follower.y, "path": list(follower.path),
+             "target_index": follower.target_index}
+        ]
     }
-    with open(SAVE_FILE, "w") as f:
-        json.dump(data, f)
-    print("Game saved!")
+    save_manager.save(state, callback=report_save)
 
 
 """
-Name: load_game
-Parameters: None
-Returns: dict | None
-Purpose: Loads the saved game state from disk.
+Name: report_save
+Parameters: error (Exception | None)
+Returns: None
+Purpose: Reports a finished background save.
+"""
+def report_save(error):
+    if error is None:
+        print("Game saved!")
+    else:
+        print(f"Save failed: {error}")
+
+
+"""
+Name: prepare_load
+Parameters: world_cache (WorldCache), current_world (World), state (dict)
+Returns: tuple[World, Pathfinder | None]
+Purpose: Runs on the save thread. Fetches the saved world, generating it only if it is not cached, and builds its
+         pathfinding grid unless it is the world already being played, which the main thread updates itself.
 """
-def load_game():
-    if not os.path.exists(SAVE_FILE):
-        print("No save file found!")
-        return None
-    with open(SAVE_FILE, "r") as f:
-        data = json.load(f)
-    return data
+def prepare_load(world_cache, current_world, state):
+    world = world_cache.get(state["seed"])
+    if world is current_world:
+        return world, None
+    world.apply_tile_changes(state["tiles"])
+    return world, Pathfinder(world.build_passability_grid())
 
 
 class World:
@@ -74,6 +107,10 @@ class World:
         self.seed = seed or random.randint(1, 1000000)
         self.perlin = PerlinNoise(self.seed)
         self.tile_map = self.generate_world()
+        self.original_tiles = {}  # (x, y) -> generated tile type, for tiles changed since generation
+        # Row-major, 1 for impassable tiles; EntityStore checks collisions against it
+        self.blocked_tiles = bytearray(0 if self.is_passable(tile_type) else 1
+                                       for row in self.tile_map for tile_type in row)
 
     """
     Name: generate_world
@@ -111,6 +148,46 @@ class World:
 
         return tile_map
 
+    """
+    Name: set_tile
+    Parameters: x (int), y (int), tile_type (str)
+    Returns: None
+    Purpose: Changes one tile, remembering the generated tile so saves only store tiles that differ from it.
+    """
+    def set_tile(self, x, y, tile_type):
+        original = self.original_tiles.setdefault((x, y), self.tile_map[y][x])
+        self.tile_map[y][x] = tile_type
+        self.blocked_tiles[y * self.width + x] = 0 if self.is_passable(tile_type) else 1
+        if tile_type == original:
+            del self.original_tiles[(x, y)]
+
+    """
+    Name: get_tile_changes
+    Parameters: None
+    Returns: dict[tuple[int, int], str]
+    Purpose: Returns every tile that differs from the generated terrain.
+    """
+    def get_tile_changes(self):
+        return {(x, y): self.tile_map[y][x] for x, y in self.original_tiles}
+
+    """
+    Name: apply_tile_changes
+    Parameters: changes (dict[tuple[int, int], str])
+    Returns: bool
+    Purpose: Makes the generated terrain plus exactly these changes the current map. Returns whether any tile changed.
+    """
+    def apply_tile_changes(self, changes):
+        changed = False
+        for x, y in list(self.original_tiles):
+            if (x, y) not in changes:
+                self.set_tile(x, y, self.original_tiles[(x, y)])
+                changed = True
+        for (x, y), tile_type in changes.items():
+            if self.tile_map[y][x] != tile_type:
+                self.set_tile(x, y, tile_type)
+                changed = True
+        return changed
+
     """
     Name: get_tile_color
     Parameters: tile_type (str)
@@ -137,6 +214,15 @@ class World:
     def is_passable(self, tile_type):
         return tile_type not in ['mountain']
 
+    """
+    Name: build_passability_grid
+    Parameters: None
+    Returns: list[list[int]]
+    Purpose: Builds the grid used by the pathfinders (0 walkable, 1 blocked).
+    """
+    def build_passability_grid(self):
+        return [list(self.blocked_tiles[y * self.width:(y + 1) * self.width]) for y in range(self.height)]
+
 
 class Camera:
     """
@@ -158,25 +244,28 @@ class Camera:
     Purpose: Centers the camera on a target position while clamping to world bounds.
     """
     def update(self, target_x, target_y):
-        self.x = target_x - self.width // 2
-        self.y = target_y - self.height // 2
+        self.x = int(target_x) - self.width // 2  # Whole pixels, so tile ranges and offsets stay integers
+        self.y = int(target_y) - self.height // 2
         self.x = max(0, min(self.x, WORLD_WIDTH * TILE_SIZE - self.width))
         self.y = max(0, min(self.y, WORLD_HEIGHT * TILE_SIZE - self.height))
 
 
 class Player:
+    x = EntityField("x")
+    y = EntityField("y")
+    width = EntityField("width")
+    height = EntityField("height")
+    speed = EntityField("speed")
+
     """
     Name: __init__
-    Parameters: x (float), y (float), world (World)
+    Parameters: x (float), y (float), world (World), store (EntityStore | None)
     Returns: None
-    Purpose: Represents the player-controlled character.
-    """
-    def __init__(self, x, y, world):
-        self.x = x
-        self.y = y
-        self.width = 24
-        self.height = 24
-        self.speed = 3
+    Purpose: Represents the player-controlled character. Its movement state lives in a slot of the store.
+    """
+    def __init__(self, x, y, world, store=None):
+        self.store = store if store is not None else EntityStore(world, TILE_SIZE)
+        self.index = self.store.add(x, y, 24, 24, 3, COLLIDES)
         self.color = RED
         self.world = world
 
@@ -187,127 +276,261 @@ class Player:
     Purpose: Checks collision and terrain passability for movement.
     """
     def can_move_to(self, new_x, new_y):
-        if new_x < 0 or new_x + self.width > WORLD_WIDTH * TILE_SIZE:
-            return False
-        if new_y < 0 or new_y + self.height > WORLD_HEIGHT * TILE_SIZE:
-            return False
-
-        corners = [
-            (new_x, new_y),
-            (new_x + self.width - 1, new_y),
-            (new_x, new_y + self.height - 1),
-            (new_x + self.width - 1, new_y + self.height - 1)
-        ]
-
-        for cx, cy in corners:
-            tile_x = cx // TILE_SIZE
-            tile_y = cy // TILE_SIZE
-            if not self.world.is_passable(self.world.tile_map[tile_y][tile_x]):
-                return False
+        return self.store.is_clear(new_x, new_y, self.width, self.height)
 
-        return True
+    """
+    Name: steer
+    Parameters: dx (int), dy (int)
+    Returns: None
+    Purpose: Sets the direction the player moves in when the store next steps.
+    """
+    def steer(self, dx, dy):
+        self.store.vx[self.index] = dx * self.speed
+        self.store.vy[self.index] = dy * self.speed
 
     """
     Name: move
     Parameters: dx (int), dy (int)
     Returns: None
-    Purpose: Moves the player while respecting collisions.
+    Purpose: Moves the player straight away while respecting collisions. The game loop steers instead, so
+             everyone moves in one batch.
     """
     def move(self, dx, dy):
-        new_x = self.x + dx * self.speed
-        new_y = self.y + dy * self.speed
+        self.steer(dx, dy)
+        self.store.step_entity(self.index)
+        self.steer(0, 0)
 
-        if self.can_move_to(new_x, self.y):
-            self.x = new_x
-        if self.can_move_to(self.x, new_y):
-            self.y = new_y
+    """
+    Name: render_position
+    Parameters: alpha (float): How far between the last two ticks to draw, from 0 to 1
+    Returns: tuple[float, float]
+    Purpose: Returns where to draw the player between simulation ticks.
+    """
+    def render_position(self, alpha=1.0):
+        return self.store.render_position(self.index, alpha)
 
     """
     Name: draw
-    Parameters: screen (pygame.Surface), camera (Camera)
+    Parameters: screen (pygame.Surface), camera (Camera), alpha (float)
     Returns: None
-    Purpose: Renders the player relative to the camera.
+    Purpose: Renders the player relative to the camera, interpolated between simulation ticks.
     """
-    def draw(self, screen, camera):
-        screen_x = self.x - camera.x
-        screen_y = self.y - camera.y
-        pygame.draw.rect(screen, self.color, (screen_x, screen_y, self.width, self.height))
+    def draw(self, screen, camera, alpha=1.0):
+        x, y = self.render_position(alpha)
+        pygame.draw.rect(screen, self.color, (x - camera.x, y - camera.y, self.width, self.height))
 
 
 class Follower:
+    x = EntityField("x")
+    y = EntityField("y")
+    width = EntityField("width")
+    height = EntityField("height")
+    speed = EntityField("speed")
+
     """
     Name: __init__
-    Parameters: x (float), y (float), world (World)
+    Parameters: x (float), y (float), world (World), store (EntityStore | None)
     Returns: None
-    Purpose: Represents an AI-controlled follower using pathfinding.
-    """
-    def __init__(self, x, y, world):
-        self.x = x
-        self.y = y
-        self.width = 24
-        self.height = 24
-        self.speed = 5
+    Purpose: Represents an AI-controlled follower using pathfinding. Its movement state lives in a slot of the store.
+    """
+    def __init__(self, x, y, world, store=None):
+        self.store = store if store is not None else EntityStore(world, TILE_SIZE)
+        self.index = self.store.add(x, y, 24, 24, 5, FOLLOWS_PATH)
         self.color = BLUE
         self.world = world
-        self.path = []
-        self.target_index = 0
+        self.path_algorithm = ALGORITHM_INCREMENTAL  # Repeated chases reuse one search tree (ALGORITHM_JPS plans from scratch)
+        self.planner = None  # IncrementalPathfinder kept between scheduled searches in incremental mode
 
     """
-    Name: update_path
-    Parameters: target_x (float), target_y (float)
-    Returns: None
-    Purpose: Recalculates the path to a target position.
+    Name: path
+    Parameters: None
+    Returns: list[tuple[int, int]]
+    Purpose: The tiles the follower is walking; assigning one starts it from its first waypoint.
     """
-    def update_path(self, target_x, target_y):
-        grid = [
-            [0 if self.world.is_passable(self.world.tile_map[y][x]) else 1
-             for x in range(self.world.width)]
-            for y in range(self.world.height)
-        ]
+    @property
+    def path(self):
+        return self.store.paths[self.index]
+
+    @path.setter
+    def path(self, new_path):
+        self.store.set_path(self.index, new_path)
+
+    """
+    Name: target_index
+    Parameters: None
+    Returns: int
+    Purpose: Index of the waypoint the follower is walking to.
+    """
+    @property
+    def target_index(self):
+        return self.store.path_cursor[self.index]
+
+    @target_index.setter
+    def target_index(self, cursor):
+        self.store.set_cursor(self.index, cursor)
 
-        pathfinder = Pathfinder(grid)
+    """
+    Name: search_path
+    Parameters: pathfinder (Pathfinder), start (tuple[int, int]), end (tuple[int, int])
+    Returns: Generator[None, None, list[tuple[int, int]] | None]
+    Purpose: Search strategy handed to the path scheduler in incremental mode. Resumes the follower's D* Lite tree,
+             starting a new one whenever the scheduler's grid has been replaced.
+    """
+    def search_path(self, pathfinder, start, end):
+        if self.planner is None or self.planner.pathfinder is not pathfinder:
+            self.planner = IncrementalPathfinder(None, pathfinder)
+        return self.planner.iter_find_path(start, end)
+
+    """
+    Name: request_path
+    Parameters: scheduler (PathRequestScheduler), target_x (float), target_y (float)
+    Returns: None
+    Purpose: Queues a path to the target. The follower keeps its current path until the new one arrives.
+    """
+    def request_path(self, scheduler, target_x, target_y):
         start = (int(self.x) // TILE_SIZE, int(self.y) // TILE_SIZE)
         end = (int(target_x) // TILE_SIZE, int(target_y) // TILE_SIZE)
+        search = self.search_path if self.path_algorithm == ALGORITHM_INCREMENTAL else None
+        scheduler.request(id(self), start, end, callback=self.set_path, search=search)
 
-        new_path = pathfinder.find_path(start, end)
+    """
+    Name: set_path
+    Parameters: new_path (list[tuple[int, int]] | None)
+    Returns: None
+    Purpose: Switches to a newly found path, ignoring failed searches.
+    """
+    def set_path(self, new_path):
         if new_path:
             self.path = new_path
             self.target_index = 0
 
+    """
+    Name: follow_flow_field
+    Parameters: flow_field (FlowField)
+    Returns: None
+    Purpose: Reads the next step from a flow field shared by every agent chasing the same target.
+    """
+    def follow_flow_field(self, flow_field):
+        tile = (int(self.x) // TILE_SIZE, int(self.y) // TILE_SIZE)
+        next_step = flow_field.get_next_step(*tile)
+        if next_step and (not self.path or self.path[-1] != next_step):
+            self.path = [next_step]
+            self.target_index = 0
+
     """
     Name: move_along_path
     Parameters: None
     Returns: None
-    Purpose: Moves the follower toward the next path node.
+    Purpose: Moves the follower toward the next path node. The game loop moves every entity at once with
+             EntityStore.step instead.
     """
     def move_along_path(self):
-        if not self.path or self.target_index >= len(self.path):
-            return
+        self.store.step_entity(self.index)
 
-        tx, ty = self.path[self.target_index]
-        target_px = tx * TILE_SIZE + TILE_SIZE // 2
-        target_py = ty * TILE_SIZE + TILE_SIZE // 2
+    """
+    Name: render_position
+    Parameters: alpha (float): How far between the last two ticks to draw, from 0 to 1
+    Returns: tuple[float, float]
+    Purpose: Returns where to draw the follower between simulation ticks.
+    """
+    def render_position(self, alpha=1.0):
+        return self.store.render_position(self.index, alpha)
 
-        dx = target_px - self.x
-        dy = target_py - self.y
-        dist = max(1, (dx ** 2 + dy ** 2) ** 0.5)
+    """
+    Name: draw
+    Parameters: screen (pygame.Surface), camera (Camera), alpha (float)
+    Returns: None
+    Purpose: Renders the follower relative to the camera, interpolated between simulation ticks.
+    """
+    def draw(self, screen, camera, alpha=1.0):
+        x, y = self.render_position(alpha)
+        pygame.draw.rect(screen, self.color, (x - camera.x, y - camera.y, self.width, self.height))
 
-        self.x += self.speed * dx / dist
-        self.y += self.speed * dy / dist
 
-        if abs(dx) < 2 and abs(dy) < 2:
-            self.target_index += 1
+class GameSimulation:
+    """
+    Name: __init__
+    Parameters: world (World), path_budget_ms (float): Time-sliced pathfinding allowed per tick
+    Returns: None
+    Purpose: Owns the world, its entities and their path requests, and advances them in fixed-length ticks that do
+             not depend on rendering, so the game runs at the same speed on slow frames and can run headless.
+    """
+    def __init__(self, world, path_budget_ms=PATH_FRAME_BUDGET_MS):
+        self.world = world
+        self.entities = EntityStore(world, TILE_SIZE)
+        start_x = world.width * TILE_SIZE // 2
+        start_y = world.height * TILE_SIZE // 2
+        self.player = Player(start_x, start_y, world, self.entities)
+        self.follower = Follower(start_x + 50, start_y + 50, world, self.entities)
+        self.path_scheduler = PathRequestScheduler(Pathfinder(world.build_passability_grid()))
+        self.path_budget_ms = path_budget_ms  # math.inf finishes searches within their tick, for repeatable runs
+        self.tick_count = 0
+        self.last_repath_tick = -REPATH_INTERVAL_TICKS
+        self.input = (0, 0)  # Player direction applied on every tick until changed
 
     """
-    Name: draw
-    Parameters: screen (pygame.Surface), camera (Camera)
+    Name: set_input
+    Parameters: dx (int), dy (int)
+    Returns: None
+    Purpose: Sets the direction the player moves in.
+    """
+    def set_input(self, dx, dy):
+        self.input = (dx, dy)
+
+    """
+    Name: tick
+    Parameters: None
+    Returns: None
+    Purpose: Advances the game by one tick: player input, path requests and every entity's movement.
+    """
+    def tick(self):
+        self.player.steer(*self.input)
+        with profiler.stage("pathfinding"):
+            if self.tick_count - self.last_repath_tick >= REPATH_INTERVAL_TICKS:
+                self.follower.request_path(self.path_scheduler, self.player.x, self.player.y)
+                self.last_repath_tick = self.tick_count
+            self.path_scheduler.update(self.path_budget_ms)
+        with profiler.stage("movement"):
+            self.entities.step()  # Moves the player and every follower in one pass
+        self.tick_count += 1
+
+    """
+    Name: apply_load
+    Parameters: state (dict | None), prepared (tuple[World, Pathfinder | None] | Exception)
+    Returns: None
+    Purpose: SaveManager.load callback. Switches to the loaded world and restores every entity.
+    """
+    def apply_load(self, state, prepared):
+        if state is None:
+            print("No save file found!" if isinstance(prepared, FileNotFoundError) else f"Load failed: {prepared}")
+            return
+        world, pathfinder = prepared
+        if world is self.world and world.apply_tile_changes(state["tiles"]):
+            pathfinder = Pathfinder(world.build_passability_grid())
+        if pathfinder is not None:
+            self.path_scheduler.set_pathfinder(pathfinder)
+            self.follower.planner = None  # Its search tree was built on the old grid
+        self.world = world
+        self.entities.set_world(world)
+        self.player.world = world
+        self.follower.world = world
+        for entity in state["entities"]:
+            if entity["kind"] == "player":
+                self.player.x, self.player.y = entity["x"], entity["y"]
+            elif entity["kind"] == "follower":
+                self.follower.x, self.follower.y = entity["x"], entity["y"]
+                self.follower.path = [tuple(point) for point in entity.get("path", [])]
+                self.follower.target_index = entity.get("target_index", 0)
+        self.entities.snap()
+
+    """
+    Name: shutdown
+    Parameters: None
     Returns: None
-    Purpose: Renders the follower relative to the camera.
+    Purpose: Stops the path worker threads.
     """
-    def draw(self, screen, camera):
-        screen_x = self.x - camera.x
-        screen_y = self.y - camera.y
-        pygame.draw.rect(screen, self.color, (screen_x, screen_y, self.width, self.height))
+    def shutdown(self):
+        self.path_scheduler.shutdown()
 
 
 """
@@ -332,66 +555,230 @@ def draw_world(screen, world, camera):
 
 
 """
-Name: main
-Parameters: None
+Name: build_tile_walls
+Parameters: world (World), camera (Camera)
+Returns: list[Wall]
+Purpose: Builds the shadow-casting edges of every light-blocking tile on or just around the screen, in screen space.
+"""
+def build_tile_walls(world, camera):
+    start_x = max(0, camera.x // TILE_SIZE - LIGHT_WALL_MARGIN)
+    end_x = min(world.width, (camera.x + camera.width) // TILE_SIZE + 1 + LIGHT_WALL_MARGIN)
+    start_y = max(0, camera.y // TILE_SIZE - LIGHT_WALL_MARGIN)
+    end_y = min(world.height, (camera.y + camera.height) // TILE_SIZE + 1 + LIGHT_WALL_MARGIN)
+
+    walls = []
+    for y in range(start_y, end_y):
+        for x in range(start_x, end_x):
+            if world.tile_map[y][x] in LIGHT_BLOCKING_TILES:
+                wx = x * TILE_SIZE - camera.x
+                wy = y * TILE_SIZE - camera.y
+                walls.extend([
+                    Wall(wx, wy, wx + TILE_SIZE, wy),
+                    Wall(wx + TILE_SIZE, wy, wx + TILE_SIZE, wy + TILE_SIZE),
+                    Wall(wx + TILE_SIZE, wy + TILE_SIZE, wx, wy + TILE_SIZE),
+                    Wall(wx, wy + TILE_SIZE, wx, wy)
+                ])
+    return walls
+
+
+"""
+Name: draw_lighting
+Parameters: screen (pygame.Surface), world (World), camera (Camera), entities (list[tuple[float, float, int]]):
+            (x, y, light radius) of each lit entity's centre in world space
 Returns: None
-Purpose: Entry point that initializes and runs the game loop.
+Purpose: Darkens the screen outside the entities' lights, with forest and mountain tiles casting shadows.
 """
-def main():
+def draw_lighting(screen, world, camera, entities):
+    with profiler.stage("walls"):
+        walls = build_tile_walls(world, camera)
+    lights = [Light(x - camera.x, y - camera.y, radius, WHITE) for x, y, radius in entities]
+    render_lightmap(screen, lights, walls, step=LIGHT_STEP)  # Profiled as "lighting"
+
+
+"""
+Name: read_keyboard
+Parameters: None
+Returns: tuple[int, int]
+Purpose: Returns the direction the arrow or WASD keys are steering the player in.
+"""
+def read_keyboard():
+    keys = pygame.key.get_pressed()
+    dx = dy = 0
+    if keys[pygame.K_LEFT] or keys[pygame.K_a]: dx = -1
+    if keys[pygame.K_RIGHT] or keys[pygame.K_d]: dx = 1
+    if keys[pygame.K_UP] or keys[pygame.K_w]: dy = -1
+    if keys[pygame.K_DOWN] or keys[pygame.K_s]: dy = 1
+    return dx, dy
+
+
+"""
+Name: run_headless
+Parameters: seed (int), ticks (int), world_size (int), input_seed (int)
+Returns: dict
+Purpose: Runs the simulation without a display as fast as possible, steering the player with seeded random input.
+         Searches finish within their tick, so the same arguments always give the same final state. Each tick is
+         one profiler frame, and the results include the stage timings when profiling is on.
+"""
+def run_headless(seed, ticks=HEADLESS_TICKS, world_size=WORLD_WIDTH, input_seed=0):
+    generate_start = time.perf_counter()
+    simulation = GameSimulation(World(world_size, world_size, seed), path_budget_ms=math.inf)
+    setup_seconds = time.perf_counter() - generate_start
+    rng = random.Random(input_seed)
+
+    start = time.perf_counter()
+    for tick in range(ticks):
+        profiler.begin_frame()
+        if tick % HEADLESS_INPUT_TICKS == 0:
+            simulation.set_input(rng.choice((-1, 0, 1)), rng.choice((-1, 0, 1)))
+        simulation.tick()
+        profiler.end_frame()
+    elapsed = time.perf_counter() - start
+    simulation.shutdown()
+    results = {
+        "seed": seed,
+        "world_size": world_size,
+        "ticks": ticks,
+        "setup_seconds": setup_seconds,
+        "seconds": elapsed,
+        "ticks_per_s": ticks / elapsed if elapsed else 0.0,
+        "game_seconds": ticks / SIM_TICK_RATE,
+        "player": [simulation.player.x, simulation.player.y],
+        "follower": [simulation.follower.x, simulation.follower.y]
+    }
+    if profiler.enabled:
+        results["profile"] = profiler.summary()
+    return results
+
+
+"""
+Name: run_window
+Parameters: seed (int), lighting (bool), script (object | None): Scripted input with start(simulation) and
+            next_input(simulation) -> (dx, dy) | None, fps (int): Frame cap, 0 for none
+Returns: int
+Purpose: Runs the game in a window. Ticks run at SIM_TICK_RATE and each frame draws entities between the last two.
+         With a script, input comes from it instead of the keyboard, exactly one tick runs per frame and the game
+         ends when the script does. F3 shows the profiler overlay and F4 records a profiler trace. Returns the
+         number of frames drawn.
+"""
+def run_window(seed, lighting=False, script=None, fps=FPS):
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("World with Follower Light & Save/Load")
     clock = pygame.time.Clock()
 
-    world_seed = random.randint(1, 1000000)
-    world = World(WORLD_WIDTH, WORLD_HEIGHT, world_seed)
-
-    start_x = WORLD_WIDTH * TILE_SIZE // 2
-    start_y = WORLD_HEIGHT * TILE_SIZE // 2
-
-    player = Player(start_x, start_y, world)
-    follower = Follower(start_x + 50, start_y + 50, world)
+    world = World(WORLD_WIDTH, WORLD_HEIGHT, seed)
+    world_cache = WorldCache(lambda world_seed: World(WORLD_WIDTH, WORLD_HEIGHT, world_seed))
+    world_cache.add(world)
+    save_manager = SaveManager()
+    simulation = GameSimulation(world)
+    player, follower = simulation.player, simulation.follower
     camera = Camera(SCREEN_WIDTH, SCREEN_HEIGHT)
+    timestep = FixedTimestep(SIM_TICK_RATE) if script is None else LockstepTimestep()
+    overlay = ProfilerOverlay(profiler)
+    if script is not None:
+        script.start(simulation)
 
+    frames = 0
     running = True
     while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_k:
-                    save_game(player, follower, world_seed)
-                elif event.key == pygame.K_l:
-                    data = load_game()
-                    if data:
-                        world_seed = data["seed"]
-                        world = World(WORLD_WIDTH, WORLD_HEIGHT, world_seed)
-                        player.x = data["player"]["x"]
-                        player.y = data["player"]["y"]
-                        follower.x = data["follower"]["x"]
-                        follower.y = data["follower"]["y"]
-
-        keys = pygame.key.get_pressed()
-        dx = dy = 0
-        if keys[pygame.K_LEFT] or keys[pygame.K_a]: dx = -1
-        if keys[pygame.K_RIGHT] or keys[pygame.K_d]: dx = 1
-        if keys[pygame.K_UP] or keys[pygame.K_w]: dy = -1
-        if keys[pygame.K_DOWN] or keys[pygame.K_s]: dy = 1
-
-        player.move(dx, dy)
-        camera.update(player.x + player.width // 2, player.y + player.height // 2)
-
-        if pygame.time.get_ticks() % 30 == 0:
-            follower.update_path(player.x, player.y)
-        follower.move_along_path()
-
-        screen.fill(BLACK)
-        draw_world(screen, world, camera)
-        player.draw(screen, camera)
-        follower.draw(screen, camera)
-
-        pygame.display.flip()
-        clock.tick(FPS)
+        profiler.begin_frame()
+        with profiler.stage("events"):
+            for event in pygame.event.get():
+                if overlay.handle_event(event):
+                    continue
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_k:
+                        save_game(save_manager, simulation.world, player, follower)
+                    elif event.key == pygame.K_l:
+                        # Reading the save and any world generation happen off the main thread; apply_load runs
+                        # from save_manager.update() once they are done
+                        current_world = simulation.world
+                        save_manager.load(simulation.apply_load,
+                                          lambda state: prepare_load(world_cache, current_world, state))
+
+        direction = read_keyboard() if script is None else script.next_input(simulation)
+        if direction is None:  # Script finished; this frame is left unmeasured
+            break
+        simulation.set_input(*direction)
+        with profiler.stage("save"):
+            save_manager.update()
+        with profiler.stage("simulation"):
+            for _ in range(timestep.advance()):
+                simulation.tick()
+
+        alpha = timestep.alpha()
+        player_x, player_y = player.render_position(alpha)
+        follower_x, follower_y = follower.render_position(alpha)
+        camera.update(player_x + player.width // 2, player_y + player.height // 2)
+
+        with profiler.stage("terrain"):
+            screen.fill(BLACK)
+            draw_world(screen, simulation.world, camera)
+        if lighting:
+            draw_lighting(screen, simulation.world, camera, [
+                (player_x + player.width / 2, player_y + player.height / 2, PLAYER_LIGHT_RADIUS),
+                (follower_x + follower.width / 2, follower_y + follower.height / 2, FOLLOWER_LIGHT_RADIUS)
+            ])
+        with profiler.stage("entities"):
+            player.draw(screen, camera, alpha)
+            follower.draw(screen, camera, alpha)
+        with profiler.stage("overlay"):
+            overlay.draw(screen)
+
+        with profiler.stage("present"):
+            pygame.display.flip()
+        with profiler.stage("idle"):  # Waiting for the frame cap
+            clock.tick(fps)
+        profiler.end_frame()
+        frames += 1
+
+    simulation.shutdown()
+    save_manager.shutdown()
+    return frames
 
+
+"""
+Name: main
+Parameters: None
+Returns: None
+Purpose: Entry point that runs the game in a window, or the simulation alone with --headless.
+"""
+def main():
+    parser = argparse.ArgumentParser(description="Single-player world with a pathfinding follower.")
+    parser.add_argument("--seed", type=int, help="World seed, random if not given")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run the simulation without a display as fast as possible and print timings")
+    parser.add_argument("--ticks", type=int, default=HEADLESS_TICKS, help="Ticks to run with --headless")
+    parser.add_argument("--world-size", type=int, default=WORLD_WIDTH, help="World width and height with --headless")
+    parser.add_argument("--input-seed", type=int, default=0, help="Seed for the scripted input with --headless")
+    parser.add_argument("--json", help="With --headless, also write the results to this JSON file")
+    parser.add_argument("--lighting", action="store_true", help="Light the world around the player and follower")
+    parser.add_argument("--trace", help="Profile every frame and write a Chrome trace (chrome://tracing, Perfetto) "
+                                        "to this file on exit")
+    args = parser.parse_args()
+    seed = args.seed if args.seed is not None else random.randint(1, 1000000)
+    if args.trace:
+        profiler.start_trace()
+
+    if args.headless:
+        results = run_headless(seed, args.ticks, args.world_size, args.input_seed)
+        print(f"{results['ticks']} ticks ({results['game_seconds']:.0f}s of game time) in {results['seconds']:.2f}s: "
+              f"{results['ticks_per_s']:.0f} ticks/s, world setup {results['setup_seconds']:.2f}s")
+        print(f"player {results['player']}, follower {results['follower']}")
+        for name, stage in results.get("profile", {}).get("stages", {}).items():
+            print(f"  {name:24} mean {stage['mean_ms']:7.3f} ms   max {stage['max_ms']:7.3f} ms")
+        if args.trace:
+            print(f"Profiler trace saved to {profiler.stop_trace(args.trace)}")
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+        pygame.quit()
+        return
+
+    run_window(seed, args.lighting)
+    if args.trace:
+        print(f"Profiler trace saved to {profiler.stop_trace(args.trace)}")
     pygame.quit()
     sys.exit()
 
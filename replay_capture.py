@@ -0,0 +1,356 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from server import PORT, TICK_RATE
+from loadtest_server import start_local_server, read_thread_time
+from Protocol import (PROTOCOL_JSON, PROTOCOL_BINARY, READ_BUFFER_SIZE, FRAME_HEADER, SEQUENCE, OP_ACK, FrameReader,
+                      choose_protocol)
+from PacketCapture import EVENT_CONNECT, EVENT_DATA, EVENT_DISCONNECT, EVENT_SENT, read_capture
+
+REPLAY_MODES = ["fast", "realtime"]
+FAST_REPLAY_SPEEDUP = 10  # Fast replays run this many times faster, with the in-process server ticking as much faster
+SETUP_TIMEOUT = 10.0  # Seconds to wait for a replayed connection's SETUP packet
+SETTLE_TIME = 0.5  # Seconds of outbound traffic still collected after the last recorded event
+DRAIN_QUIET_TIME = 0.2  # A connection counts as drained once the server has sent nothing for this long
+DRAIN_TIMEOUT = 5.0  # Longest wait for one connection to drain
+COMPARED_RESULTS = ["replay_seconds", "inbound_bytes", "outbound_bytes", "outbound_packets", "server_cpu_percent",
+                    "tick_p50_ms", "tick_p99_ms", "fanout_mean_ms"]
+
+
+class ReplayConnection:
+    """
+    Name: __init__
+    Parameters: connection_id (int): Connection id in the capture
+    Returns: None
+    Purpose: One recorded client, replaying its inbound bytes and counting what the server sends back.
+    """
+    def __init__(self, connection_id):
+        self.connection_id = connection_id
+        self.reader = None
+        self.writer = None
+        self.frames = FrameReader()
+        self.ready = asyncio.Event()  # Set once SETUP has arrived
+        self.read_task = None
+        self.connected_at = None
+        self.setup_ms = None  # Time from connecting to the first packet back
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.packets_received = 0
+        self.commands = Counter()
+        self.outgoing = bytearray()  # Recorded bytes held back until the packet they end in is complete
+        self.outgoing_protocol = PROTOCOL_JSON  # Protocol the recorded client was sending in
+        self.last_snapshot = 0  # Sequence of the newest SNAPSHOT received, which replayed ACKs confirm
+        self.acks_dropped = 0  # Recorded ACKs sent before this connection had received any snapshot
+
+    """
+    Name: connect
+    Parameters: host (str), port (int)
+    Returns: None
+    Purpose: Opens the connection and waits for SETUP, so the server hands out player ids in the recorded order.
+    """
+    async def connect(self, host, port):
+        self.connected_at = time.monotonic()
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.read_task = asyncio.create_task(self.read_loop())
+        await asyncio.wait_for(self.ready.wait(), SETUP_TIMEOUT)
+
+    """
+    Name: read_loop
+    Parameters: None
+    Returns: None
+    Purpose: Counts everything the server sends, following its switch to the binary protocol.
+    """
+    async def read_loop(self):
+        try:
+            while not self.frames.eof:
+                data = await self.reader.read(READ_BUFFER_SIZE)
+                self.bytes_received += len(data)
+                self.frames.feed(data)
+                for packet in self.frames.packets():
+                    if self.setup_ms is None:
+                        self.setup_ms = (time.monotonic() - self.connected_at) * 1000
+                        self.ready.set()
+                    self.packets_received += 1
+                    self.commands[packet["command"]] += 1
+                    if packet["command"] == "PROTOCOL":
+                        self.frames.protocol = packet["data"]["Name"]
+                    elif packet["command"] == "SNAPSHOT":
+                        self.last_snapshot = packet["data"]["Sequence"]
+        except ConnectionError:
+            pass
+
+    """
+    Name: send
+    Parameters: data (bytes)
+    Returns: None
+    Purpose: Sends recorded bytes, keeping their original packet boundaries within the read. ACKs are rewritten
+             first, and a packet split across reads is sent once its last part arrives.
+    """
+    async def send(self, data):
+        self.outgoing += data
+        ready = self.rewrite_acks()
+        if ready:
+            self.writer.write(ready)
+            self.bytes_sent += len(ready)
+            await self.writer.drain()
+
+    """
+    Name: rewrite_acks
+    Parameters: None
+    Returns: bytes
+    Purpose: Takes every complete packet off the held-back recorded bytes. Each binary ACK is set to the last
+             snapshot this connection received, since the recorded sequence numbers belong to the old session.
+             ACKs from before any snapshot arrived are dropped. ACK 0, asking for a full snapshot, is kept.
+    """
+    def rewrite_acks(self):
+        buffer = self.outgoing
+        ready = bytearray()
+        offset = 0
+        while offset < len(buffer):
+            if self.outgoing_protocol == PROTOCOL_BINARY:
+                if len(buffer) - offset < FRAME_HEADER.size:
+                    break
+                length, opcode = FRAME_HEADER.unpack_from(buffer, offset)
+                end = offset + FRAME_HEADER.size + length
+                if end > len(buffer):
+                    break
+                if opcode == OP_ACK and length == SEQUENCE.size and \
+                        SEQUENCE.unpack_from(buffer, offset + FRAME_HEADER.size)[0] != 0:
+                    if not self.last_snapshot:
+                        self.acks_dropped += 1
+                        offset = end
+                        continue
+                    SEQUENCE.pack_into(buffer, offset + FRAME_HEADER.size, self.last_snapshot)
+            else:
+                newline = buffer.find(b"\n", offset)
+                if newline < 0:
+                    break
+                end = newline + 1
+                try:
+                    packet = json.loads(buffer[offset:newline])
+                except ValueError:
+                    packet = None  # Sent on as recorded; the server decides what to make of it
+                if isinstance(packet, dict) and packet.get("command") == "PROTOCOL" and \
+                        isinstance(packet.get("data"), dict):
+                    # The server answers with the same choice, and everything after the request follows it
+                    self.outgoing_protocol = choose_protocol(packet["data"])
+            ready += buffer[offset:end]
+            offset = end
+        del buffer[:offset]
+        return bytes(ready)
+
+    """
+    Name: drain
+    Parameters: quiet_time (float), timeout (float)
+    Returns: None
+    Purpose: Waits until the server has stopped sending, so replies to everything replayed are counted.
+    """
+    async def drain(self, quiet_time=DRAIN_QUIET_TIME, timeout=DRAIN_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not self.read_task.done():
+            received = self.bytes_received
+            await asyncio.sleep(quiet_time)
+            if self.bytes_received == received:
+                return
+
+    """
+    Name: close
+    Parameters: None
+    Returns: None
+    Purpose: Disconnects, as the recorded client did.
+    """
+    async def close(self):
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.close()
+        if self.read_task is not None:
+            await asyncio.gather(self.read_task, return_exceptions=True)
+
+
+"""
+Name: summarise_recorded
+Parameters: records (list[tuple])
+Returns: dict
+Purpose: Totals the traffic of the recorded session, for comparison with the replay.
+"""
+def summarise_recorded(records):
+    connections = {}
+    for timestamp, connection_id, event, data, length in records:
+        counts = connections.setdefault(connection_id, {"inbound_bytes": 0, "outbound_bytes": 0, "outbound_writes": 0})
+        if event == EVENT_DATA:
+            counts["inbound_bytes"] += length
+        elif event == EVENT_SENT:
+            counts["outbound_bytes"] += length
+            counts["outbound_writes"] += 1
+    return {
+        "seconds": records[-1][0] - records[0][0] if records else 0.0,
+        "connections": len(connections),
+        "inbound_bytes": sum(counts["inbound_bytes"] for counts in connections.values()),
+        "outbound_bytes": sum(counts["outbound_bytes"] for counts in connections.values()),
+        "outbound_writes": sum(counts["outbound_writes"] for counts in connections.values()),
+        "per_connection": connections
+    }
+
+
+"""
+Name: run_replay
+Parameters: path (str), mode (str), host (str | None), port (int), tick_rate (float)
+Returns: dict
+Purpose: Replays a capture against a server and returns the traffic and timings it produced. Without a host an
+         in-process server is started with the recorded world seed, so its tick times can be reported too.
+         Fast replays keep the recorded timing FAST_REPLAY_SPEEDUP times faster, with the in-process server ticking
+         as much faster, so every tick sees the same traffic as in the recording. A running server's tick rate
+         cannot be changed, so fast replays against one are sent unpaced and their outbound traffic is not
+         comparable. Those hold recorded disconnects until the end, since closing straight after the last send
+         would drop the replies still on their way. Every connection is drained before the traffic is totalled.
+"""
+async def run_replay(path, mode, host=None, port=PORT, tick_rate=TICK_RATE):
+    header, records = read_capture(path)
+    if mode == "realtime":
+        speedup = 1
+    else:
+        speedup = FAST_REPLAY_SPEEDUP if host is None else None  # None: unpaced
+    server_loop = None
+    if host is None:
+        server, server_loop = start_local_server(tick_rate * speedup, header["world_seed"])
+        host, port = server.host, server.port
+
+    connections = {}  # connection id in the capture -> ReplayConnection
+    wall_start = time.monotonic()
+    server_cpu_start = asyncio.run_coroutine_threadsafe(read_thread_time(), server_loop).result() \
+        if server_loop else None
+    first_time = records[0][0] if records else 0.0
+    for timestamp, connection_id, event, data, length in records:
+        if speedup is not None:
+            delay = wall_start + (timestamp - first_time) / speedup - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        connection = connections.get(connection_id)
+        if event == EVENT_CONNECT:
+            connection = ReplayConnection(connection_id)
+            connections[connection_id] = connection
+            await connection.connect(host, port)
+        elif connection is None:
+            continue  # Connected before recording started, or a SENT record with nothing to replay
+        elif event == EVENT_DATA:
+            await connection.send(data)
+        elif event == EVENT_DISCONNECT and speedup is not None:
+            await connection.close()
+    replay_seconds = time.monotonic() - wall_start
+
+    await asyncio.sleep(SETTLE_TIME)
+    await asyncio.gather(*(connection.drain() for connection in connections.values()))
+    server_cpu = asyncio.run_coroutine_threadsafe(read_thread_time(), server_loop).result() - server_cpu_start \
+        if server_loop else None
+    await asyncio.gather(*(connection.close() for connection in connections.values()))
+    metrics = server.metrics if server_loop else None
+    if server_loop:
+        asyncio.run_coroutine_threadsafe(server.shutdown(), server_loop).result()
+        server_loop.call_soon_threadsafe(server_loop.stop)
+
+    commands = Counter()
+    for connection in connections.values():
+        commands.update(connection.commands)
+    setup_times = [connection.setup_ms for connection in connections.values() if connection.setup_ms is not None]
+    elapsed = replay_seconds + SETTLE_TIME
+    return {
+        "capture": path,
+        "mode": mode,
+        "speedup": speedup,
+        "events": len(records),
+        "connections": len(connections),
+        "replay_seconds": replay_seconds,
+        "inbound_bytes": sum(connection.bytes_sent for connection in connections.values()),
+        "outbound_bytes": sum(connection.bytes_received for connection in connections.values()),
+        "outbound_packets": sum(connection.packets_received for connection in connections.values()),
+        "outbound_commands": dict(commands),
+        "setup_max_ms": max(setup_times, default=0.0),
+        "acks_dropped": sum(connection.acks_dropped for connection in connections.values()),
+        "server_cpu_percent": server_cpu / elapsed * 100 if server_cpu is not None else None,
+        "tick_p50_ms": metrics.tick_times.percentile(0.5) if metrics else None,
+        "tick_p99_ms": metrics.tick_times.percentile(0.99) if metrics else None,
+        "fanout_mean_ms": metrics.fanout_times.to_dict()["mean_ms"] if metrics else None,
+        "recorded": summarise_recorded(records),
+        "per_connection": {
+            str(connection.connection_id): {
+                "inbound_bytes": connection.bytes_sent,
+                "outbound_bytes": connection.bytes_received,
+                "outbound_packets": connection.packets_received,
+                "setup_ms": connection.setup_ms
+            }
+            for connection in connections.values()
+        }
+    }
+
+
+"""
+Name: print_results
+Parameters: results (dict), baseline (dict | None)
+Returns: None
+Purpose: Prints a replay report, next to the recorded session and, if given, an earlier replay's results.
+"""
+def print_results(results, baseline=None):
+    recorded = results["recorded"]
+    pacing = f"at {results['speedup']}x speed" if results["speedup"] else "unpaced"
+    print(f"{results['capture']}: {results['events']} events, {results['connections']} connections, "
+          f"{results['mode']} replay {pacing}")
+    if results["speedup"] is None:
+        print("  outbound traffic is not comparable: a running server ticks at its own rate, so use realtime mode")
+    print(f"  {'':22}{'recorded':>14}{'replayed':>14}")
+    print(f"  {'seconds':22}{recorded['seconds']:14.2f}{results['replay_seconds']:14.2f}")
+    print(f"  {'inbound bytes':22}{recorded['inbound_bytes']:14}{results['inbound_bytes']:14}")
+    print(f"  {'outbound bytes':22}{recorded['outbound_bytes']:14}{results['outbound_bytes']:14}")
+    print(f"  {'outbound writes/pkts':22}{recorded['outbound_writes']:14}{results['outbound_packets']:14}")
+    print("  outbound packets: " + " ".join(f"{command}={count}"
+                                            for command, count in sorted(results["outbound_commands"].items())))
+    print(f"  slowest SETUP:   {results['setup_max_ms']:10.1f} ms")
+    if results["acks_dropped"]:
+        print(f"  ACKs dropped:    {results['acks_dropped']:10} (sent before any snapshot arrived)")
+    if results["server_cpu_percent"] is not None:
+        print(f"  server CPU:      {results['server_cpu_percent']:10.1f} %")
+        print(f"  tick ms:         p50 {results['tick_p50_ms']:.2f}  p99 {results['tick_p99_ms']:.2f}  "
+              f"fanout mean {results['fanout_mean_ms']:.3f}")
+
+    if baseline is not None:
+        print(f"  compared with {baseline['capture']} ({baseline['mode']} replay):")
+        for name in COMPARED_RESULTS:
+            before, after = baseline.get(name), results.get(name)
+            if before is None or after is None:
+                continue
+            change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+            print(f"    {name:22}{before:14.2f}{after:14.2f}{change:>10}")
+
+
+"""
+Name: main
+Parameters: None
+Returns: None
+Purpose: Command-line entry point for replaying a capture recorded with server.py --record.
+"""
+def main():
+    parser = argparse.ArgumentParser(description="Replay a server.py --record capture against a server.")
+    parser.add_argument("capture", help="Capture file written by server.py --record")
+    parser.add_argument("--mode", choices=REPLAY_MODES, default="fast",
+                        help=f"Keep the recorded timing {FAST_REPLAY_SPEEDUP}x faster, with the in-process server "
+                             f"ticking as much faster (unpaced with --host), or keep it exactly")
+    parser.add_argument("--host", help="Replay against a running server instead of starting one in-process")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--tick-rate", type=float, default=TICK_RATE, help="Tick rate of the in-process server")
+    parser.add_argument("--compare", help="JSON results of an earlier replay to compare against")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_replay(args.capture, args.mode, args.host, args.port, args.tick_rate))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
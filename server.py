@@ -1,108 +1,691 @@
-import json
-import socket
-import threading
+import argparse
+import asyncio
+import math
 import random
+import signal
+import socket
+import struct
+import time
+from collections import deque
+from Protocol import (PROTOCOL_JSON, PROTOCOL_BINARY, BINARY_PROTOCOL_VERSION, READ_BUFFER_SIZE, SNAPSHOT_HISTORY,
+                      OP_SNAPSHOT, FrameReader, encode_frame, encode_packet, encode_snapshot, choose_protocol, to_fixed)
+from ServerMetrics import ServerMetrics, STATS_PORT, METRICS_LOG_INTERVAL, format_log_line, format_report
+from PacketCapture import CaptureWriter, EVENT_CONNECT, EVENT_DATA, EVENT_DISCONNECT, EVENT_SENT
+from SpatialHash import SpatialHash
 
 HOST = '127.0.0.1'
 PORT = 50000
+TICK_RATE = 20  # Snapshots sent to each client per second
+MAX_QUEUE_DEPTH = 256  # Packets waiting for one client before it is dropped
+MAX_BUFFERED_BYTES = 64 * 1024  # Unsent bytes before a client counts as falling behind
+OVER_BUDGET_TIMEOUT = 5.0  # Seconds a client may stay behind before it is disconnected
+VIEW_WIDTH = 800  # Client screen size, which the area of interest is built around
+VIEW_HEIGHT = 600
+WORLD_PIXEL_WIDTH = 1000 * 32  # Matches the client's WORLD_WIDTH * TILE_SIZE
+WORLD_PIXEL_HEIGHT = 1000 * 32
+AOI_MARGIN = 150  # Extra range around the view so players' lights are sent before they walk into view
+AOI_HYSTERESIS = 100  # Players leave only once this far outside the area, so edge walkers do not flicker
 
-clients = []
-players = {}  # player_id -> position
 world_seed = random.randint(1, 1000000)  # generate world once
 
 start_positions = [(200, 200), (500, 500), (300, 300), (400, 400), (100, 100), (600, 600), (700, 700), (800, 800)]
 
-"""
-Name: send_packet
-Parameters: conn (socket): Client socket, packet (dict): Data packet
-Returns: None
-Purpose: Sends a JSON packet to a single client.
-"""
-def send_packet(conn, packet):
-    try:
-        conn.send((json.dumps(packet) + "\n").encode())
-    except:
-        if conn in clients:
-            clients.remove(conn)
 
 """
-Name: broadcast
-Parameters: packet (dict): Data packet, skip_conn (socket | None): Connection to skip
-Returns: None
-Purpose: Sends a packet to all connected clients except one.
+Name: view_center
+Parameters: pos (dict): Player position
+Returns: tuple[float, float]
+Purpose: Returns the centre of the client's camera, which is clamped at the world edges like Camera.update.
 """
-def broadcast(packet, skip_conn=None):
-    for c in list(clients):
-        if c != skip_conn:
-            send_packet(c, packet)
+def view_center(pos):
+    x = max(VIEW_WIDTH / 2, min(pos["x"], WORLD_PIXEL_WIDTH - VIEW_WIDTH / 2))
+    y = max(VIEW_HEIGHT / 2, min(pos["y"], WORLD_PIXEL_HEIGHT - VIEW_HEIGHT / 2))
+    return x, y
+
+
+class ClientConnection:
+    """
+    Name: __init__
+    Parameters: player_id (int), writer (asyncio.StreamWriter), metrics (ServerMetrics), capture (CaptureWriter | None)
+    Returns: None
+    Purpose: Buffers outbound packets for one client and flushes them without blocking anyone else.
+    """
+    def __init__(self, player_id, writer, metrics, capture=None):
+        self.player_id = player_id
+        self.writer = writer
+        self.metrics = metrics
+        self.capture = capture  # Records the size of every write when the server is recording
+        self.outbound = deque()  # Encoded packets that must all be delivered, in order
+        self.pending_positions = {}  # Latest position per player not yet sent; newer updates overwrite older
+        self.wakeup = asyncio.Event()
+        self.behind_since = None  # When the client last started falling behind
+        self.closed = False
+        self.protocol = PROTOCOL_JSON  # Switched once the client negotiates the binary protocol
+        self.frames = FrameReader()  # Inbound packets from this client
+        self.legacy = True  # Never negotiated a protocol, so it does not understand ENTER/LEAVE
+        self.visible = set()  # Players this client has been told about
+        self.pending_snapshot = None  # Latest unsent snapshot for binary clients; newer ones replace it
+        self.snapshot_history = {}  # sequence -> snapshot sent, oldest first, kept as delta bases
+        self.sequence = 0  # Last snapshot sequence sent
+        self.acked_sequence = 0  # Newest snapshot the client confirmed it holds; 0 means none
+        self.handoff_to = None  # Region a sharded server is moving this client to
+        writer.transport.set_write_buffer_limits(high=MAX_BUFFERED_BYTES)
+        self.flush_task = asyncio.create_task(self.flush_loop())
+
+    """
+    Name: queue_packet
+    Parameters: packet (dict)
+    Returns: None
+    Purpose: Queues a packet that must be delivered, disconnecting the client if its queue is full.
+    """
+    def queue_packet(self, packet):
+        if self.closed:
+            return
+        if len(self.outbound) >= MAX_QUEUE_DEPTH:
+            print(f"Client {self.player_id} dropped: outbound queue full")
+            self.metrics.clients_dropped += 1
+            self.close(abort=True)
+            return
+        self.outbound.append(encode_packet(packet, self.protocol))
+        self.wakeup.set()
+
+    """
+    Name: set_protocol
+    Parameters: protocol (str)
+    Returns: None
+    Purpose: Switches both directions to a newly negotiated protocol, from the next packet on.
+    """
+    def set_protocol(self, protocol):
+        self.protocol = protocol
+        self.frames.protocol = protocol
+        self.legacy = False
+
+    """
+    Name: update_interest
+    Parameters: entered (dict), left (set[int]), moved (dict), kept (dict)
+    Returns: None
+    Purpose: Queues enter/leave events and position updates for this client's area of interest. Binary clients
+             get a snapshot of every visible player instead, which is delta encoded when it is sent.
+    """
+    def update_interest(self, entered, left, moved, kept):
+        if self.protocol == PROTOCOL_BINARY:
+            self.visible -= left
+            self.visible.update(entered)
+            if entered or left or moved:
+                snapshot = {player_id: (to_fixed(pos["x"]), to_fixed(pos["y"])) for player_id, pos in kept.items()}
+                for player_id, pos in entered.items():
+                    snapshot[player_id] = (to_fixed(pos["x"]), to_fixed(pos["y"]))
+                self.queue_snapshot(snapshot)
+            return
+
+        if left:
+            self.visible -= left
+            for player_id in left:
+                self.pending_positions.pop(player_id, None)
+            if not self.legacy:
+                self.queue_packet({"command": "LEAVE", "data": sorted(left)})
+        if entered:
+            self.visible.update(entered)
+            if self.legacy:
+                moved = {**moved, **entered}  # Older clients add players from any position update
+            else:
+                self.queue_packet({"command": "ENTER", "data": entered})
+        if moved:
+            self.queue_positions(moved)
+
+    """
+    Name: queue_snapshot
+    Parameters: snapshot (dict[int, tuple[int, int]])
+    Returns: None
+    Purpose: Replaces the pending snapshot. Skipping unsent snapshots is safe because each is encoded against
+             the client's last acknowledged one, not the previous one sent.
+    """
+    def queue_snapshot(self, snapshot):
+        if self.closed:
+            return
+        self.pending_snapshot = snapshot
+        self.wakeup.set()
+
+    """
+    Name: encode_pending_snapshot
+    Parameters: None
+    Returns: bytes
+    Purpose: Encodes the pending snapshot against the last acknowledged one, or in full if the client has not
+             acknowledged one that is still in the history (after loss or reconnecting).
+    """
+    def encode_pending_snapshot(self):
+        snapshot = self.pending_snapshot
+        self.pending_snapshot = None
+        self.sequence += 1
+        base = self.snapshot_history.get(self.acked_sequence)
+        base_sequence = self.acked_sequence if base is not None else 0
+
+        self.snapshot_history[self.sequence] = snapshot
+        if len(self.snapshot_history) > SNAPSHOT_HISTORY:
+            del self.snapshot_history[next(iter(self.snapshot_history))]
+        return encode_frame(OP_SNAPSHOT, encode_snapshot(self.sequence, snapshot, base_sequence, base))
+
+    """
+    Name: acknowledge
+    Parameters: sequence (int)
+    Returns: None
+    Purpose: Records the newest snapshot the client holds. Sequence 0 means it lost its base and needs a full one.
+    """
+    def acknowledge(self, sequence):
+        if sequence == 0:
+            self.acked_sequence = 0
+            if self.pending_snapshot is None and self.snapshot_history:
+                # Resend what the client should be seeing, in full
+                self.queue_snapshot(self.snapshot_history[self.sequence])
+        elif sequence > self.acked_sequence:
+            self.acked_sequence = sequence
+
+    """
+    Name: queue_positions
+    Parameters: positions (dict)
+    Returns: None
+    Purpose: Merges position updates into the pending update, dropping any superseded positions.
+    """
+    def queue_positions(self, positions):
+        if self.closed:
+            return
+        self.pending_positions.update(positions)
+        self.wakeup.set()
+
+    """
+    Name: buffered_bytes
+    Parameters: None
+    Returns: int
+    Purpose: Returns how many bytes are written but not yet accepted by the client's socket.
+    """
+    def buffered_bytes(self):
+        return self.writer.transport.get_write_buffer_size()
+
+    """
+    Name: check_budget
+    Parameters: now (float)
+    Returns: None
+    Purpose: Disconnects the client if it has stayed over its send budget for too long.
+    """
+    def check_budget(self, now):
+        if self.closed:
+            return
+        if self.buffered_bytes() < MAX_BUFFERED_BYTES and not self.outbound:
+            self.behind_since = None
+            return
+        if self.behind_since is None:
+            self.behind_since = now
+        elif now - self.behind_since > OVER_BUDGET_TIMEOUT:
+            print(f"Client {self.player_id} dropped: over send budget for {OVER_BUDGET_TIMEOUT}s")
+            self.metrics.clients_dropped += 1
+            self.close(abort=True)
+
+    """
+    Name: flush_loop
+    Parameters: None
+    Returns: None
+    Purpose: Writes queued packets, waiting on this client's socket only, until the connection closes. A packet
+             that cannot be encoded disconnects the client.
+    """
+    async def flush_loop(self):
+        try:
+            while not self.closed:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                while self.outbound or self.pending_positions or self.pending_snapshot is not None:
+                    if self.outbound:
+                        data = self.outbound.popleft()
+                    elif self.pending_snapshot is not None:
+                        data = self.encode_pending_snapshot()
+                    else:
+                        data = encode_packet({"command": "UPDATE_POS", "data": self.pending_positions}, self.protocol)
+                        self.pending_positions = {}
+                    self.writer.write(data)
+                    self.metrics.add("packets_out")
+                    self.metrics.add("bytes_out", len(data))
+                    if self.capture is not None:
+                        self.capture.record(self.player_id, EVENT_SENT, length=len(data))
+                    await self.writer.drain()
+        except ConnectionError:
+            self.close(abort=True)
+        except (ValueError, struct.error) as e:
+            # An update too big for one frame would otherwise end this task silently, leaving the client connected
+            # with nothing more sent
+            print(f"Client {self.player_id} dropped: could not encode update: {e}")
+            self.close(abort=True)
+
+    """
+    Name: close
+    Parameters: abort (bool)
+    Returns: None
+    Purpose: Closes the connection; the client's reader then sees EOF and cleans up. Aborting skips
+             flushing, which a stalled client would never let finish.
+    """
+    def close(self, abort=False):
+        if abort:
+            self.writer.transport.abort()
+        if self.closed:
+            return
+        self.closed = True
+        self.outbound.clear()
+        self.pending_positions = {}
+        self.pending_snapshot = None
+        self.flush_task.cancel()
+        self.writer.close()
+
+
+class GameServer:
+    """
+    Name: __init__
+    Parameters: host (str), port (int), seed (int), tick_rate (float), stats_port (int | None),
+                log_interval (float | None), record_path (str | None)
+    Returns: None
+    Purpose: Multiplayer server whose player state is owned by a single asyncio event loop. The stats socket,
+             metrics log line and packet capture are off when their setting is None.
+    """
+    def __init__(self, host=HOST, port=PORT, seed=world_seed, tick_rate=TICK_RATE, stats_port=None,
+                 log_interval=None, record_path=None):
+        self.host = host
+        self.port = port
+        self.world_seed = seed
+        self.tick_rate = tick_rate
+        self.players = {}  # player_id -> position
+        self.spatial_hash = SpatialHash()
+        self.changed_players = set()  # Players whose position changed since the last tick
+        self.tick_task = None
+        self.connections = {}  # player_id -> ClientConnection
+        self.player_count = 0
+        self.server = None
+        self.stopped = None  # asyncio.Event set when shutdown begins
+        self.metrics = ServerMetrics()
+        self.stats_port = stats_port
+        self.stats_server = None
+        self.log_interval = log_interval
+        self.log_prefix = ""  # Labels log lines when several servers share a console
+        self.record_path = record_path
+        self.capture = None  # CaptureWriter logging inbound traffic, see replay_capture.py
+
+    """
+    Name: send_packet
+    Parameters: player_id (int): Player identifier, packet (dict): Data packet
+    Returns: None
+    Purpose: Queues a packet for a single client, encoded with the protocol it negotiated.
+    """
+    def send_packet(self, player_id, packet):
+        connection = self.connections.get(player_id)
+        if connection is not None:
+            connection.queue_packet(packet)
+
+    """
+    Name: broadcast
+    Parameters: packet (dict): Data packet, skip_id (int | None): Player to skip
+    Returns: None
+    Purpose: Sends a packet to all connected clients except one.
+    """
+    def broadcast(self, packet, skip_id=None):
+        for player_id in list(self.connections):
+            if player_id != skip_id:
+                self.send_packet(player_id, packet)
+
+    """
+    Name: handle_packet
+    Parameters: player_id (int): Player identifier, packet (dict): Data packet
+    Returns: None
+    Purpose: Applies one packet received from a client.
+    """
+    def handle_packet(self, player_id, packet):
+        if packet["command"] == "MOVE":
+            # Checked before storing, so a malformed position never reaches other clients
+            x, y = float(packet["data"]["x"]), float(packet["data"]["y"])
+            if not (math.isfinite(x) and math.isfinite(y)):
+                raise ValueError(f"MOVE position is not finite: {x}, {y}")
+            # Only the latest position per tick is sent on, see tick()
+            self.players[player_id] = {"x": x, "y": y}
+            self.spatial_hash.move(player_id, x, y)
+            self.changed_players.add(player_id)
+        elif packet["command"] == "PROTOCOL":
+            if not isinstance(packet["data"], dict):
+                raise TypeError("PROTOCOL data must be an object")
+            # The reply is the last JSON packet; everything after it, both ways, uses the chosen protocol
+            connection = self.connections[player_id]
+            protocol = choose_protocol(packet["data"])
+            version = BINARY_PROTOCOL_VERSION if protocol == PROTOCOL_BINARY else None
+            connection.queue_packet({"command": "PROTOCOL", "data": {"Name": protocol, "Version": version}})
+            connection.set_protocol(protocol)
+        elif packet["command"] == "ACK":
+            sequence = packet["data"]["Sequence"]
+            if not isinstance(sequence, int):
+                raise TypeError(f"ACK sequence must be an integer, got {type(sequence).__name__}")
+            self.connections[player_id].acknowledge(sequence)
+
+    """
+    Name: tick
+    Parameters: None
+    Returns: None
+    Purpose: Sends every client the players that entered, left or moved within its area of interest since the
+             last tick.
+    """
+    def tick(self):
+        now = time.monotonic()
+        for connection in list(self.connections.values()):
+            connection.check_budget(now)
+
+        fanout_start = time.perf_counter()
+        changed = self.changed_players
+        self.changed_players = set()
+        enter_x, enter_y = VIEW_WIDTH / 2 + AOI_MARGIN, VIEW_HEIGHT / 2 + AOI_MARGIN
+        stay_x, stay_y = enter_x + AOI_HYSTERESIS, enter_y + AOI_HYSTERESIS
+
+        for player_id, connection in list(self.connections.items()):
+            pos = self.players.get(player_id)
+            if pos is None:
+                continue
+            cx, cy = view_center(pos)
+            visible = connection.visible
+            entered, moved, kept = {}, {}, {}
+            for other_id in self.spatial_hash.query(cx - stay_x, cy - stay_y, cx + stay_x, cy + stay_y):
+                if other_id == player_id:
+                    continue
+                other = self.players[other_id]
+                dx, dy = abs(other["x"] - cx), abs(other["y"] - cy)
+                if other_id in visible:
+                    if dx <= stay_x and dy <= stay_y:
+                        kept[other_id] = other
+                        if other_id in changed:
+                            moved[other_id] = other
+                elif dx <= enter_x and dy <= enter_y:
+                    entered[other_id] = other
+            connection.update_interest(entered, visible - kept.keys(), moved, kept)
+        self.metrics.fanout_times.record((time.perf_counter() - fanout_start) * 1000)
+
+    """
+    Name: tick_loop
+    Parameters: None
+    Returns: None
+    Purpose: Calls tick() at a fixed rate, catching up on its schedule rather than drifting.
+    """
+    async def tick_loop(self):
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.tick_rate
+        next_tick = loop.time()
+        next_log = loop.time() + self.log_interval if self.log_interval else None
+        while True:
+            tick_start = time.perf_counter()
+            self.tick()
+            self.metrics.tick_times.record((time.perf_counter() - tick_start) * 1000)
+            self.metrics.roll(loop.time())
+            if next_log is not None and loop.time() >= next_log:
+                print(self.log_prefix + format_log_line(self.metrics.report(self.connections)))
+                next_log += self.log_interval
+            next_tick += interval
+            delay = next_tick - loop.time()
+            if delay < 0:
+                next_tick = loop.time()  # Overran a whole tick, so skip ahead instead of bursting
+                delay = 0
+            await asyncio.sleep(delay)
+
+    """
+    Name: add_connection
+    Parameters: player_id (int), writer (asyncio.StreamWriter), x (float), y (float)
+    Returns: ClientConnection
+    Purpose: Registers a connected player at a position.
+    """
+    def add_connection(self, player_id, writer, x, y):
+        self.players[player_id] = {"x": x, "y": y}
+        self.spatial_hash.move(player_id, x, y)
+        connection = ClientConnection(player_id, writer, self.metrics, self.capture)
+        self.connections[player_id] = connection
+        if self.capture is not None:
+            self.capture.record(player_id, EVENT_CONNECT)
+        return connection
+
+    """
+    Name: send_setup
+    Parameters: connection (ClientConnection)
+    Returns: None
+    Purpose: Sends a new player its id, start position, the world seed and the protocols it may ask for.
+    """
+    def send_setup(self, connection):
+        pos = self.players[connection.player_id]
+        connection.queue_packet({
+            "command": "SETUP",
+            "data": {
+                "PlayerID": connection.player_id,
+                "PlayerX": pos["x"],
+                "PlayerY": pos["y"],
+                "WorldSeed": self.world_seed,
+                "Protocols": [PROTOCOL_JSON, PROTOCOL_BINARY],
+                "ProtocolVersion": BINARY_PROTOCOL_VERSION
+            }
+        })
+        # Nearby players, and the newcomer for them, are sent as ENTER events on the next tick
+
+    """
+    Name: handle_client
+    Parameters: reader (asyncio.StreamReader), writer (asyncio.StreamWriter)
+    Returns: None
+    Purpose: Sets up a new client, then reads its packets until it disconnects.
+    """
+    async def handle_client(self, reader, writer):
+        self.player_count += 1
+        player_id = self.player_count
+        px, py = start_positions[(player_id - 1) % len(start_positions)]
+        connection = self.add_connection(player_id, writer, px, py)
+        self.send_setup(connection)
+        await self.read_client(connection, reader)
+
+    """
+    Name: read_client
+    Parameters: connection (ClientConnection), reader (asyncio.StreamReader)
+    Returns: None
+    Purpose: Handles a client's packets, starting with any already buffered, until it disconnects or is
+             handed off to another server.
+    """
+    async def read_client(self, connection, reader):
+        player_id = connection.player_id
+        handed_off = False
+        try:
+            while True:
+                for packet in connection.frames.packets():
+                    self.metrics.add("packets_in")
+                    self.handle_packet(player_id, packet)
+                    if connection.handoff_to is not None:
+                        break  # Later packets go with the client to its new server
+                if connection.handoff_to is not None:
+                    handed_off = await self.hand_off(connection, reader)
+                    if handed_off:
+                        return
+                    connection.handoff_to = None
+                if connection.frames.eof:
+                    break
+                data = await reader.read(READ_BUFFER_SIZE)
+                self.metrics.add("bytes_in", len(data))
+                if self.capture is not None and data:
+                    self.capture.record(player_id, EVENT_DATA, data)
+                connection.frames.feed(data)
+        except (ConnectionError, ValueError, TypeError, KeyError, struct.error) as e:
+            print(f"{self.log_prefix}Client {player_id} disconnected: {e}")
+        finally:
+            if not handed_off:
+                # cleanup after disconnect
+                if self.connections.get(player_id) is connection:
+                    self.connections.pop(player_id)
+                    self.players.pop(player_id, None)
+                    self.spatial_hash.remove(player_id)  # Other clients get a LEAVE on the next tick
+                    if self.capture is not None:
+                        self.capture.record(player_id, EVENT_DISCONNECT)
+                connection.close()
+
+    """
+    Name: hand_off
+    Parameters: connection (ClientConnection), reader (asyncio.StreamReader)
+    Returns: bool
+    Purpose: Moves a client to the server that owns its new position. A single server owns the whole world,
+             so this only does anything in a sharded server.
+    """
+    async def hand_off(self, connection, reader):
+        return False
+
+    """
+    Name: handle_stats
+    Parameters: reader (asyncio.StreamReader), writer (asyncio.StreamWriter)
+    Returns: None
+    Purpose: Answers one stats request. The request line picks the format: "json", or anything else for text.
+    """
+    async def handle_stats(self, reader, writer):
+        try:
+            request = (await reader.readline()).decode(errors="replace").strip().lower()
+            report = self.metrics.report(self.connections)
+            writer.write((format_report(report, "json" if request == "json" else "text") + "\n").encode())
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    """
+    Name: start
+    Parameters: None
+    Returns: None
+    Purpose: Starts listening for client connections, and for stats requests and recording if enabled.
+    """
+    async def start(self):
+        self.stopped = asyncio.Event()
+        if self.record_path is not None:
+            self.capture = CaptureWriter(self.record_path, self.world_seed)
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]  # Resolves port 0 to the real port
+        if self.stats_port is not None:
+            # Stats are only served locally, whatever address the game listens on
+            self.stats_server = await asyncio.start_server(self.handle_stats, "127.0.0.1", self.stats_port)
+            self.stats_port = self.stats_server.sockets[0].getsockname()[1]
+        self.tick_task = asyncio.create_task(self.tick_loop())
+        print(f"Server listening on {self.host}:{self.port}, World Seed: {self.world_seed}")
+        if self.capture is not None:
+            print(f"Recording inbound packets to {self.record_path}")
+
+    """
+    Name: stop
+    Parameters: None
+    Returns: None
+    Purpose: Asks a running server to shut down. Safe to call from a signal handler.
+    """
+    def stop(self):
+        if self.stopped is not None:
+            self.stopped.set()
+
+    """
+    Name: shutdown
+    Parameters: None
+    Returns: None
+    Purpose: Stops accepting connections and closes every client connection.
+    """
+    async def shutdown(self):
+        self.tick_task.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.stats_server is not None:
+            self.stats_server.close()
+            await self.stats_server.wait_closed()
+        connections = list(self.connections.values())
+        self.connections.clear()
+        self.players.clear()
+        self.spatial_hash = SpatialHash()
+        for connection in connections:
+            connection.close()
+        try:
+            await asyncio.wait_for(asyncio.gather(*(connection.writer.wait_closed() for connection in connections),
+                                                  return_exceptions=True), OVER_BUDGET_TIMEOUT)
+        except asyncio.TimeoutError:
+            for connection in connections:
+                connection.close(abort=True)
+        if self.capture is not None:
+            self.capture.close()
+
+    """
+    Name: serve
+    Parameters: None
+    Returns: None
+    Purpose: Runs the server until stop() is called, then shuts down gracefully.
+    """
+    async def serve(self):
+        await self.start()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # Not supported on Windows or outside the main thread
+        try:
+            await self.stopped.wait()
+        finally:
+            await self.shutdown()
+            print(f"{self.log_prefix}Server stopped")
+
 
 """
-Name: handle_client
-Parameters: conn (socket): Client socket, player_id (int): Player identifier
-Returns: None
-Purpose: Handles incoming messages from a single client.
+Name: request_stats
+Parameters: stats_port (int), output_format (str)
+Returns: str
+Purpose: Asks a running server on this machine for its stats report.
 """
-def handle_client(conn, player_id):
-    buffer = ""
-    while True:
-        try:
-            data = conn.recv(4096).decode()
+def request_stats(stats_port=STATS_PORT, output_format="text"):
+    with socket.create_connection(("127.0.0.1", stats_port), timeout=5) as sock:
+        sock.sendall((output_format + "\n").encode())
+        chunks = []
+        while True:
+            data = sock.recv(65536)
             if not data:
                 break
-            buffer += data
-            while "\n" in buffer:
-                line, buffer = buffer.split("\n", 1)
-                if not line.strip():
-                    continue
-                packet = json.loads(line)
-                if packet["command"] == "MOVE":
-                    players[player_id] = packet["data"]
-                    # broadcast updated position to others
-                    broadcast({"command": "UPDATE_POS", "data": {player_id: packet["data"]}}, skip_conn=conn)
-        except Exception as e:
-            print(f"Client {player_id} disconnected: {e}")
-            break
-
-    # cleanup after disconnect
-    if conn in clients:
-        clients.remove(conn)
-    if player_id in players:
-        del players[player_id]
+            chunks.append(data)
+    return b"".join(chunks).decode()
+
 
 """
 Name: main
 Parameters: None
 Returns: None
-Purpose: Starts the multiplayer server and accepts client connections.
+Purpose: Starts the multiplayer server and accepts client connections, or prints a running server's stats.
 """
 def main():
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.bind((HOST, PORT))
-    s.listen()
-    print(f"Server listening on {HOST}:{PORT}, World Seed: {world_seed}")
-
-    player_count = 0
-    while True:
-        conn, addr = s.accept()
-        player_count += 1
-        player_id = player_count
-        clients.append(conn)
-        px, py = start_positions[(player_id - 1) % len(start_positions)]
-        players[player_id] = {"x": px, "y": py}
+    parser = argparse.ArgumentParser(description="Multiplayer game server.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--tick-rate", type=float, default=TICK_RATE, help="Snapshots per second")
+    parser.add_argument("--stats-port", type=int,
+                        help=f"Local port for stats requests (default {STATS_PORT}, single-region servers only)")
+    parser.add_argument("--log-interval", type=float, default=METRICS_LOG_INTERVAL,
+                        help="Seconds between metrics log lines, 0 to disable")
+    parser.add_argument("--regions", type=int, default=1,
+                        help="Split the world into this many regions, each run by its own worker process")
+    parser.add_argument("--record", metavar="FILE",
+                        help="Record every inbound packet to a capture file for replay_capture.py")
+    parser.add_argument("--stats", action="store_true",
+                        help="Print a running single-region server's stats and exit")
+    parser.add_argument("--json", action="store_true", help="With --stats, print the stats as JSON")
+    args = parser.parse_args()
 
-        # Send setup info
-        setup_packet = {
-            "command": "SETUP",
-            "data": {
-                "PlayerID": player_id,
-                "PlayerX": px,
-                "PlayerY": py,
-                "WorldSeed": world_seed
-            }
-        }
-        send_packet(conn, setup_packet)
+    stats_port = STATS_PORT if args.stats_port is None else args.stats_port
+    if args.stats:
+        try:
+            print(request_stats(stats_port, "json" if args.json else "text"), end="")
+        except ConnectionRefusedError:
+            parser.exit(1, f"No server is answering stats requests on port {stats_port}. "
+                           f"Sharded servers do not serve stats; their regions log metrics instead.\n")
+        return
+
+    if args.regions > 1:
+        if args.record:
+            parser.error("--record needs a single-region server")
+        if args.stats_port is not None:
+            parser.error("--stats-port needs a single-region server; each region logs its metrics instead")
+        from ShardedServer import run_sharded_server  # Imported here since ShardedServer builds on this module
+        run_sharded_server(args.host, args.port, world_seed, args.regions, args.tick_rate, args.log_interval or None)
+        return
 
-        threading.Thread(target=handle_client, args=(conn, player_id), daemon=True).start()
+    asyncio.run(GameServer(args.host, args.port, tick_rate=args.tick_rate, stats_port=stats_port,
+                           log_interval=args.log_interval or None, record_path=args.record).serve())
 
 
 if __name__ == "__main__":